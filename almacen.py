@@ -0,0 +1,237 @@
+"""Almacén columnar (Parquet) de los datos ITER limpios con recarga incremental.
+
+Guarda las localidades ya preparadas, los agregados por municipio y un
+manifiesto con la versión del dataset. Cuando llega un archivo corregido,
+``actualizar`` compara por clave INEGI (entidad, municipio, localidad) y solo
+recalcula las filas cambiadas y los municipios afectados.
+
+Las celdas reservadas se guardan estimadas junto con su máscara
+(``suprimidas``); las comparaciones se hacen contra los valores publicados.
+Los subtotales publicados de las localidades de una y de dos viviendas, con
+los que se ajustan esas estimaciones, se guardan aparte (``subtotales``).
+"""
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from datos import CLAVES, agregar_municipios, calcular_derivadas, limpiar_filas, preparar
+from esquema import COLUMNA_SUPRESION, ESQUEMA_ITER
+from imputacion import COLUMNA_AJUSTE, COLUMNAS_SUPRIMIBLES, imputar, margenes, sin_imputar
+from indicadores import DERIVADAS
+
+log = logging.getLogger(__name__)
+
+DIRECTORIO_ALMACEN = "data/almacen"
+
+
+class Cambios:
+    """Diferencias entre la versión almacenada y un archivo nuevo"""
+
+    def __init__(self, agregadas, eliminadas, modificadas, columnas, municipios):
+        self.agregadas = agregadas
+        self.eliminadas = eliminadas
+        self.modificadas = modificadas
+        self.columnas = columnas
+        self.municipios = municipios
+
+    @property
+    def vacio(self):
+        return not (len(self.agregadas) or len(self.eliminadas) or len(self.modificadas))
+
+    def como_dict(self):
+        return {
+            'agregadas': len(self.agregadas),
+            'eliminadas': len(self.eliminadas),
+            'modificadas': len(self.modificadas),
+            'columnas': list(self.columnas),
+            'municipios': [list(map(int, mun)) for mun in self.municipios],
+        }
+
+    def __str__(self):
+        return (f"{len(self.agregadas)} localidades nuevas, {len(self.eliminadas)} eliminadas, "
+                f"{len(self.modificadas)} modificadas en {len(self.municipios)} municipios")
+
+
+def huella(df):
+    """Hash corto del contenido de un DataFrame"""
+    return hashlib.sha1(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes()).hexdigest()[:12]
+
+
+def huella_archivo(contenido):
+    """Hash del contenido de un archivo (bytes)"""
+    return hashlib.sha1(contenido).hexdigest()
+
+
+def _celdas_distintas(a, b):
+    """Matriz booleana de celdas distintas entre dos bloques alineados (NaN == NaN)"""
+    distintas = {}
+    for col in a.columns:
+        if ESQUEMA_ITER.tipos.get(col) == 'texto':
+            distintas[col] = a[col].fillna('').astype(str).to_numpy() != b[col].fillna('').astype(str).to_numpy()
+        else:
+            x = a[col].to_numpy(dtype=float)
+            y = b[col].to_numpy(dtype=float)
+            distintas[col] = ~((x == y) | (np.isnan(x) & np.isnan(y)))
+    return pd.DataFrame(distintas, index=a.index)
+
+
+class AlmacenColumnar:
+    """Localidades preparadas y agregados por municipio en Parquet"""
+
+    def __init__(self, directorio=DIRECTORIO_ALMACEN):
+        self.directorio = directorio
+        self.ruta_localidades = os.path.join(directorio, "localidades.parquet")
+        self.ruta_municipios = os.path.join(directorio, "municipios.parquet")
+        self.ruta_subtotales = os.path.join(directorio, "subtotales.parquet")
+        self.ruta_manifiesto = os.path.join(directorio, "manifiesto.json")
+
+    def existe(self):
+        return os.path.exists(self.ruta_manifiesto)
+
+    def vigente(self):
+        """True si el almacén tiene claves enteras, la máscara de celdas reservadas, los
+        subtotales con que se ajustaron y todos los indicadores del catálogo"""
+        if not self.existe() or not os.path.exists(self.ruta_subtotales):
+            return False
+        esquema = pq.read_schema(self.ruta_localidades)
+        guardadas = set(esquema.names)
+        return ({COLUMNA_SUPRESION, COLUMNA_AJUSTE} <= guardadas and set(DERIVADAS) <= guardadas
+                and all(pa.types.is_integer(esquema.field(col).type) for col in CLAVES))
+
+    def manifiesto(self):
+        if not self.existe():
+            return {}
+        with open(self.ruta_manifiesto, encoding="utf-8") as f:
+            return json.load(f)
+
+    def version(self):
+        return self.manifiesto().get('version')
+
+    def cargar(self):
+        """Localidades preparadas (nombres cortos y métricas derivadas)"""
+        return pd.read_parquet(self.ruta_localidades)
+
+    def cargar_municipios(self):
+        """Agregados aditivos por municipio"""
+        return pd.read_parquet(self.ruta_municipios)
+
+    def cargar_subtotales(self):
+        """Subtotales publicados de las localidades de una y de dos viviendas (``imputacion.margenes``)"""
+        return pd.read_parquet(self.ruta_subtotales)
+
+    def construir(self, df, origen=None):
+        """Reconstruye el almacén completo a partir de un DataFrame validado"""
+        localidades = preparar(df).sort_values(CLAVES).reset_index(drop=True)
+        municipios = agregar_municipios(localidades)
+        claves = pd.MultiIndex.from_frame(localidades[CLAVES])
+        cambios = Cambios(claves, claves[:0], claves[:0], [],
+                          sorted(set(zip(municipios['cve_entidad'], municipios['cve_municipio']))))
+        self._guardar(localidades, municipios, margenes(df), huella(localidades), cambios, origen)
+        log.info("Almacén construido: %d localidades, %d municipios", len(localidades), len(municipios))
+        return cambios
+
+    def diferencias(self, df):
+        """Compara un DataFrame validado contra la versión almacenada"""
+        base = [col for col in [*ESQUEMA_ITER.a_original, COLUMNA_SUPRESION] if col in df.columns]
+        nuevo = limpiar_filas(df)[base].set_index(CLAVES)
+        viejo = sin_imputar(self.cargar())[base].set_index(CLAVES)
+        if not nuevo.index.is_unique:
+            duplicadas = nuevo.index[nuevo.index.duplicated()].unique()
+            raise ValueError(f"Claves de localidad duplicadas en el archivo nuevo: {list(duplicadas[:5])}")
+
+        agregadas = nuevo.index.difference(viejo.index)
+        eliminadas = viejo.index.difference(nuevo.index)
+        comunes = nuevo.index.intersection(viejo.index)
+
+        valores = [col for col in base if col not in CLAVES]
+        distintas = _celdas_distintas(nuevo.loc[comunes, valores], viejo.loc[comunes, valores])
+        filas = distintas.any(axis=1).to_numpy()
+        modificadas = comunes[filas]
+        columnas = list(distintas.columns[distintas[filas].any(axis=0).to_numpy()])
+
+        tocadas = agregadas.union(eliminadas).union(modificadas)
+        municipios = sorted(set(zip(tocadas.get_level_values(0), tocadas.get_level_values(1))))
+        cambios = Cambios(agregadas, eliminadas, modificadas, columnas, municipios)
+
+        for clave in modificadas:
+            cols = list(distintas.columns[distintas.loc[clave].to_numpy()])
+            log.debug("Localidad %s modificada: %s", clave, ", ".join(cols))
+        return nuevo, viejo, cambios
+
+    def actualizar(self, df, origen=None):
+        """Aplica solo las diferencias de un DataFrame validado al almacén"""
+        if not self.vigente():
+            # Sin almacén, o anterior a la máscara de celdas reservadas (guardaba
+            # ceros) o a algún indicador del catálogo
+            return self.construir(df, origen)
+
+        nuevo, _, cambios = self.diferencias(df)
+        subtotales = margenes(df)
+        subtotales_iguales = huella(subtotales) == huella(self.cargar_subtotales())
+        if cambios.vacio and subtotales_iguales:
+            log.info("Sin cambios respecto a la versión %s", self.version())
+            return cambios
+
+        # Parchar solo las filas nuevas o modificadas
+        actuales = self.cargar()
+        orden = list(actuales.columns)
+        actuales = actuales.set_index(CLAVES)
+        recalcular = cambios.agregadas.union(cambios.modificadas)
+        parche = calcular_derivadas(nuevo.loc[recalcular].reset_index().assign(**{COLUMNA_AJUSTE: 0}))
+        parche = parche.set_index(CLAVES)
+        actuales = actuales.drop(index=cambios.eliminadas.union(cambios.modificadas))
+        localidades = pd.concat([actuales, parche[actuales.columns]]).sort_index().reset_index()[orden]
+
+        # Las estimaciones de celdas reservadas usan las tasas de todo el estrato y
+        # los subtotales: se recalculan sobre todo el dataset y se rehacen las filas que se movieron
+        imputadas = imputar(localidades, subtotales)
+        ajuste = [*COLUMNAS_SUPRIMIBLES, COLUMNA_AJUSTE]
+        movidas = _celdas_distintas(imputadas[ajuste], localidades[ajuste]).any(axis=1).to_numpy()
+        if movidas.any():
+            localidades.loc[movidas, orden] = calcular_derivadas(imputadas[movidas])[orden]
+        reagregar = set(cambios.municipios) | set(zip(localidades.loc[movidas, 'cve_entidad'],
+                                                      localidades.loc[movidas, 'cve_municipio']))
+
+        # Reagregar solo los municipios afectados
+        municipios = self.cargar_municipios().set_index(['cve_entidad', 'cve_municipio'])
+        afectados = pd.MultiIndex.from_tuples(sorted(reagregar), names=['cve_entidad', 'cve_municipio'])
+        en_afectados = pd.MultiIndex.from_frame(localidades[['cve_entidad', 'cve_municipio']]).isin(afectados)
+        reagregados = agregar_municipios(localidades[en_afectados]).set_index(['cve_entidad', 'cve_municipio'])
+        municipios = municipios.drop(index=afectados, errors='ignore')
+        municipios = pd.concat([municipios, reagregados[municipios.columns]]).sort_index().reset_index()
+
+        version = hashlib.sha1(
+            (self.version() + huella(parche) + huella(subtotales) + str(cambios.como_dict())).encode()
+        ).hexdigest()[:12]
+        self._guardar(localidades, municipios, subtotales, version, cambios, origen)
+
+        log.info("Almacén actualizado a la versión %s: %s", version, cambios)
+        if cambios.columnas:
+            log.info("Columnas con cambios: %s", ", ".join(cambios.columnas))
+        return cambios
+
+    def _guardar(self, localidades, municipios, subtotales, version, cambios, origen):
+        os.makedirs(self.directorio, exist_ok=True)
+        # Escritura atómica: primero a temporales y luego se reemplaza
+        for df, ruta in ((localidades, self.ruta_localidades), (municipios, self.ruta_municipios),
+                         (subtotales, self.ruta_subtotales)):
+            df.to_parquet(ruta + ".tmp", index=False)
+            os.replace(ruta + ".tmp", ruta)
+        manifiesto = {
+            'version': version,
+            'actualizado': datetime.now().isoformat(timespec='seconds'),
+            'origen': origen,
+            'localidades': len(localidades),
+            'municipios': len(municipios),
+            'ultimo_cambio': cambios.como_dict(),
+        }
+        with open(self.ruta_manifiesto + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifiesto, f, ensure_ascii=False, indent=2)
+        os.replace(self.ruta_manifiesto + ".tmp", self.ruta_manifiesto)
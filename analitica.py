@@ -0,0 +1,191 @@
+"""Correlaciones, estandarización y conglomerados de localidades con NumPy.
+
+Todo opera sobre la matriz (localidades x indicadores) de una vez. Para
+conteos nacionales, k-means usa mini-lotes y el agrupamiento jerárquico
+(Ward) se aplica sobre micro-conglomerados de k-means en lugar de sobre
+cada localidad, lo que mantiene el costo independiente del número de filas.
+"""
+import numpy as np
+import pandas as pd
+
+import indicadores
+
+# Indicadores por defecto: los del catálogo (las medidas absolutas solo
+# reflejan el tamaño de la localidad)
+INDICADORES = list(indicadores.INDICADORES)
+
+# Por encima de este número de filas k-means usa mini-lotes
+UMBRAL_MINI_LOTES = 20_000
+
+
+def matriz(df, columnas):
+    """Matriz float de indicadores con los faltantes imputados con la media"""
+    X = df[columnas].to_numpy(dtype=float)
+    medias = np.nanmean(X, axis=0)
+    faltantes = np.isnan(X)
+    if faltantes.any():
+        X[faltantes] = np.take(np.nan_to_num(medias), np.nonzero(faltantes)[1])
+    return X
+
+
+def estandarizar(X):
+    """Puntajes z por columna (columnas constantes quedan en 0)"""
+    desviacion = X.std(axis=0)
+    desviacion[desviacion == 0] = 1
+    return (X - X.mean(axis=0)) / desviacion
+
+
+def correlacion(df, columnas=INDICADORES, metodo='pearson'):
+    """Matriz de correlación de Pearson o Spearman entre indicadores"""
+    X = matriz(df, columnas)
+    if metodo == 'spearman':
+        # Rangos promedio (los empates son frecuentes en localidades pequeñas)
+        X = pd.DataFrame(X).rank(method='average').to_numpy()
+    Z = estandarizar(X)
+    C = Z.T @ Z / max(len(Z), 1)
+    np.fill_diagonal(C, 1)
+    return pd.DataFrame(C.round(4), index=columnas, columns=columnas)
+
+
+def _distancias(X, centros):
+    """Distancias euclidianas al cuadrado de cada fila a cada centro"""
+    d = (X * X).sum(axis=1)[:, None] - 2 * X @ centros.T + (centros * centros).sum(axis=1)[None, :]
+    return np.maximum(d, 0)
+
+
+def _kmeans_pp(X, k, rng):
+    """Inicialización k-means++"""
+    centros = [X[rng.integers(len(X))]]
+    d = _distancias(X, centros[0][None, :])[:, 0]
+    for _ in range(1, k):
+        total = d.sum()
+        i = rng.choice(len(X), p=d / total) if total > 0 else rng.integers(len(X))
+        centros.append(X[i])
+        d = np.minimum(d, _distancias(X, X[i][None, :])[:, 0])
+    return np.array(centros)
+
+
+def kmeans(X, k, semilla=0, iteraciones=100, tamano_lote=1024, pesos=None):
+    """k-means (Lloyd) o k-means con mini-lotes si hay muchas filas.
+
+    Devuelve (etiquetas, centros, inercia).
+    """
+    rng = np.random.default_rng(semilla)
+    k = min(k, len(X))
+    pesos = np.ones(len(X)) if pesos is None else np.asarray(pesos, dtype=float)
+    muestra = X if len(X) <= UMBRAL_MINI_LOTES else X[rng.choice(len(X), UMBRAL_MINI_LOTES, replace=False)]
+    centros = _kmeans_pp(muestra, k, rng)
+
+    if len(X) <= UMBRAL_MINI_LOTES:
+        for _ in range(iteraciones):
+            etiquetas = _distancias(X, centros).argmin(axis=1)
+            masa = np.bincount(etiquetas, weights=pesos, minlength=k)
+            sumas = np.zeros_like(centros)
+            np.add.at(sumas, etiquetas, X * pesos[:, None])
+            nuevos = np.where(masa[:, None] > 0, sumas / np.maximum(masa, 1e-12)[:, None], centros)
+            if np.allclose(nuevos, centros):
+                break
+            centros = nuevos
+    else:
+        # Mini-lotes (Sculley, 2010): tasa de aprendizaje 1/conteo por centro
+        conteos = np.zeros(k)
+        for _ in range(iteraciones):
+            lote = X[rng.integers(len(X), size=tamano_lote)]
+            etiquetas_lote = _distancias(lote, centros).argmin(axis=1)
+            for c in np.unique(etiquetas_lote):
+                miembros = lote[etiquetas_lote == c]
+                conteos[c] += len(miembros)
+                centros[c] += (miembros.sum(axis=0) - len(miembros) * centros[c]) / conteos[c]
+
+    distancias = _distancias(X, centros)
+    etiquetas = distancias.argmin(axis=1)
+    inercia = float((distancias[np.arange(len(X)), etiquetas] * pesos).sum())
+    return etiquetas, centros, inercia
+
+
+def ward(centros, tamanos, k):
+    """Agrupamiento jerárquico de Ward sobre puntos con tamaño (Lance-Williams).
+
+    Devuelve la etiqueta final (0..k-1) de cada punto de entrada.
+    """
+    m = len(centros)
+    tamanos = np.asarray(tamanos, dtype=float).copy()
+    D = _distancias(centros, centros)
+    # Costo de Ward de unir i y j
+    D = D * (tamanos[:, None] * tamanos[None, :]) / (tamanos[:, None] + tamanos[None, :])
+    np.fill_diagonal(D, np.inf)
+    grupo = np.arange(m)
+
+    for _ in range(m - min(k, m)):
+        i, j = np.unravel_index(np.argmin(D), D.shape)
+        if i > j:
+            i, j = j, i
+        ni, nj, nk = tamanos[i], tamanos[j], tamanos
+        D[i] = ((ni + nk) * D[i] + (nj + nk) * D[j] - nk * D[i, j]) / (ni + nj + nk)
+        D[:, i] = D[i]
+        D[i, i] = np.inf
+        D[j, :] = np.inf
+        D[:, j] = np.inf
+        tamanos[i] = ni + nj
+        grupo[grupo == j] = i
+
+    _, etiquetas = np.unique(grupo, return_inverse=True)
+    return etiquetas
+
+
+def conglomerados(df, columnas=INDICADORES, k=5, metodo='kmeans', semilla=0, micro=200):
+    """Asigna cada localidad a una tipología usando indicadores estandarizados.
+
+    ``metodo`` es 'kmeans' o 'jerarquico'. El jerárquico resume primero las
+    localidades en ``micro`` micro-conglomerados con k-means y luego los une
+    con Ward. Devuelve (etiquetas, perfiles) donde perfiles tiene la media de
+    cada indicador original y el número de localidades por tipología.
+    """
+    X = matriz(df, columnas)
+    Z = estandarizar(X)
+    if metodo == 'jerarquico':
+        micro_etiquetas, micro_centros, _ = kmeans(Z, min(micro, len(Z)), semilla)
+        tamanos = np.bincount(micro_etiquetas, minlength=len(micro_centros))
+        usados = tamanos > 0
+        union = np.zeros(len(micro_centros), dtype=int)
+        union[usados] = ward(micro_centros[usados], tamanos[usados], k)
+        etiquetas = union[micro_etiquetas]
+    else:
+        etiquetas, _, _ = kmeans(Z, k, semilla)
+
+    # Reordenar tipologías por tamaño para que las etiquetas sean estables
+    tamanos = np.bincount(etiquetas)
+    etiquetas = np.argsort(np.argsort(-tamanos, kind='stable'))[etiquetas]
+
+    conteo = np.bincount(etiquetas)
+    sumas = np.zeros((len(conteo), X.shape[1]))
+    np.add.at(sumas, etiquetas, X)
+    perfiles = pd.DataFrame(sumas / conteo[:, None], columns=columnas).round(2)
+    perfiles.insert(0, 'localidades', conteo)
+    perfiles.index.name = 'tipologia'
+    return etiquetas, perfiles
+
+
+def componentes_principales(df, columnas=INDICADORES, n=2):
+    """Proyección de los indicadores estandarizados en sus n primeros componentes"""
+    Z = estandarizar(matriz(df, columnas))
+    _, valores, vectores = np.linalg.svd(Z - Z.mean(axis=0), full_matrices=False)
+    varianza = valores ** 2 / max((valores ** 2).sum(), 1e-12)
+    return Z @ vectores[:n].T, varianza[:n]
+
+
+def tipologias(df, columnas=INDICADORES, k=5, metodo='kmeans', progreso=None):
+    """Correlaciones, tipologías y componentes principales de una selección.
+
+    Devuelve (correlacion, etiquetas, perfiles, componentes, varianza);
+    ``progreso(fraccion, mensaje)`` recibe el avance cuando corre como
+    trabajo (ver ``trabajos.py``).
+    """
+    avanzar = progreso or (lambda fraccion, mensaje: None)
+    avanzar(0.0, "Correlaciones")
+    correlacion_ = correlacion(df, columnas)
+    avanzar(0.2, "Conglomerados")
+    etiquetas, perfiles = conglomerados(df, columnas, k=k, metodo=metodo)
+    avanzar(0.8, "Componentes principales")
+    componentes, varianza = componentes_principales(df, columnas)
+    return correlacion_, etiquetas, perfiles, componentes, varianza
@@ -0,0 +1,332 @@
+"""API HTTP/JSON con los agregados de los dashboards, sin Streamlit.
+
+Uso:
+    python api.py                      # sirve en http://127.0.0.1:8502
+    python api.py --puerto 9000
+    python api.py --benchmark          # mide peticiones/s y latencia p99
+
+Rutas:
+    GET /version
+    GET /municipios                                   resumen por municipio
+    GET /municipios/<clave o nombre>                  panel de métricas del municipio
+    GET /municipios/<clave o nombre>/localidades/<clave o nombre>
+    GET /ranking/municipios?metrica=porcentaje_indigena&n=10
+    GET /ranking/localidades?metrica=pob_total&n=20&municipio=Tepic
+
+Todas las respuestas llevan un ETag con la versión del dataset y responden
+304 a un GET condicional (If-None-Match). Los datos se cargan una vez y se
+recargan solo cuando cambia el manifiesto del almacén columnar.
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import numpy as np
+import pandas as pd
+
+from almacen import AlmacenColumnar, huella
+from arranque import RUTA_EXCEL
+from comparacion import panel_metricas
+from datos import preparar
+from esquema import ESQUEMA_ITER
+from jerarquia import Jerarquia
+
+log = logging.getLogger(__name__)
+
+METRICAS_LOCALIDAD = [
+    'pob_total', 'escolaridad_promedio', 'porcentaje_indigena',
+    'porcentaje_sin_salud', 'personas_por_vivienda'
+]
+
+
+class ErrorConsulta(Exception):
+    """Error de la petición que se devuelve al cliente con un código HTTP"""
+
+    def __init__(self, mensaje, codigo=400):
+        super().__init__(mensaje)
+        self.codigo = codigo
+
+
+def _json(df):
+    return df.to_json(orient='records', force_ascii=False)
+
+
+def coincide_etag(cabecera, etag):
+    """True si la cabecera If-None-Match (lista de etiquetas o ``*``) incluye ``etag``.
+
+    If-None-Match usa la comparación débil: ``W/"v"`` coincide con ``"v"``.
+    """
+    if cabecera is None:
+        return False
+    sin_debil = lambda etiqueta: etiqueta[2:] if etiqueta.startswith('W/') else etiqueta
+    etiquetas = [etiqueta.strip() for etiqueta in cabecera.split(',')]
+    return '*' in etiquetas or sin_debil(etag) in {sin_debil(etiqueta) for etiqueta in etiquetas}
+
+
+class VersionDatos:
+    """Dataset de una versión, su resumen por municipio y la caché de sus respuestas"""
+
+    def __init__(self, version, df, municipios):
+        self.version = version
+        self.df = df
+        self.municipios = municipios
+        self.respuestas = {}
+
+
+class ServicioDatos:
+    """Dataset cargado una vez, agregados por municipio y caché de respuestas.
+
+    Cada recarga reemplaza de una sola vez la ``VersionDatos`` vigente: una
+    respuesta se calcula, se guarda y se etiqueta con la misma versión
+    aunque otra petición recargue los datos mientras tanto.
+    """
+
+    def __init__(self, almacen=None, ruta_excel=RUTA_EXCEL):
+        self.almacen = almacen or AlmacenColumnar()
+        self.ruta_excel = ruta_excel
+        self._datos = None
+        self._firma = object()
+        self._candado = threading.Lock()
+        self.recargar_si_cambio()
+
+    @property
+    def version(self):
+        return self._datos.version
+
+    @property
+    def df(self):
+        return self._datos.df
+
+    @property
+    def municipios(self):
+        return self._datos.municipios
+
+    def _firma_actual(self):
+        try:
+            return os.stat(self.almacen.ruta_manifiesto).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def recargar_si_cambio(self):
+        """Recarga los datos si el manifiesto del almacén cambió"""
+        firma = self._firma_actual()
+        if firma == self._firma:
+            return
+        with self._candado:
+            if firma == self._firma:
+                return
+            if self.almacen.existe():
+                df, version = self.almacen.cargar(), self.almacen.version()
+            else:
+                df = preparar(ESQUEMA_ITER.validar(pd.read_excel(self.ruta_excel)).df)
+                version = huella(df)
+            self._datos = VersionDatos(version, df, self._resumen_municipios(df))
+            self._firma = firma
+            log.info("Dataset versión %s cargado: %d localidades", version, len(df))
+
+    def _resumen_municipios(self, df):
+        """Resumen por municipio (tabla de app.py y panel de métricas de app2.py)"""
+        # Indicadores del catálogo por municipio, como en los dashboards
+        resumen = Jerarquia(df).tabla('municipio').reset_index()[[
+            'cve_municipio', 'municipio', 'localidades', 'escolaridad_promedio',
+            'porcentaje_indigena', 'porcentaje_sin_salud', 'pob_sin_salud',
+            'porcentaje_imputado_pob_indigena', 'porcentaje_imputado_escolaridad_promedio'
+        ]]
+        panel = panel_metricas(df, 'municipio', list(resumen['municipio'])).reset_index(drop=True)
+        resumen = pd.concat([resumen.drop(columns=['porcentaje_indigena']),
+                             panel.drop(columns=['escolaridad'])], axis=1)
+        resumen['cve_municipio'] = resumen['cve_municipio'].astype(int)
+        return resumen.round(2)
+
+    @staticmethod
+    def _municipio(municipios, valor):
+        valor = unquote(valor)
+        if valor.isdigit():
+            fila = municipios[municipios['cve_municipio'] == int(valor)]
+        else:
+            fila = municipios[municipios['municipio'].str.lower() == valor.lower()]
+        if fila.empty:
+            raise ErrorConsulta(f"Municipio no encontrado: {valor}", 404)
+        return fila.iloc[0]
+
+    def responder(self, ruta, consulta):
+        """(versión, cuerpo JSON en bytes) de una ruta, calculado una vez por versión"""
+        self.recargar_si_cambio()
+        datos = self._datos
+        clave = (ruta, tuple(sorted((k, tuple(v)) for k, v in consulta.items())))
+        cuerpo = datos.respuestas.get(clave)
+        if cuerpo is None:
+            cuerpo = self._calcular(datos, ruta, consulta).encode('utf-8')
+            if len(datos.respuestas) >= 1024:
+                datos.respuestas.clear()
+            datos.respuestas[clave] = cuerpo
+        return datos.version, cuerpo
+
+    def _calcular(self, datos, ruta, consulta):
+        partes = [p for p in ruta.split('/') if p]
+        parametro = lambda nombre, defecto=None: consulta.get(nombre, [defecto])[0]
+        municipios = datos.municipios
+
+        if partes == ['version']:
+            return json.dumps({'version': datos.version, 'localidades': len(datos.df)})
+
+        if partes == ['municipios']:
+            return _json(municipios)
+
+        if len(partes) == 2 and partes[0] == 'municipios':
+            return self._municipio(municipios, partes[1]).to_json(force_ascii=False)
+
+        if len(partes) == 4 and partes[0] == 'municipios' and partes[2] == 'localidades':
+            municipio = self._municipio(municipios, partes[1])
+            valor = unquote(partes[3])
+            df = datos.df[datos.df['cve_municipio'] == municipio['cve_municipio']]
+            if valor.isdigit():
+                df = df[df['cve_localidad'] == int(valor)]
+            else:
+                df = df[df['localidad'].str.lower() == valor.lower()]
+            if df.empty:
+                raise ErrorConsulta(f"Localidad no encontrada: {valor}", 404)
+            return df.iloc[0].to_json(force_ascii=False)
+
+        if partes == ['ranking', 'municipios']:
+            metrica = parametro('metrica', 'poblacion')
+            if metrica not in municipios.columns or metrica in ('municipio', 'cve_municipio'):
+                raise ErrorConsulta(f"Métrica no válida: {metrica}")
+            n = int(parametro('n', len(municipios)))
+            return _json(municipios.nlargest(n, metrica))
+
+        if partes == ['ranking', 'localidades']:
+            metrica = parametro('metrica', 'pob_total')
+            if metrica not in METRICAS_LOCALIDAD:
+                raise ErrorConsulta(f"Métrica no válida: {metrica}. Opciones: {', '.join(METRICAS_LOCALIDAD)}")
+            df = datos.df
+            if parametro('municipio'):
+                df = df[df['cve_municipio'] == self._municipio(municipios, parametro('municipio'))['cve_municipio']]
+            top = df.nlargest(int(parametro('n', 20)), metrica)
+            return _json(top[['municipio', 'localidad', 'cve_municipio', 'cve_localidad'] + METRICAS_LOCALIDAD].round(2))
+
+        raise ErrorConsulta(f"Ruta no encontrada: {ruta}", 404)
+
+
+class ManejadorAPI(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Cabeceras y cuerpo se escriben por separado; sin esto Nagle añade ~40 ms
+    disable_nagle_algorithm = True
+    servicio = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        try:
+            version, cuerpo = self.servicio.responder(url.path, parse_qs(url.query))
+        except ErrorConsulta as e:
+            self._enviar(e.codigo, json.dumps({'error': str(e)}, ensure_ascii=False).encode('utf-8'))
+            return
+        except ValueError as e:
+            self._enviar(400, json.dumps({'error': str(e)}, ensure_ascii=False).encode('utf-8'))
+            return
+
+        etag = f'"{version}"'
+        if coincide_etag(self.headers.get('If-None-Match'), etag):
+            self._enviar(304, b'', etag)
+        else:
+            self._enviar(200, cuerpo, etag)
+
+    def _enviar(self, codigo, cuerpo, etag=None):
+        self.send_response(codigo)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *args):
+        log.debug(formato, *args)
+
+
+def crear_servidor(puerto=8502, host="127.0.0.1", servicio=None):
+    ManejadorAPI.servicio = servicio or ServicioDatos()
+    return ThreadingHTTPServer((host, puerto), ManejadorAPI)
+
+
+def medir(host, puerto, rutas, concurrencia=8, peticiones=2000, condicional=False):
+    """Lanza peticiones concurrentes y devuelve peticiones/s y percentiles de latencia (ms)"""
+    por_hilo = peticiones // concurrencia
+
+    def cliente(_):
+        conexion = http.client.HTTPConnection(host, puerto)
+        latencias = []
+        etags = {}
+        for i in range(por_hilo):
+            ruta = rutas[i % len(rutas)]
+            cabeceras = {'If-None-Match': etags[ruta]} if condicional and ruta in etags else {}
+            inicio = time.perf_counter()
+            conexion.request('GET', ruta, headers=cabeceras)
+            respuesta = conexion.getresponse()
+            respuesta.read()
+            latencias.append(time.perf_counter() - inicio)
+            etags[ruta] = respuesta.getheader('ETag')
+        conexion.close()
+        return latencias
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(concurrencia) as ejecutor:
+        latencias = np.concatenate(list(ejecutor.map(cliente, range(concurrencia)))) * 1000
+    duracion = time.perf_counter() - inicio
+    return {
+        'peticiones': len(latencias),
+        'peticiones_por_segundo': round(len(latencias) / duracion, 1),
+        'p50_ms': round(float(np.percentile(latencias, 50)), 2),
+        'p95_ms': round(float(np.percentile(latencias, 95)), 2),
+        'p99_ms': round(float(np.percentile(latencias, 99)), 2),
+    }
+
+
+def benchmark(concurrencia=8, peticiones=2000):
+    """Levanta la API en un puerto libre y mide rutas representativas"""
+    servidor = crear_servidor(puerto=0)
+    host, puerto = servidor.server_address
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    municipio = ManejadorAPI.servicio.municipios['cve_municipio'].iloc[0]
+    rutas = [
+        '/municipios',
+        f'/municipios/{municipio}',
+        '/ranking/municipios?metrica=porcentaje_indigena&n=10',
+        '/ranking/localidades?metrica=pob_total&n=20',
+        f'/ranking/localidades?metrica=escolaridad_promedio&n=10&municipio={municipio}',
+    ]
+    try:
+        for condicional in (False, True):
+            resultado = medir(host, puerto, rutas, concurrencia, peticiones, condicional)
+            tipo = "GET condicional (304)" if condicional else "GET"
+            print(f"{tipo:<22} {resultado['peticiones_por_segundo']:>9,.1f} pet/s   "
+                  f"p50 {resultado['p50_ms']:.2f} ms   p95 {resultado['p95_ms']:.2f} ms   "
+                  f"p99 {resultado['p99_ms']:.2f} ms")
+    finally:
+        servidor.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="API JSON del Dashboard de Nayarit")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8502)
+    parser.add_argument("--benchmark", action="store_true", help="medir peticiones/s y latencia")
+    parser.add_argument("--concurrencia", type=int, default=8)
+    parser.add_argument("--peticiones", type=int, default=2000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    if args.benchmark:
+        benchmark(args.concurrencia, args.peticiones)
+    else:
+        servidor = crear_servidor(args.puerto, args.host)
+        log.info("API escuchando en http://%s:%d", args.host, args.puerto)
+        servidor.serve_forever()
@@ -1,11 +1,11 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import numpy as np
-import warnings
-warnings.filterwarnings('ignore')
+from graficos import (create_demographic_pyramid, create_housing_analysis, create_locality_analysis,
+                      create_municipality_ranking, municipality_summary)
+from rendimiento import panel, registrar_latencia, tabla_latencias
+import time
+
+# pandas, plotly y los módulos de análisis se importan dentro de las vistas que
+# los usan: la pantalla de bienvenida (sin archivo) no necesita ninguno
 
 # Configuración de la página
 st.set_page_config(
@@ -45,96 +45,22 @@ st.markdown("""
 
 class NayaritDashboard:
     def __init__(self):
+        from esquema import ESQUEMA_ITER
         self.df = None
-        self.column_mapping = {
-            'Clave de entidad federativa': 'cve_entidad',
-            'Nombre de la entidad': 'entidad',
-            'Clave de municipio o demarcación territorial': 'cve_municipio',
-            'Nombre del municipio o demarcación territorial': 'municipio',
-            'Clave de localidad': 'cve_localidad',
-            'Nombre de la localidad': 'localidad',
-            'Población total': 'pob_total',
-            'Población femenina': 'pob_femenina',
-            'Población masculina': 'pob_masculina',
-            'Población de 3 años y más que habla alguna lengua indígena': 'pob_indigena',
-            'Población con discapacidad': 'pob_discapacidad',
-            'Grado promedio de escolaridad': 'escolaridad_promedio',
-            'Población de 12 años y más económicamente activa': 'pob_economicamente_activa',
-            'Población sin afiliación a servicios de salud': 'pob_sin_salud',
-            'Población afiliada a servicios de salud': 'pob_con_salud',
-            'Total de viviendas': 'total_viviendas',
-            'Total de viviendas habitadas': 'viviendas_habitadas',
-            'Total de viviendas particulares': 'viviendas_particulares'
-        }
+        self.column_mapping = ESQUEMA_ITER.a_corto
     
-    @st.cache_data
-    def load_data(_self, uploaded_file):
-        """Carga y procesa los datos del archivo Excel"""
-        try:
-            df = pd.read_excel(uploaded_file)
-            
-            # Renombrar columnas
-            if all(col in df.columns for col in _self.column_mapping.keys()):
-                df = df.rename(columns=_self.column_mapping)
-            
-            # Limpiar columnas de texto - convertir todo a string y limpiar
-            text_columns = ['entidad', 'municipio', 'localidad']
-            for col in text_columns:
-                if col in df.columns:
-                    df[col] = df[col].astype(str)
-                    df[col] = df[col].str.strip()  # Eliminar espacios
-                    df[col] = df[col].replace(['nan', 'None', ''], pd.NA)  # Convertir valores vacíos a NA
-            
-            # Eliminar filas donde municipio sea NA o vacía
-            df = df.dropna(subset=['municipio'])
-            df = df[df['municipio'] != '']
-            
-            # Convertir a numérico
-            numeric_columns = [
-                'pob_total', 'pob_femenina', 'pob_masculina', 'pob_indigena',
-                'pob_discapacidad', 'escolaridad_promedio', 'pob_economicamente_activa',
-                'pob_sin_salud', 'pob_con_salud', 'total_viviendas',
-                'viviendas_habitadas', 'viviendas_particulares'
-            ]
-            
-            for col in numeric_columns:
-                if col in df.columns:
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
-            
-            # Eliminar filas donde la población total sea 0 o NA
-            df = df.dropna(subset=['pob_total'])
-            df = df[df['pob_total'] > 0]
-            
-            # Calcular porcentajes y métricas adicionales (con manejo de división por cero)
-            df['porcentaje_mujeres'] = np.where(df['pob_total'] > 0, 
-                                               (df['pob_femenina'] / df['pob_total'] * 100).round(2), 0)
-            df['porcentaje_hombres'] = np.where(df['pob_total'] > 0,
-                                               (df['pob_masculina'] / df['pob_total'] * 100).round(2), 0)
-            df['porcentaje_indigena'] = np.where(df['pob_total'] > 0,
-                                                (df['pob_indigena'] / df['pob_total'] * 100).round(2), 0)
-            df['porcentaje_discapacidad'] = np.where(df['pob_total'] > 0,
-                                                    (df['pob_discapacidad'] / df['pob_total'] * 100).round(2), 0)
-            df['porcentaje_sin_salud'] = np.where(df['pob_total'] > 0,
-                                                 (df['pob_sin_salud'] / df['pob_total'] * 100).round(2), 0)
-            df['porcentaje_con_salud'] = np.where(df['pob_total'] > 0,
-                                                 (df['pob_con_salud'] / df['pob_total'] * 100).round(2), 0)
-            df['porcentaje_ocupacion_viviendas'] = np.where(df['total_viviendas'] > 0,
-                                                           (df['viviendas_habitadas'] / df['total_viviendas'] * 100).round(2), 0)
-            df['personas_por_vivienda'] = np.where(df['viviendas_habitadas'] > 0,
-                                                  (df['pob_total'] / df['viviendas_habitadas']).round(2), 0)
-            
-            return df
-            
-        except Exception as e:
-            st.error(f"Error al cargar el archivo: {e}")
-            return None
+    @st.cache_resource(max_entries=16)
+    def load_data(_self, dataset_id):
+        """Localidades preparadas del dataset registrado (una copia por id, compartida)"""
+        from cargas import GestorCargas
+        return GestorCargas().cargar(dataset_id)
     
-    def show_overview_metrics(self, df):
-        """Muestra métricas generales en tarjetas"""
+    def show_overview_metrics(self, totales):
+        """Muestra métricas generales en tarjetas (``totales``: fila de ``Jerarquia``)"""
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            total_pop = df['pob_total'].sum()
+            total_pop = totales['pob_total']
             st.metric(
                 label="🏘️ Población Total",
                 value=f"{total_pop:,.0f}",
@@ -142,7 +68,7 @@ class NayaritDashboard:
             )
         
         with col2:
-            total_municipalities = df['municipio'].nunique()
+            total_municipalities = int(totales['municipios'])
             st.metric(
                 label="🏛️ Total Municipios",
                 value=f"{total_municipalities}",
@@ -150,7 +76,7 @@ class NayaritDashboard:
             )
         
         with col3:
-            total_localities = df['localidad'].nunique()
+            total_localities = int(totales['localidades'])
             st.metric(
                 label="🏘️ Total Localidades",
                 value=f"{total_localities}",
@@ -158,284 +84,338 @@ class NayaritDashboard:
             )
         
         with col4:
-            avg_education = df['escolaridad_promedio'].mean()
+            avg_education = totales['escolaridad_promedio']
             st.metric(
                 label="🎓 Escolaridad Promedio",
                 value=f"{avg_education:.1f}",
-                delta="años de estudio"
+                delta="años de estudio",
+                help=f"{totales['porcentaje_imputado_escolaridad_promedio']:.1f}% de la población del promedio "
+                     "está en localidades con escolaridad reservada (*), estimada"
             )
     
-    def create_municipality_ranking(self, df):
-        """Crea un ranking de municipios por diferentes métricas"""
-        municipality_stats = df.groupby('municipio').agg({
-            'pob_total': 'sum',
-            'escolaridad_promedio': 'mean',
-            'pob_indigena': 'sum',
-            'pob_sin_salud': 'sum',
-            'total_viviendas': 'sum',
-            'viviendas_habitadas': 'sum'
-        }).reset_index()
-        
-        municipality_stats['porcentaje_indigena'] = (municipality_stats['pob_indigena'] / municipality_stats['pob_total'] * 100).round(2)
-        municipality_stats['porcentaje_sin_salud'] = (municipality_stats['pob_sin_salud'] / municipality_stats['pob_total'] * 100).round(2)
-        municipality_stats['ocupacion_viviendas'] = (municipality_stats['viviendas_habitadas'] / municipality_stats['total_viviendas'] * 100).round(2)
-        
-        fig = make_subplots(
-            rows=2, cols=2,
-            subplot_titles=('Población por Municipio', 'Escolaridad Promedio por Municipio', 
-                          '% Población Indígena', '% Sin Servicios de Salud'),
-            specs=[[{"secondary_y": False}, {"secondary_y": False}],
-                   [{"secondary_y": False}, {"secondary_y": False}]]
-        )
-        
-        # Ordenar por población para los gráficos
-        municipality_stats_sorted = municipality_stats.sort_values('pob_total', ascending=True)
-        
-        # Gráfico 1: Población por municipio
-        fig.add_trace(
-            go.Bar(y=municipality_stats_sorted['municipio'], 
-                   x=municipality_stats_sorted['pob_total'], 
-                   name='Población', marker_color='#3498db', orientation='h'),
-            row=1, col=1
-        )
-        
-        # Gráfico 2: Escolaridad por municipio
-        municipality_education = municipality_stats.sort_values('escolaridad_promedio', ascending=True)
-        fig.add_trace(
-            go.Bar(y=municipality_education['municipio'], 
-                   x=municipality_education['escolaridad_promedio'], 
-                   name='Escolaridad', marker_color='#2ecc71', orientation='h'),
-            row=1, col=2
-        )
-        
-        # Gráfico 3: % Población indígena
-        municipality_indigenous = municipality_stats.sort_values('porcentaje_indigena', ascending=True)
-        fig.add_trace(
-            go.Bar(y=municipality_indigenous['municipio'], 
-                   x=municipality_indigenous['porcentaje_indigena'], 
-                   name='% Indígena', marker_color='#e74c3c', orientation='h'),
-            row=2, col=1
-        )
+    def create_top_localities_table(self, df, metric='pob_total', top_n=20):
+        """Crea una tabla con las principales localidades según una métrica"""
+        metric_names = {
+            'pob_total': 'Población Total',
+            'escolaridad_promedio': 'Escolaridad Promedio',
+            'porcentaje_indigena': '% Población Indígena',
+            'porcentaje_sin_salud': '% Sin Servicios de Salud',
+            'personas_por_vivienda': 'Personas por Vivienda'
+        }
         
-        # Gráfico 4: % Sin servicios de salud
-        municipality_health = municipality_stats.sort_values('porcentaje_sin_salud', ascending=True)
-        fig.add_trace(
-            go.Bar(y=municipality_health['municipio'], 
-                   x=municipality_health['porcentaje_sin_salud'], 
-                   name='% Sin Salud', marker_color='#f39c12', orientation='h'),
-            row=2, col=2
-        )
+        top_localities = df.nlargest(top_n, metric)[
+            ['municipio', 'localidad', 'pob_total', 'escolaridad_promedio', 
+             'porcentaje_indigena', 'porcentaje_sin_salud', 'personas_por_vivienda']
+        ].round(2)
         
-        fig.update_layout(height=800, showlegend=False, template="plotly_white", 
-                         title_text="Análisis Comparativo de Municipios en Nayarit")
+        top_localities.columns = ['Municipio', 'Localidad', 'Población', 'Escolaridad', 
+                                 '% Indígena', '% Sin Salud', 'Personas/Vivienda']
         
-        return fig
+        return top_localities
     
-    def create_locality_analysis(self, df, selected_municipality=None):
-        """Análisis de localidades dentro de un municipio"""
-        if selected_municipality and selected_municipality != "Todos los municipios":
-            df_filtered = df[df['municipio'] == selected_municipality]
-            title_suffix = f" - {selected_municipality}"
-        else:
-            # Mostrar las localidades más grandes del estado
-            df_filtered = df.nlargest(20, 'pob_total')
-            title_suffix = " - Top 20 Localidades"
-        
-        fig = make_subplots(
-            rows=1, cols=2,
-            subplot_titles=(f'Población por Localidad{title_suffix}', 
-                          f'Escolaridad vs Acceso a Salud{title_suffix}')
-        )
-        
-        # Gráfico 1: Población por localidad
-        df_sorted = df_filtered.sort_values('pob_total', ascending=True).tail(15)  # Top 15
-        
-        fig.add_trace(
-            go.Bar(y=df_sorted['localidad'], 
-                   x=df_sorted['pob_total'],
-                   name='Población',
-                   marker_color='#9b59b6',
-                   orientation='h'),
-            row=1, col=1
-        )
-        
-        # Gráfico 2: Scatter de escolaridad vs acceso a salud
-        fig.add_trace(
-            go.Scatter(x=df_filtered['escolaridad_promedio'],
-                      y=df_filtered['porcentaje_con_salud'],
-                      mode='markers',
-                      marker=dict(size=df_filtered['pob_total']/1000,
-                                 color=df_filtered['porcentaje_indigena'],
-                                 colorscale='Viridis',
-                                 showscale=True,
-                                 colorbar=dict(title="% Población<br>Indígena")),
-                      text=df_filtered['localidad'],
-                      name='Localidades',
-                      hovertemplate='Localidad: %{text}<br>' +
-                                   'Escolaridad: %{x:.1f} años<br>' +
-                                   'Con Salud: %{y:.1f}%<br>' +
-                                   'Población: %{marker.size}k<extra></extra>'),
-            row=1, col=2
-        )
-        
-        fig.update_layout(height=600, template="plotly_white", showlegend=False)
-        fig.update_xaxes(title_text="Población", row=1, col=1)
-        fig.update_yaxes(title_text="Localidad", row=1, col=1)
-        fig.update_xaxes(title_text="Escolaridad Promedio (años)", row=1, col=2)
-        fig.update_yaxes(title_text="% Población con Servicios de Salud", row=1, col=2)
-        
+    def create_distribution_charts(self, boceto, label):
+        """Histograma y caja de una columna a partir de su boceto (sin recorrer las filas)"""
+        import numpy as np
+        import plotly.graph_objects as go
+        from plotly.subplots import make_subplots
+        
+        # Hasta el percentil 99: las localidades más grandes aplastarían el resto del histograma
+        p99 = boceto.cuantiles([0.99])[0]
+        edges = np.linspace(boceto.minimo, max(p99, boceto.minimo + 1e-9), 31)
+        counts = boceto.histograma(edges)
+        q1, median, q3 = boceto.cuantiles([0.25, 0.5, 0.75])
+        iqr = q3 - q1
+        
+        fig = make_subplots(rows=1, cols=2, column_widths=[0.7, 0.3],
+                            subplot_titles=(f'Histograma (hasta p99 = {p99:,.1f})', 'Caja'))
+        fig.add_trace(go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, width=np.diff(edges),
+                             marker_color='#3498db', name='Localidades'), row=1, col=1)
+        fig.add_trace(go.Box(q1=[q1], median=[median], q3=[q3],
+                             lowerfence=[max(boceto.minimo, q1 - 1.5 * iqr)],
+                             upperfence=[min(boceto.maximo, q3 + 1.5 * iqr)],
+                             mean=[boceto.media], sd=[boceto.desviacion], name=label,
+                             marker_color='#2ecc71'), row=1, col=2)
+        fig.update_layout(height=400, template="plotly_white", showlegend=False,
+                          title_text=f"Distribución de {label}")
         return fig
     
-    def create_demographic_pyramid(self, df, selected_municipality=None):
-        """Crea una pirámide demográfica para Nayarit o un municipio específico"""
-        if selected_municipality and selected_municipality != "Todos los municipios":
-            df_filtered = df[df['municipio'] == selected_municipality]
-            title = f"Pirámide Poblacional - {selected_municipality}"
-        else:
-            df_filtered = df
-            title = "Pirámide Poblacional - Nayarit"
-        
-        total_women = df_filtered['pob_femenina'].sum()
-        total_men = df_filtered['pob_masculina'].sum()
-        
-        # Crear grupos de edad aproximados basados en distribución típica de México
-        age_groups = ['0-14', '15-29', '30-44', '45-59', '60-74', '75+']
-        age_distribution = [0.27, 0.26, 0.20, 0.15, 0.09, 0.03]
-        
-        women_by_age = [total_women * dist for dist in age_distribution]
-        men_by_age = [-total_men * dist for dist in age_distribution]
-        
-        fig = go.Figure()
-        
-        fig.add_trace(go.Bar(
-            y=age_groups,
-            x=women_by_age,
-            name='Mujeres',
-            orientation='h',
-            marker_color='#FF69B4',
-            text=[f'{val:,.0f}' for val in women_by_age],
-            textposition='inside'
+    def create_correlation_heatmap(self, correlation, labels):
+        """Mapa de calor de la matriz de correlación entre indicadores"""
+        import plotly.graph_objects as go
+        names = [labels.get(col, col) for col in correlation.columns]
+        fig = go.Figure(go.Heatmap(
+            z=correlation.values, x=names, y=names,
+            zmin=-1, zmax=1, colorscale='RdBu', reversescale=True,
+            text=correlation.values.round(2), texttemplate='%{text}'
         ))
-        
-        fig.add_trace(go.Bar(
-            y=age_groups,
-            x=men_by_age,
-            name='Hombres',
-            orientation='h',
-            marker_color='#4169E1',
-            text=[f'{abs(val):,.0f}' for val in men_by_age],
-            textposition='inside'
-        ))
-        
-        fig.update_layout(
-            title=title,
-            xaxis_title="Población",
-            yaxis_title="Grupos de Edad",
-            barmode='relative',
-            height=500,
-            template="plotly_white",
-            legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+        fig.update_layout(height=600, template="plotly_white", title="Correlación entre Indicadores")
+        return fig
+    
+    def create_typology_map(self, df, components, labels, variance):
+        """Localidades en los dos primeros componentes principales, coloreadas por tipología"""
+        import plotly.express as px
+        fig = px.scatter(
+            x=components[:, 0], y=components[:, 1],
+            color=[f"Tipología {label + 1}" for label in labels],
+            hover_name=df['localidad'].to_numpy(),
+            hover_data={'Municipio': df['municipio'].to_numpy(), 'Población': df['pob_total'].to_numpy()},
+            labels={'x': f"Componente 1 ({variance[0]:.0%})", 'y': f"Componente 2 ({variance[1]:.0%})"},
+            title="Mapa de Tipologías de Localidades",
+            height=600, template="plotly_white"
         )
-        
+        fig.update_traces(marker=dict(size=6, opacity=0.7))
         return fig
     
-    def create_housing_analysis(self, df):
-        """Análisis detallado de vivienda por municipio"""
-        housing_stats = df.groupby('municipio').agg({
-            'total_viviendas': 'sum',
-            'viviendas_habitadas': 'sum',
-            'viviendas_particulares': 'sum',
-            'pob_total': 'sum'
-        }).reset_index()
-        
-        housing_stats['porcentaje_ocupacion'] = (housing_stats['viviendas_habitadas'] / housing_stats['total_viviendas'] * 100).round(2)
-        housing_stats['personas_por_vivienda'] = (housing_stats['pob_total'] / housing_stats['viviendas_habitadas']).round(2)
-        housing_stats['viviendas_desocupadas'] = housing_stats['total_viviendas'] - housing_stats['viviendas_habitadas']
-        
-        fig = make_subplots(
-            rows=2, cols=2,
-            subplot_titles=('Total de Viviendas por Municipio', 
-                          'Porcentaje de Ocupación',
-                          'Personas por Vivienda',
-                          'Viviendas Desocupadas'),
-            specs=[[{"secondary_y": False}, {"secondary_y": False}],
-                   [{"secondary_y": False}, {"secondary_y": False}]]
+    @panel("Comparación de municipios")
+    def show_municipality_comparison(self, df, municipalities):
+        """Porcentajes demográficos de varios municipios lado a lado"""
+        from comparacion import porcentajes_demograficos
+        st.subheader("🔀 Comparar Municipios")
+        municipios_comparar = st.multiselect(
+            "Selecciona los municipios a comparar:",
+            options=municipalities[1:],
+            key="municipios_comparar"
         )
         
-        # Ordenar por total de viviendas
-        housing_sorted = housing_stats.sort_values('total_viviendas', ascending=True)
+        if municipios_comparar:
+            comparacion = porcentajes_demograficos(df, 'municipio', municipios_comparar)
+            for inicio in range(0, len(municipios_comparar), 4):
+                columnas = st.columns(4)
+                for columna, (nombre, fila) in zip(columnas, comparacion.iloc[inicio:inicio + 4].iterrows()):
+                    with columna:
+                        st.markdown(f"**{nombre}**")
+                        st.metric("🏺 Indígena", f"{fila['porcentaje_indigena']:.1f}%")
+                        st.metric("♿ Discapacidad", f"{fila['porcentaje_discapacidad']:.1f}%")
+                        st.metric("💼 Económicamente Activa", f"{fila['porcentaje_pea']:.1f}%")
+            
+            tabla_comparacion = comparacion.round(2)
+            tabla_comparacion.columns = ['Población', '% Indígena', '% Discapacidad', '% PEA']
+            st.dataframe(tabla_comparacion, use_container_width=True)
+    
+    @panel("Rankings")
+    def show_rankings(self, df):
+        """Selector de métrica y tabla de las principales localidades"""
+        # Selector de métrica para ranking
+        metric_options = {
+            'pob_total': 'Población Total',
+            'escolaridad_promedio': 'Escolaridad Promedio',
+            'porcentaje_indigena': '% Población Indígena',
+            'porcentaje_sin_salud': '% Sin Servicios de Salud',
+            'personas_por_vivienda': 'Personas por Vivienda'
+        }
         
-        # Gráfico 1: Total viviendas
-        fig.add_trace(
-            go.Bar(y=housing_sorted['municipio'], 
-                   x=housing_sorted['total_viviendas'],
-                   name='Total Viviendas', marker_color='#3498db', orientation='h'),
-            row=1, col=1
+        selected_metric = st.selectbox(
+            "Selecciona la métrica para el ranking:",
+            options=list(metric_options.keys()),
+            format_func=lambda x: metric_options[x]
         )
         
-        # Gráfico 2: % Ocupación
-        occupancy_sorted = housing_stats.sort_values('porcentaje_ocupacion', ascending=True)
-        fig.add_trace(
-            go.Bar(y=occupancy_sorted['municipio'], 
-                   x=occupancy_sorted['porcentaje_ocupacion'],
-                   name='% Ocupación', marker_color='#2ecc71', orientation='h'),
-            row=1, col=2
-        )
+        top_n = st.slider("Número de localidades a mostrar:", 10, 50, 20)
         
-        # Gráfico 3: Personas por vivienda
-        density_sorted = housing_stats.sort_values('personas_por_vivienda', ascending=True)
-        fig.add_trace(
-            go.Bar(y=density_sorted['municipio'], 
-                   x=density_sorted['personas_por_vivienda'],
-                   name='Personas/Vivienda', marker_color='#f39c12', orientation='h'),
-            row=2, col=1
-        )
+        # Crear tabla de ranking
+        top_table = self.create_top_localities_table(df, selected_metric, top_n)
+        st.subheader(f"🏆 Top {top_n} Localidades por {metric_options[selected_metric]}")
+        st.dataframe(top_table, use_container_width=True)
+    
+    @panel("Explorador de datos")
+    def show_data_explorer(self, df, df_filtered, selected_municipality, bocetos):
+        """Filtros adicionales, tabla, estadísticas y descarga de la selección"""
+        from indicadores import ETIQUETAS
         
-        # Gráfico 4: Viviendas desocupadas
-        empty_sorted = housing_stats.sort_values('viviendas_desocupadas', ascending=True)
-        fig.add_trace(
-            go.Bar(y=empty_sorted['municipio'], 
-                   x=empty_sorted['viviendas_desocupadas'],
-                   name='Viviendas Vacías', marker_color='#e74c3c', orientation='h'),
-            row=2, col=2
-        )
+        # Filtros adicionales
+        col1, col2 = st.columns(2)
+        with col1:
+            min_population = st.number_input("Población mínima:", 0, int(df['pob_total'].max()), 0)
+        with col2:
+            num_records = st.selectbox("Registros a mostrar:", [25, 50, 100, 500, 1000])
         
-        fig.update_layout(height=800, showlegend=False, template="plotly_white",
-                         title_text="Análisis de Vivienda por Municipio")
+        # Filtrar por población mínima
+        df_display = df_filtered[df_filtered['pob_total'] >= min_population]
         
-        return fig
-    
-    def create_top_localities_table(self, df, metric='pob_total', top_n=20):
-        """Crea una tabla con las principales localidades según una métrica"""
-        metric_names = {
+        st.subheader(f"Datos de {selected_municipality if selected_municipality != 'Todos los municipios' else 'Nayarit'}")
+        st.write(f"Mostrando {min(len(df_display), num_records)} de {len(df_display)} registros")
+        
+        # Seleccionar columnas a mostrar
+        available_columns = {
+            'municipio': 'Municipio',
+            'localidad': 'Localidad',
             'pob_total': 'Población Total',
+            'pob_femenina': 'Población Femenina',
+            'pob_masculina': 'Población Masculina',
             'escolaridad_promedio': 'Escolaridad Promedio',
-            'porcentaje_indigena': '% Población Indígena',
-            'porcentaje_sin_salud': '% Sin Servicios de Salud',
-            'personas_por_vivienda': 'Personas por Vivienda'
+            'pob_indigena': 'Población Indígena',
+            'pob_discapacidad': 'Población con Discapacidad',
+            'pob_economicamente_activa': 'Población Económicamente Activa',
+            'pob_sin_salud': 'Sin Servicios de Salud',
+            'pob_con_salud': 'Con Servicios de Salud',
+            'total_viviendas': 'Total Viviendas',
+            'viviendas_habitadas': 'Viviendas Habitadas',
+            **{nombre: etiqueta for nombre, etiqueta in ETIQUETAS.items() if nombre in df.columns}
         }
         
-        top_localities = df.nlargest(top_n, metric)[
-            ['municipio', 'localidad', 'pob_total', 'escolaridad_promedio', 
-             'porcentaje_indigena', 'porcentaje_sin_salud', 'personas_por_vivienda']
-        ].round(2)
+        selected_columns = st.multiselect(
+            "Selecciona las columnas a mostrar:",
+            options=list(available_columns.keys()),
+            default=['municipio', 'localidad', 'pob_total', 'escolaridad_promedio', 'porcentaje_indigena'],
+            format_func=lambda x: available_columns[x]
+        )
         
-        top_localities.columns = ['Municipio', 'Localidad', 'Población', 'Escolaridad', 
-                                 '% Indígena', '% Sin Salud', 'Personas/Vivienda']
+        if selected_columns:
+            # Mostrar datos
+            display_df = df_display[selected_columns].head(num_records)
+            
+            # Formatear nombres de columnas
+            display_df.columns = [available_columns[col] for col in selected_columns]
+            
+            st.dataframe(display_df, use_container_width=True)
+            
+            # Estadísticas descriptivas de toda la selección, combinando los bocetos
+            # por municipio y rango de población en lugar de ordenar las filas
+            numeric_cols = [col for col in selected_columns if col in bocetos.columnas]
+            if len(numeric_cols) > 0:
+                groups = None if selected_municipality == "Todos los municipios" else [selected_municipality]
+                st.subheader("📊 Estadísticas Descriptivas")
+                st.caption(f"Sobre las {len(df_display):,} localidades de la selección")
+                stats_df = bocetos.describir(numeric_cols, groups, min_population, df_filtered).round(2)
+                stats_df.columns = [available_columns[col] for col in numeric_cols]
+                st.dataframe(stats_df, use_container_width=True)
+                
+                distribution_col = st.selectbox("Distribución de:", numeric_cols,
+                                                format_func=lambda x: available_columns[x])
+                boceto = bocetos.combinar([distribution_col], groups, min_population, df_filtered)[distribution_col]
+                if boceto.n:
+                    st.plotly_chart(self.create_distribution_charts(boceto, available_columns[distribution_col]),
+                                    use_container_width=True)
+            
+            # Botón para descargar datos
+            csv = display_df.to_csv(index=False)
+            st.download_button(
+                label="📥 Descargar datos como CSV",
+                data=csv,
+                file_name=f"datos_nayarit_{selected_municipality.replace(' ', '_') if selected_municipality != 'Todos los municipios' else 'completo'}.csv",
+                mime='text/csv',
+                on_click="ignore"
+            )
+        else:
+            st.warning("Por favor selecciona al menos una columna para mostrar.")
+    
+    @panel("Tipologías")
+    def show_typologies(self, df_filtered, version, selected_municipality):
+        """Mapa de tipologías, perfiles y correlaciones de las localidades"""
+        import analitica
+        from indicadores import ETIQUETAS as indicator_names
+        from trabajos import ESPERA_BREVE, mostrar_progreso
+        
+        col1, col2, col3 = st.columns([3, 1, 1])
+        with col1:
+            selected_indicators = st.multiselect(
+                "Indicadores para el análisis:",
+                options=analitica.INDICADORES,
+                default=analitica.INDICADORES,
+                format_func=lambda x: indicator_names.get(x, x)
+            )
+        with col2:
+            num_clusters = st.slider("Número de tipologías:", 2, 10, 5)
+        with col3:
+            cluster_method = st.radio("Método:", ['kmeans', 'jerarquico'],
+                                      format_func=lambda x: 'K-means' if x == 'kmeans' else 'Jerárquico (Ward)')
         
-        return top_localities
+        if len(selected_indicators) < 2 or len(df_filtered) <= num_clusters:
+            st.warning("Selecciona al menos dos indicadores y un área con más localidades que tipologías.")
+        else:
+            trabajo = calcular_tipologias(
+                df_filtered, version, selected_municipality,
+                tuple(selected_indicators), num_clusters, cluster_method
+            )
+            if not trabajo.esperar(ESPERA_BREVE) or trabajo.estado == 'error':
+                # Corre en la cola: la barra se refresca sola y el resto de la página sigue disponible
+                mostrar_progreso(trabajo, "Calculando tipologías...")
+                return
+            correlation, labels, profiles, components, variance = trabajo.resultado()
+            
+            st.plotly_chart(self.create_typology_map(df_filtered, components, labels, variance),
+                            use_container_width=True)
+            
+            st.subheader("📊 Perfil de cada Tipología")
+            profiles = profiles.rename(columns={'localidades': 'Localidades', **indicator_names})
+            profiles.index = [f"Tipología {i + 1}" for i in profiles.index]
+            st.dataframe(profiles, use_container_width=True)
+            
+            st.plotly_chart(self.create_correlation_heatmap(correlation, indicator_names),
+                            use_container_width=True)
+
+@st.cache_resource
+def cola_trabajos():
+    """Cola de trabajos del proceso, compartida por todas las sesiones"""
+    from trabajos import ColaTrabajos
+    return ColaTrabajos()
+
+def calcular_tipologias(df, version, filtro, columnas, k, metodo):
+    """Trabajo de correlaciones, tipologías y componentes (uno por versión del dataset, filtro y parámetros)"""
+    import analitica
+    from trabajos import clave_trabajo
+    clave = clave_trabajo('tipologias', version, filtro, columnas, k, metodo)
+    return cola_trabajos().enviar('tipologias', clave, analitica.tipologias, df, list(columnas), k, metodo)
+
+@st.cache_resource(max_entries=16)
+def construir_bocetos(_df, version):
+    """Bocetos de distribución por municipio y rango de población (uno por versión del dataset)"""
+    from cuantiles import BocetosDistribucion
+    return BocetosDistribucion(_df)
+
+@st.cache_resource(max_entries=16)
+def construir_jerarquia(_df, version):
+    """Agregados por localidad, municipio, entidad y total (uno por versión del dataset)"""
+    from jerarquia import Jerarquia
+    return Jerarquia(_df)
+
+@st.cache_resource(max_entries=16)
+def snapshot_de_dataset(dataset_id, firma):
+    """Snapshot de arranque si el dataset es el archivo con el que se generó (None si no)"""
+    import arranque
+    estado = arranque.cargar()
+    if estado is not None and estado.origen == dataset_id:
+        return estado
+    return None
+
+def registrar_carga(archivo):
+    """Id del dataset y validación del archivo subido.
+    
+    El archivo se hashea y se guarda en el almacén solo la primera vez que
+    llega a la sesión; los reruns encuentran el id por ``file_id`` sin leer
+    sus bytes. Un archivo nuevo se procesa en la cola de trabajos: mientras
+    tanto se muestra su avance y el script se detiene, y otra sesión que
+    sube el mismo archivo espera el mismo trabajo.
+    """
+    from almacen import huella_archivo
+    from cargas import GestorCargas
+    from trabajos import ESPERA_BREVE, mostrar_progreso
+    cargas = st.session_state.setdefault("cargas", {})
+    if archivo.file_id not in cargas:
+        gestor = GestorCargas()
+        contenido = archivo.getvalue()
+        dataset_id = huella_archivo(contenido)
+        if gestor.existe(dataset_id):
+            cargas[archivo.file_id] = dataset_id, gestor.validacion(dataset_id)
+        else:
+            # El almacén del dataset ya es el resultado persistente: el trabajo no se guarda aparte
+            trabajo = cola_trabajos().enviar('carga', dataset_id, gestor.registrar, contenido, archivo.name,
+                                             persistir=False)
+            if not trabajo.esperar(ESPERA_BREVE):
+                mostrar_progreso(trabajo, 'Cargando y procesando datos de Nayarit...')
+                st.stop()
+            cargas[archivo.file_id] = trabajo.resultado()  # si el trabajo falló, lanza su error
+    return cargas[archivo.file_id]
 
 def main():
     """Función principal del dashboard"""
+    inicio_script = time.perf_counter()
     
     # Título principal
     st.title("🏖️ Dashboard Demográfico de Nayarit")
     st.markdown("*Análisis detallado por municipios y localidades*")
     st.markdown("---")
     
-    # Inicializar el dashboard
-    dashboard = NayaritDashboard()
-    
     # Sidebar para carga de archivo
     st.sidebar.header("📊 Configuración")
     uploaded_file = st.sidebar.file_uploader(
@@ -445,12 +425,43 @@ def main():
     )
     
     if uploaded_file is not None:
-        # Cargar datos
-        with st.spinner('Cargando y procesando datos de Nayarit...'):
-            df = dashboard.load_data(uploaded_file)
+        import arranque
+        import plotly.express as px
+        from esquema import ESQUEMA_ITER
+        from indicadores import formatear
+        
+        # Inicializar el dashboard
+        dashboard = NayaritDashboard()
+        
+        try:
+            dataset_id, validacion = registrar_carga(uploaded_file)
+        except Exception as e:
+            st.error(f"Error al cargar el archivo: {e}")
+            dataset_id, validacion = None, None
+        
+        # Mismo archivo que el snapshot de arranque: el estado ya está preparado
+        estado = snapshot_de_dataset(dataset_id, arranque.firma()) if dataset_id else None
+        if estado:
+            df, validacion = estado.df, estado.validacion
+            jerarquia = estado.jerarquia
+        elif validacion is not None and validacion.es_valido:
+            df = dashboard.load_data(dataset_id)
+        else:
+            df = None
         
         if df is not None:
-            st.success(f"✅ Datos cargados exitosamente: {len(df):,} localidades en {df['municipio'].nunique()} municipios")
+            if not estado:
+                jerarquia = construir_jerarquia(df, dataset_id)
+            bocetos = estado.bocetos if estado else construir_bocetos(df, dataset_id)
+            totales = jerarquia.fila('nacional')
+            
+            st.success(f"✅ Datos cargados exitosamente: {len(df):,} localidades en {totales['municipios']:,.0f} municipios")
+            
+            if validacion.advertencias or validacion.conteos[['marcadores', 'invalidas']].to_numpy().any():
+                with st.expander(f"🔎 Diagnóstico de validación ({validacion.tiempo_ms:.0f} ms)"):
+                    for advertencia in validacion.advertencias:
+                        st.warning(advertencia)
+                    st.dataframe(validacion.resumen(), use_container_width=True)
             
             # Filtros en el sidebar
             st.sidebar.markdown("---")
@@ -470,47 +481,45 @@ def main():
             # Filtrar datos según selección
             if selected_municipality != "Todos los municipios":
                 df_filtered = df[df['municipio'] == selected_municipality]
+                totales_filtro = jerarquia.municipio(selected_municipality)
                 st.info(f"Mostrando datos para: **{selected_municipality}** ({len(df_filtered)} localidades)")
             else:
                 df_filtered = df
+                totales_filtro = totales
             
             # Métricas generales
             st.header("📈 Resumen de Nayarit")
-            dashboard.show_overview_metrics(df)
+            dashboard.show_overview_metrics(totales)
             
             st.markdown("---")
             
             # Tabs para organizar el contenido
-            tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
+            tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs([
                 "🏛️ Municipios", 
                 "🏘️ Localidades", 
                 "👥 Demografía", 
                 "🏠 Vivienda",
                 "📊 Rankings",
-                "📋 Datos"
+                "📋 Datos",
+                "🧬 Tipologías"
             ])
             
             with tab1:
                 st.header("Análisis por Municipios")
-                municipality_fig = dashboard.create_municipality_ranking(df)
+                municipality_fig = estado.figura('municipios') if estado else create_municipality_ranking(jerarquia)
                 st.plotly_chart(municipality_fig, use_container_width=True)
                 
                 # Tabla resumen de municipios
                 st.subheader("📊 Resumen por Municipios")
-                municipality_summary = df.groupby('municipio').agg({
-                    'localidad': 'count',
-                    'pob_total': 'sum',
-                    'escolaridad_promedio': 'mean',
-                    'porcentaje_indigena': 'mean',
-                    'porcentaje_sin_salud': 'mean'
-                }).round(2)
-                municipality_summary.columns = ['Localidades', 'Población', 'Escolaridad Prom.', '% Indígena Prom.', '% Sin Salud Prom.']
-                municipality_summary = municipality_summary.sort_values('Población', ascending=False)
-                st.dataframe(municipality_summary, use_container_width=True)
+                summary_table = estado.resumen if estado else municipality_summary(jerarquia)
+                st.dataframe(summary_table, use_container_width=True)
             
             with tab2:
                 st.header("Análisis de Localidades")
-                locality_fig = dashboard.create_locality_analysis(df, selected_municipality)
+                if estado and selected_municipality == "Todos los municipios":
+                    locality_fig = estado.figura('localidades')
+                else:
+                    locality_fig = create_locality_analysis(df, selected_municipality)
                 st.plotly_chart(locality_fig, use_container_width=True)
                 
                 if selected_municipality != "Todos los municipios":
@@ -529,13 +538,16 @@ def main():
                 
                 with col1:
                     # Pirámide poblacional
-                    pyramid_fig = dashboard.create_demographic_pyramid(df, selected_municipality)
+                    if estado and selected_municipality == "Todos los municipios":
+                        pyramid_fig = estado.figura('piramide')
+                    else:
+                        pyramid_fig = create_demographic_pyramid(df, selected_municipality)
                     st.plotly_chart(pyramid_fig, use_container_width=True)
                 
                 with col2:
                     # Distribución por género en el área seleccionada
-                    total_women = df_filtered['pob_femenina'].sum()
-                    total_men = df_filtered['pob_masculina'].sum()
+                    total_women = totales_filtro['pob_femenina']
+                    total_men = totales_filtro['pob_masculina']
                     
                     gender_fig = px.pie(
                         values=[total_women, total_men],
@@ -548,120 +560,41 @@ def main():
                 # Métricas demográficas adicionales
                 col3, col4, col5 = st.columns(3)
                 with col3:
-                    indigenous_pct = (df_filtered['pob_indigena'].sum() / df_filtered['pob_total'].sum() * 100)
-                    st.metric("🏺 Población Indígena", f"{indigenous_pct:.1f}%")
+                    st.metric("🏺 Población Indígena",
+                              formatear('porcentaje_indigena', totales_filtro['porcentaje_indigena']))
                 
                 with col4:
-                    disability_pct = (df_filtered['pob_discapacidad'].sum() / df_filtered['pob_total'].sum() * 100)
-                    st.metric("♿ Población con Discapacidad", f"{disability_pct:.1f}%")
+                    st.metric("♿ Población con Discapacidad",
+                              formatear('porcentaje_discapacidad', totales_filtro['porcentaje_discapacidad']))
                 
                 with col5:
-                    active_pct = (df_filtered['pob_economicamente_activa'].sum() / df_filtered['pob_total'].sum() * 100)
-                    st.metric("💼 Población Económicamente Activa", f"{active_pct:.1f}%")
+                    st.metric("💼 Población Económicamente Activa",
+                              formatear('porcentaje_pea', totales_filtro['porcentaje_pea']))
+                
+                # Comparación de varios municipios en una sola pasada
+                dashboard.show_municipality_comparison(df, municipalities)
             
             with tab4:
                 st.header("Análisis de Vivienda")
-                housing_fig = dashboard.create_housing_analysis(df)
+                housing_fig = estado.figura('vivienda') if estado else create_housing_analysis(jerarquia)
                 st.plotly_chart(housing_fig, use_container_width=True)
             
             with tab5:
                 st.header("Rankings y Top Localidades")
-                
-                # Selector de métrica para ranking
-                metric_options = {
-                    'pob_total': 'Población Total',
-                    'escolaridad_promedio': 'Escolaridad Promedio',
-                    'porcentaje_indigena': '% Población Indígena',
-                    'porcentaje_sin_salud': '% Sin Servicios de Salud',
-                    'personas_por_vivienda': 'Personas por Vivienda'
-                }
-                
-                selected_metric = st.selectbox(
-                    "Selecciona la métrica para el ranking:",
-                    options=list(metric_options.keys()),
-                    format_func=lambda x: metric_options[x]
-                )
-                
-                top_n = st.slider("Número de localidades a mostrar:", 10, 50, 20)
-                
-                # Crear tabla de ranking
-                top_table = dashboard.create_top_localities_table(df, selected_metric, top_n)
-                st.subheader(f"🏆 Top {top_n} Localidades por {metric_options[selected_metric]}")
-                st.dataframe(top_table, use_container_width=True)
+                dashboard.show_rankings(df)
             
             with tab6:
                 st.header("Explorador de Datos")
-                
-                # Filtros adicionales
-                col1, col2 = st.columns(2)
-                with col1:
-                    min_population = st.number_input("Población mínima:", 0, int(df['pob_total'].max()), 0)
-                with col2:
-                    num_records = st.selectbox("Registros a mostrar:", [25, 50, 100, 500, 1000])
-                
-                # Filtrar por población mínima
-                df_display = df_filtered[df_filtered['pob_total'] >= min_population]
-                
-                st.subheader(f"Datos de {selected_municipality if selected_municipality != 'Todos los municipios' else 'Nayarit'}")
-                st.write(f"Mostrando {min(len(df_display), num_records)} de {len(df_display)} registros")
-                
-                # Seleccionar columnas a mostrar
-                available_columns = {
-                    'municipio': 'Municipio',
-                    'localidad': 'Localidad',
-                    'pob_total': 'Población Total',
-                    'pob_femenina': 'Población Femenina',
-                    'pob_masculina': 'Población Masculina',
-                    'escolaridad_promedio': 'Escolaridad Promedio',
-                    'pob_indigena': 'Población Indígena',
-                    'pob_discapacidad': 'Población con Discapacidad',
-                    'pob_economicamente_activa': 'Población Económicamente Activa',
-                    'pob_sin_salud': 'Sin Servicios de Salud',
-                    'pob_con_salud': 'Con Servicios de Salud',
-                    'total_viviendas': 'Total Viviendas',
-                    'viviendas_habitadas': 'Viviendas Habitadas',
-                    'personas_por_vivienda': 'Personas por Vivienda',
-                    'porcentaje_mujeres': '% Mujeres',
-                    'porcentaje_hombres': '% Hombres',
-                    'porcentaje_indigena': '% Población Indígena',
-                    'porcentaje_discapacidad': '% Población con Discapacidad',
-                    'porcentaje_sin_salud': '% Sin Servicios de Salud',
-                    'porcentaje_con_salud': '% Con Servicios de Salud'
-                }
-                
-                selected_columns = st.multiselect(
-                    "Selecciona las columnas a mostrar:",
-                    options=list(available_columns.keys()),
-                    default=['municipio', 'localidad', 'pob_total', 'escolaridad_promedio', 'porcentaje_indigena'],
-                    format_func=lambda x: available_columns[x]
-                )
-                
-                if selected_columns:
-                    # Mostrar datos
-                    display_df = df_display[selected_columns].head(num_records)
-                    
-                    # Formatear nombres de columnas
-                    display_df.columns = [available_columns[col] for col in selected_columns]
-                    
-                    st.dataframe(display_df, use_container_width=True)
-                    
-                    # Estadísticas descriptivas
-                    st.subheader("📊 Estadísticas Descriptivas")
-                    numeric_cols = display_df.select_dtypes(include=[np.number]).columns
-                    if len(numeric_cols) > 0:
-                        stats_df = display_df[numeric_cols].describe().round(2)
-                        st.dataframe(stats_df, use_container_width=True)
-                    
-                    # Botón para descargar datos
-                    csv = display_df.to_csv(index=False)
-                    st.download_button(
-                        label="📥 Descargar datos como CSV",
-                        data=csv,
-                        file_name=f"datos_nayarit_{selected_municipality.replace(' ', '_') if selected_municipality != 'Todos los municipios' else 'completo'}.csv",
-                        mime='text/csv'
-                    )
-                else:
-                    st.warning("Por favor selecciona al menos una columna para mostrar.")
+                dashboard.show_data_explorer(df, df_filtered, selected_municipality, bocetos)
+            
+            with tab7:
+                st.header("Tipologías de Localidades")
+                dashboard.show_typologies(df_filtered, dataset_id, selected_municipality)
+            
+            # Latencia del script completo frente a la de cada panel
+            registrar_latencia("Script completo", (time.perf_counter() - inicio_script) * 1000)
+            with st.expander("⏱️ Latencia por interacción"):
+                st.dataframe(tabla_latencias(), use_container_width=True, hide_index=True)
             
             # Información adicional en el sidebar
             st.sidebar.markdown("---")
@@ -669,13 +602,13 @@ def main():
             st.sidebar.info(f"""
             **Total de registros:** {len(df):,}
             
-            **Municipios:** {df['municipio'].nunique()}
+            **Municipios:** {totales['municipios']:,.0f}
             
-            **Localidades:** {df['localidad'].nunique()}
+            **Localidades:** {totales['localidades']:,.0f}
             
-            **Población total:** {df['pob_total'].sum():,}
+            **Población total:** {totales['pob_total']:,.0f}
             
-            **Promedio de escolaridad:** {df['escolaridad_promedio'].mean():.1f} años
+            **Promedio de escolaridad:** {totales['escolaridad_promedio']:.1f} años
             """)
             
             # Footer con información adicional
@@ -697,29 +630,19 @@ def main():
             
         else:
             st.error("❌ Error al cargar los datos. Por favor verifica el formato del archivo.")
-            st.markdown("""
-            ### 📋 Formato esperado del archivo:
-            
-            El archivo Excel debe contener las siguientes columnas:
-            - Clave de entidad federativa
-            - Nombre de la entidad
-            - Clave de municipio o demarcación territorial
-            - Nombre del municipio o demarcación territorial
-            - Clave de localidad
-            - Nombre de la localidad
-            - Población total
-            - Población femenina
-            - Población masculina
-            - Población de 3 años y más que habla alguna lengua indígena
-            - Población con discapacidad
-            - Grado promedio de escolaridad
-            - Población de 12 años y más económicamente activa
-            - Población sin afiliación a servicios de salud
-            - Población afiliada a servicios de salud
-            - Total de viviendas
-            - Total de viviendas habitadas
-            - Total de viviendas particulares
-            """)
+            
+            if validacion is not None:
+                for error in validacion.errores:
+                    st.error(error)
+                if not validacion.conteos.empty:
+                    st.subheader(f"🔎 Diagnóstico por columna ({validacion.tiempo_ms:.0f} ms)")
+                    st.dataframe(validacion.resumen(), use_container_width=True)
+            
+            st.markdown("### 📋 Formato esperado del archivo:\n\nEl archivo Excel debe contener las siguientes columnas:\n"
+                        + "\n".join(
+                            f"- {original}{' *(obligatoria)*' if corto in ESQUEMA_ITER.obligatorias else ''}"
+                            for original, corto in ESQUEMA_ITER.a_corto.items()
+                        ))
     
     else:
         # Pantalla de bienvenida
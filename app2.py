@@ -1,9 +1,21 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import numpy as np
+from esquema import ESQUEMA_ITER
+from almacen import AlmacenColumnar
+import arranque
+from compartido import DatasetCompartido, version_publicada
+from busqueda import IndiceLocalidades
+from comparacion import panel_metricas
+from datos import preparar
+from graficos import MAX_TOP, PESTANAS, figuras_de_datos
+from indicadores import formatear
+from jerarquia import Jerarquia
+from perfiles import TODAS, Perfiles, perfil_localidad, perfil_municipio, version_perfiles
+from rendimiento import panel, registrar_latencia, tabla_latencias
+from series import SeriesCensales, tcma
+import time
+
+inicio_script = time.perf_counter()
 
 # Configurar la página
 st.set_page_config(
@@ -57,34 +69,71 @@ st.markdown("""
 
 # Cargar datos con manejo de errores
 @st.cache_data
-def cargar_datos():
+def cargar_datos(version=None):
     try:
-        df = pd.read_excel("data/nayarit2_limpio.xlsx")
-        columnas_numericas = [
-            "Población total", "Población femenina", "Población masculina",
-            "Población de 3 años y más que habla alguna lengua indígena",
-            "Población con discapacidad", "Grado promedio de escolaridad",
-            "Población de 12 años y más económicamente activa",
-            "Población sin afiliación a servicios de salud",
-            "Población afiliada a servicios de salud",
-            "Total de viviendas", "Total de viviendas habitadas", "Total de viviendas particulares"
-        ]
-        for col in columnas_numericas:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors="coerce")
-        return df
+        if version is not None:
+            # Versión columnar generada por limpiar.py (la caché se invalida al cambiar la versión)
+            return AlmacenColumnar().cargar().rename(columns=ESQUEMA_ITER.a_original)
+        df = pd.read_excel(arranque.RUTA_EXCEL)
+        validacion = ESQUEMA_ITER.validar(df)
+        if not validacion.es_valido:
+            st.error("⚠️ El archivo de datos no es válido: " + "; ".join(validacion.errores))
+            return pd.DataFrame()
+        # Misma preparación que el almacén: celdas reservadas estimadas, no en cero
+        return preparar(validacion.df).rename(columns=ESQUEMA_ITER.a_original)
     except FileNotFoundError:
-        st.error("⚠️ No se pudo encontrar el archivo de datos. Asegúrate de que 'data/nayarit2_limpio.xlsx' existe.")
+        st.error(f"⚠️ No se pudo encontrar el archivo de datos. Asegúrate de que '{arranque.RUTA_EXCEL}' existe.")
         return pd.DataFrame()
     except Exception as e:
         st.error(f"⚠️ Error al cargar los datos: {str(e)}")
         return pd.DataFrame()
 
-df = cargar_datos()
+@st.cache_resource
+def abrir_compartido(version):
+    """Dataset publicado por limpiar.py, mapeado en memoria y compartido entre workers"""
+    return DatasetCompartido(columnas=ESQUEMA_ITER.a_original)
+
+version_datos = AlmacenColumnar().version()
+if version_datos is not None and version_publicada() == version_datos:
+    compartido = abrir_compartido(version_datos)
+    df = compartido.df
+else:
+    compartido = None
+    df = cargar_datos(version_datos)
 
 if df.empty:
     st.stop()
 
+@st.cache_resource
+def construir_indice(_df, _compartido, version):
+    """Índice de búsqueda de localidades (uno por versión del dataset)"""
+    if _compartido is not None:
+        return _compartido.indice()
+    estado = arranque.cargar()
+    if version is not None and estado is not None and estado.version == version:
+        return estado.indice
+    return IndiceLocalidades(_df, "Nombre de la localidad",
+                             "Nombre del municipio o demarcación territorial", "Población total")
+
+@st.cache_resource
+def construir_jerarquia(_df, _compartido, version):
+    """Agregados por localidad, municipio, entidad y total (uno por versión del dataset).
+
+    Con el archivo compartido se leen sus matrices ya sumadas en lugar de sumar de nuevo.
+    """
+    jerarquia = _compartido.jerarquia() if _compartido is not None else None
+    return jerarquia if jerarquia is not None else Jerarquia(_df, originales=True)
+
+jerarquia = construir_jerarquia(df, compartido, version_datos)
+totales = jerarquia.fila('nacional')
+
+def ir_a_localidad():
+    """Selecciona el municipio y la localidad elegidos en la búsqueda"""
+    eleccion = st.session_state.get("resultado_busqueda")
+    if eleccion is not None:
+        destino = st.session_state["destinos_busqueda"][eleccion]
+        st.session_state["municipio_select"], st.session_state["localidad_select"] = destino
+
 # Sidebar mejorado
 with st.sidebar:
     st.markdown("### 🎛️ Panel de Control")
@@ -98,11 +147,25 @@ with st.sidebar:
         • Población total: {:,}
     </div>
     """.format(
-        df["Nombre del municipio o demarcación territorial"].nunique(),
-        len(df),  # 👈 CAMBIO: Ahora cuenta todas las filas (2850)
-        df["Población total"].sum()
+        int(totales['municipios']),
+        int(totales['localidades']),  # 👈 CAMBIO: Ahora cuenta todas las filas (2850)
+        int(totales['pob_total'])
     ), unsafe_allow_html=True)
     
+    # Búsqueda directa de localidades en todo el estado
+    st.markdown("#### 🔎 Buscar Localidad")
+    consulta = st.text_input("Nombre de la localidad o municipio", key="consulta_busqueda",
+                             placeholder="p. ej. jesus maria")
+    if consulta:
+        resultados = construir_indice(df, compartido, version_datos).buscar(consulta)
+        st.session_state["destinos_busqueda"] = {
+            f"{fila.localidad} — {fila.municipio} ({fila.poblacion:,.0f} hab.)": (fila.municipio, fila.localidad)
+            for fila in resultados.itertuples()
+        }
+        st.selectbox("Resultados", list(st.session_state["destinos_busqueda"]), index=None,
+                     key="resultado_busqueda", placeholder=f"{len(resultados)} coincidencias",
+                     on_change=ir_a_localidad)
+    
     # Filtros
     st.markdown("#### 🔍 Filtros")
     municipios = sorted(df["Nombre del municipio o demarcación territorial"].dropna().unique())
@@ -111,278 +174,330 @@ with st.sidebar:
     localidades = df[df["Nombre del municipio o demarcación territorial"] == municipio]["Nombre de la localidad"].dropna().unique()
     localidad = st.selectbox("📍 Localidad", ["Todas"] + list(sorted(localidades)), key="localidad_select")
     
-    # Opciones de visualización
-    st.markdown("#### ⚙️ Opciones de Visualización")
-    top_n = st.slider("📈 Top N localidades a mostrar", 5, 20, 10)
+    # Modo comparación
+    st.markdown("#### 🔀 Comparación")
+    modo_comparacion = st.checkbox("Comparar varias áreas", key="modo_comparacion")
+    if modo_comparacion:
+        nivel_comparacion = st.radio("Nivel", ["Municipios", "Localidades"], horizontal=True,
+                                     key="nivel_comparacion")
+        municipios_comparar = st.multiselect("🏙️ Municipios a comparar", municipios, default=[municipio],
+                                             key="municipios_comparar")
+        if nivel_comparacion == "Localidades":
+            candidatas = df[df["Nombre del municipio o demarcación territorial"].isin(municipios_comparar)]
+            candidatas = candidatas[["Nombre del municipio o demarcación territorial",
+                                     "Nombre de la localidad"]].dropna().drop_duplicates()
+            opciones_localidades = {
+                f"{loc} ({mpio})": (mpio, loc) for mpio, loc in candidatas.itertuples(index=False, name=None)
+            }
+            localidades_comparar = st.multiselect("📍 Localidades a comparar", list(opciones_localidades),
+                                                  key="localidades_comparar")
 
-# Filtrar datos
-df_mpio = df[df["Nombre del municipio o demarcación territorial"] == municipio]
+# Filtrar datos (con el archivo compartido, el municipio es un rango contiguo de filas)
+if compartido is not None:
+    df_mpio = compartido.municipio(municipio)
+else:
+    df_mpio = df[df["Nombre del municipio o demarcación territorial"] == municipio]
 df_local = df_mpio if localidad == "Todas" else df_mpio[df_mpio["Nombre de la localidad"] == localidad]
 
+# Vista de comparación: todas las selecciones en un solo groupby
+if modo_comparacion:
+    if nivel_comparacion == "Municipios":
+        etiquetas = municipios_comparar
+        panel = panel_metricas(df, "Nombre del municipio o demarcación territorial", municipios_comparar,
+                               originales=True, total_estado=totales['pob_total'])
+    else:
+        etiquetas = localidades_comparar
+        panel = panel_metricas(df, ["Nombre del municipio o demarcación territorial", "Nombre de la localidad"],
+                               [opciones_localidades[etiqueta] for etiqueta in localidades_comparar],
+                               originales=True, total_estado=totales['pob_total'])
+    
+    st.markdown("## 🔀 Comparación")
+    if not etiquetas:
+        st.info("Selecciona al menos un área para comparar.")
+        st.stop()
+    
+    # Tarjetas lado a lado, hasta cuatro áreas por fila
+    for inicio in range(0, len(etiquetas), 4):
+        columnas = st.columns(4)
+        for col, etiqueta, fila in zip(columnas, etiquetas[inicio:inicio + 4], panel.iloc[inicio:inicio + 4].itertuples()):
+            with col:
+                st.markdown(f"#### {etiqueta}")
+                st.metric("👥 Población Total", f"{fila.poblacion:,.0f}",
+                          delta=f"{fila.porcentaje_estado:.1f}% del estado")
+                st.metric("🏘️ Viviendas Habitadas", f"{fila.viviendas:,.0f}",
+                          delta=f"{fila.habitantes_por_vivienda:.1f} hab/vivienda")
+                st.metric("🎓 Escolaridad Promedio",
+                          f"{fila.escolaridad:.1f}" if pd.notna(fila.escolaridad) else "N/D",
+                          delta="años de estudio")
+                st.metric("🗣️ Población Indígena", f"{fila.pob_indigena:,.0f}",
+                          delta=f"{fila.porcentaje_indigena:.1f}%")
+    
+    tabla_comparacion = panel.set_axis(etiquetas).round(2)
+    tabla_comparacion.columns = ["Población", "% del estado", "Viviendas habitadas", "Hab/vivienda",
+                                 "Escolaridad", "Población indígena", "% Indígena"]
+    st.dataframe(tabla_comparacion, use_container_width=True)
+    st.stop()
+
+@st.cache_resource
+def _abrir_perfiles(version):
+    return Perfiles()
+
+def abrir_perfiles(version):
+    """Perfiles precalculados por limpiar.py (None si no existen o son de otra versión).
+
+    La versión se revisa en cada ejecución y solo se cachean las aperturas que
+    sirven: limpiar.py cambia la versión del almacén antes de escribir los perfiles.
+    """
+    if version is None or version_perfiles() != version:
+        return None
+    return _abrir_perfiles(version)
+
+@st.cache_data
+def calcular_perfil(_df_local, _jerarquia, version, municipio, localidad):
+    """Perfil del área a partir de sus filas, cuando no hay perfiles precalculados"""
+    if _df_local.empty:
+        return None
+    entidad = _jerarquia.entidad_de_municipio(municipio)
+    if localidad == "Todas":
+        return perfil_municipio(_df_local, _jerarquia.municipio(municipio), entidad)
+    return perfil_localidad(_df_local, _jerarquia.localidad(municipio, localidad), entidad)
+
+# Perfil del área seleccionada: todos los números de las tarjetas, gráficos y
+# ficha, leídos por clave del archivo de perfiles (o calculados si no existe)
+perfiles = abrir_perfiles(version_datos)
+perfil = perfiles.perfil(municipio, TODAS if localidad == "Todas" else localidad) if perfiles else None
+if perfil is None:
+    perfil = calcular_perfil(df_local, jerarquia, version_datos, municipio, localidad)
+if perfil is None:
+    st.warning("No hay datos disponibles para la selección actual.")
+    st.stop()
+area = perfil['area']
+
 # Métricas principales mejoradas
 st.markdown("## 📊 Panel de Métricas")
 col1, col2, col3, col4 = st.columns(4)
 
 with col1:
-    poblacion_total = df_local['Población total'].sum()
     st.metric(
         "👥 Población Total", 
-        f"{poblacion_total:,.0f}",
-        delta=f"{(poblacion_total/df['Población total'].sum()*100):.1f}% del estado"
+        f"{area['pob_total']:,.0f}",
+        delta=f"{area['porcentaje_estado']:.1f}% del estado"
     )
 
 with col2:
-    viviendas = df_local['Total de viviendas habitadas'].sum()
-    promedio_hab_vivienda = poblacion_total / viviendas if viviendas > 0 else 0
     st.metric(
         "🏘️ Viviendas Habitadas", 
-        f"{viviendas:,.0f}",
-        delta=f"{promedio_hab_vivienda:.1f} hab/vivienda"
+        f"{area['viviendas_habitadas']:,.0f}",
+        delta=f"{area['personas_por_vivienda']:.1f} hab/vivienda"
     )
 
 with col3:
-    prom_escolaridad = df_local["Grado promedio de escolaridad"].mean()
     st.metric(
         "🎓 Escolaridad Promedio", 
-        f"{prom_escolaridad:.1f}" if pd.notna(prom_escolaridad) else "N/D",
-        delta="años de estudio"
+        formatear('escolaridad_promedio', area['escolaridad_promedio']),
+        delta="años de estudio",
+        help=f"{area['porcentaje_imputado_escolaridad_promedio']:.1f}% de la población del promedio "
+             "está en localidades con escolaridad reservada (*), estimada"
     )
 
 with col4:
-    pob_indigena = df_local["Población de 3 años y más que habla alguna lengua indígena"].sum()
-    pct_indigena = (pob_indigena / poblacion_total * 100) if poblacion_total > 0 else 0
     st.metric(
         "🗣️ Población Indígena", 
-        f"{pob_indigena:,.0f}",
-        delta=f"{pct_indigena:.1f}%"
+        f"{area['pob_indigena']:,.0f}",
+        delta=formatear('porcentaje_indigena', area['porcentaje_indigena']),
+        help=f"{area['porcentaje_imputado_pob_indigena']:.1f}% de la cifra es estimación de celdas reservadas (*)"
     )
 
-# Funciones de visualización mejoradas
-def crear_grafico_barras(df, x, y, titulo, color_col=None, horizontal=False):
-    """Crear gráfico de barras mejorado"""
-    df_sorted = df.sort_values(by=y, ascending=True if horizontal else False)
-    
-    if horizontal:
-        fig = px.bar(df_sorted.tail(top_n), y=x, x=y, title=titulo, 
-                     color=color_col, orientation='h', height=500)
-    else:
-        fig = px.bar(df_sorted.head(top_n), x=x, y=y, title=titulo, 
-                     color=color_col, height=500)
+# Parte estimada de las cifras del área (celdas que el INEGI reserva por confidencialidad)
+estimadas = {nombre: area[f"porcentaje_imputado_{col}"] for nombre, col in [
+    ("población indígena", 'pob_indigena'), ("población por sexo", 'pob_femenina'),
+    ("afiliación a salud", 'pob_con_salud'), ("escolaridad", 'escolaridad_promedio')]}
+if any(valor > 0 for valor in estimadas.values()):
+    st.caption("ℹ️ Estimado en localidades con datos reservados (*): "
+               + ", ".join(f"{nombre} {valor:.1f}%" for nombre, valor in estimadas.items()))
+
+# Evolución entre censos (solo si la serie tiene más de un año)
+@st.cache_data
+def tendencia_area(version, municipio, localidad):
+    """Población y viviendas del área en cada año de la serie de censos"""
+    series = SeriesCensales()
+    nombre_localidad = None if localidad == "Todas" else localidad
+    return pd.DataFrame({
+        "Población total": series.tendencia('pob_total', municipio, nombre_localidad),
+        "Viviendas habitadas": series.tendencia('viviendas_habitadas', municipio, nombre_localidad),
+    })
+
+@panel("Evolución entre censos")
+def panel_evolucion(version, municipio, localidad):
+    """Serie anual y TCMA del área seleccionada"""
+    import plotly.express as px
     
-    fig.update_layout(
-        font=dict(size=12),
-        title_font_size=16,
-        showlegend=True if color_col else False
-    )
-    return fig
-
-def crear_grafico_dona(valores, etiquetas, titulo):
-    """Crear gráfico de dona"""
-    fig = go.Figure(data=[go.Pie(
-        labels=etiquetas, 
-        values=valores, 
-        hole=.3,
-        textinfo='label+percent',
-        textposition='outside'
-    )])
-    fig.update_layout(
-        title=titulo,
-        font=dict(size=12),
-        showlegend=True,
-        height=400
-    )
-    return fig
+    tendencia = tendencia_area(version, municipio, localidad).dropna(how='all')
+    if len(tendencia) < 2:
+        st.info("El área seleccionada aparece en un solo año de la serie.")
+        return
+    desde, hasta = tendencia.index[0], tendencia.index[-1]
+    col1, col2 = st.columns(2)
+    for col, medida in zip((col1, col2), tendencia.columns):
+        inicial, final = tendencia[medida].iloc[0], tendencia[medida].iloc[-1]
+        with col:
+            st.metric(f"{medida} {hasta}", f"{final:,.0f}",
+                      delta=f"{tcma(inicial, final, hasta - desde):.2f}% anual desde {desde}")
+    fig = px.line(tendencia, markers=True, title=f"📈 Evolución {desde}–{hasta}",
+                  labels={"index": "Año", "value": "Total", "variable": ""})
+    fig.update_xaxes(tickvals=list(tendencia.index))
+    st.plotly_chart(fig, use_container_width=True)
+
+series_censales = SeriesCensales()
+if len(series_censales.anios()) > 1:
+    st.markdown("## 📈 Evolución entre Censos")
+    panel_evolucion(series_censales.version(), municipio, localidad)
 
 # Visualizaciones principales
 st.markdown("## 📈 Análisis Visual")
 
-if localidad == "Todas":
-    # Tabs para organizar mejor el contenido
-    tab1, tab2, tab3, tab4 = st.tabs(["🏘️ Población", "👥 Demografía", "📚 Educación", "🏥 Salud"])
+@panel("Análisis visual")
+def panel_visual(perfil, localidad):
+    """Gráficos del municipio o detalle de la localidad, dibujados a partir del perfil del área"""
+    if localidad == "Todas":
+        top_n = st.slider("📈 Top N localidades a mostrar", 5, MAX_TOP, 10, key="top_n")
     
-    with tab1:
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            # Población por localidad
-            df_pop = df_local.groupby("Nombre de la localidad")["Población total"].sum().reset_index()
-            fig_pop = crear_grafico_barras(df_pop, "Nombre de la localidad", "Población total", 
-                                         f"🏘️ Top {top_n} Localidades por Población", horizontal=True)
-            st.plotly_chart(fig_pop, use_container_width=True)
-        
-        with col2:
-            # Distribución de viviendas
-            viviendas_data = [
-                df_local["Total de viviendas habitadas"].sum(),
-                df_local["Total de viviendas"].sum() - df_local["Total de viviendas habitadas"].sum()
-            ]
-            fig_viviendas = crear_grafico_dona(viviendas_data, 
-                                             ["Habitadas", "Deshabitadas"], 
-                                             "🏠 Distribución de Viviendas")
-            st.plotly_chart(fig_viviendas, use_container_width=True)
-    
-    with tab2:
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            # Distribución por género
-            genero_data = [
-                df_local["Población femenina"].sum(),
-                df_local["Población masculina"].sum()
-            ]
-            fig_genero = crear_grafico_dona(genero_data, 
-                                          ["Femenina", "Masculina"], 
-                                          "👥 Distribución por Género")
-            st.plotly_chart(fig_genero, use_container_width=True)
-        
-        with col2:
-            # Población con discapacidad
-            discapacidad_data = [
-                df_local["Población con discapacidad"].sum(),
-                df_local["Población total"].sum() - df_local["Población con discapacidad"].sum()
-            ]
-            fig_discapacidad = crear_grafico_dona(discapacidad_data, 
-                                                ["Con discapacidad", "Sin discapacidad"], 
-                                                "♿ Población con Discapacidad")
-            st.plotly_chart(fig_discapacidad, use_container_width=True)
+        figuras = figuras_de_datos(perfil['graficos'], top_n)
     
-    with tab3:
-        # Escolaridad por localidad
-        df_edu = df_local.groupby("Nombre de la localidad")["Grado promedio de escolaridad"].mean().reset_index()
-        df_edu = df_edu.dropna()
-        fig_edu = crear_grafico_barras(df_edu, "Nombre de la localidad", "Grado promedio de escolaridad", 
-                                     f"🎓 Escolaridad Promedio por Localidad", horizontal=True)
-        st.plotly_chart(fig_edu, use_container_width=True)
-    
-    with tab4:
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            # Afiliación a servicios de salud
-            salud_data = [
-                df_local["Población afiliada a servicios de salud"].sum(),
-                df_local["Población sin afiliación a servicios de salud"].sum()
-            ]
-            fig_salud = crear_grafico_dona(salud_data, 
-                                         ["Con afiliación", "Sin afiliación"], 
-                                         "🏥 Afiliación a Servicios de Salud")
-            st.plotly_chart(fig_salud, use_container_width=True)
-        
-        with col2:
-            # Población económicamente activa
-            pea = df_local["Población de 12 años y más económicamente activa"].sum()
-            pob_12_mas = df_local["Población total"].sum() * 0.75  # Estimación
-            pea_data = [pea, pob_12_mas - pea]
-            fig_pea = crear_grafico_dona(pea_data, 
-                                       ["Económicamente activa", "No activa"], 
-                                       "💼 Población Económicamente Activa")
-            st.plotly_chart(fig_pea, use_container_width=True)
+        # Tabs para organizar mejor el contenido, con los gráficos de cada una lado a lado
+        for tab, nombres in zip(st.tabs(list(PESTANAS)), PESTANAS.values()):
+            with tab:
+                for col, nombre in zip(st.columns(len(nombres)), nombres):
+                    with col:
+                        st.plotly_chart(figuras[nombre], use_container_width=True)
 
-else:
-    # Vista detallada de localidad específica
-    st.markdown(f"### 📊 Análisis Detallado: {localidad}")
+    else:
+        # Vista detallada de localidad específica
+        st.markdown(f"### 📊 Análisis Detallado: {localidad}")
     
-    # Información específica de la localidad
-    if not df_local.empty:
-        datos_localidad = df_local.iloc[0]
+        # Ficha de la localidad (la de su primera fila si hay homónimas)
+        detalle = perfil['detalle']
+        # "≈" marca los valores estimados (el INEGI los reserva en localidades muy pequeñas)
+        aprox = lambda corto: "≈ " if corto in detalle['estimados'] else ""
         
         # Métricas adicionales
         col1, col2, col3 = st.columns(3)
         
         with col1:
             st.markdown("#### 👥 Demografía")
-            st.write(f"**Población femenina:** {datos_localidad['Población femenina']:,.0f}")
-            st.write(f"**Población masculina:** {datos_localidad['Población masculina']:,.0f}")
-            st.write(f"**Población indígena:** {datos_localidad['Población de 3 años y más que habla alguna lengua indígena']:,.0f}")
+            st.write(f"**Población femenina:** {aprox('pob_femenina')}{detalle['pob_femenina']:,.0f}")
+            st.write(f"**Población masculina:** {aprox('pob_masculina')}{detalle['pob_masculina']:,.0f}")
+            st.write(f"**Población indígena:** {aprox('pob_indigena')}{detalle['pob_indigena']:,.0f}")
         
         with col2:
             st.markdown("#### 🏠 Vivienda")
-            st.write(f"**Total de viviendas:** {datos_localidad['Total de viviendas']:,.0f}")
-            st.write(f"**Viviendas habitadas:** {datos_localidad['Total de viviendas habitadas']:,.0f}")
-            ocupacion = (datos_localidad['Total de viviendas habitadas'] / datos_localidad['Total de viviendas'] * 100) if datos_localidad['Total de viviendas'] > 0 else 0
-            st.write(f"**Tasa de ocupación:** {ocupacion:.1f}%")
+            st.write(f"**Total de viviendas:** {detalle['total_viviendas']:,.0f}")
+            st.write(f"**Viviendas habitadas:** {detalle['viviendas_habitadas']:,.0f}")
+            st.write(f"**Tasa de ocupación:** {detalle['porcentaje_ocupacion_viviendas']:.1f}%")
         
         with col3:
             st.markdown("#### 🎯 Indicadores Sociales")
-            st.write(f"**Escolaridad promedio:** {datos_localidad['Grado promedio de escolaridad']:.1f} años")
-            st.write(f"**Con discapacidad:** {datos_localidad['Población con discapacidad']:,.0f}")
-            st.write(f"**PEA:** {datos_localidad['Población de 12 años y más económicamente activa']:,.0f}")
+            st.write(f"**Escolaridad promedio:** {aprox('escolaridad_promedio')}{detalle['escolaridad_promedio']:.1f} años")
+            st.write(f"**Con discapacidad:** {aprox('pob_discapacidad')}{detalle['pob_discapacidad']:,.0f}")
+            st.write(f"**PEA:** {aprox('pob_economicamente_activa')}{detalle['pob_economicamente_activa']:,.0f}")
+        
+        if 'pob_femenina' in detalle['estimados']:
+            st.caption("≈ Estimado: el INEGI reserva (*) estos datos en localidades con una o dos viviendas.")
+
+panel_visual(perfil, localidad)
 
 # Tabla de datos mejorada
 st.markdown("## 📋 Datos Detallados")
-if not df_local.empty:
-    # Opciones de la tabla
-    col1, col2 = st.columns([3, 1])
-    with col2:
-        mostrar_todas_columnas = st.checkbox("Mostrar todas las columnas", value=False)
+
+@panel("Datos detallados")
+def panel_tabla(df_local):
+    """Tabla de la selección actual"""
+    if not df_local.empty:
+        # Opciones de la tabla
+        col1, col2 = st.columns([3, 1])
+        with col2:
+            mostrar_todas_columnas = st.checkbox("Mostrar todas las columnas", value=False)
     
-    if mostrar_todas_columnas:
-        st.dataframe(df_local, use_container_width=True, height=400)
+        if mostrar_todas_columnas:
+            st.dataframe(df_local, use_container_width=True, height=400)
+        else:
+            columnas_principales = [
+                "Nombre de la localidad", "Población total", "Población femenina", 
+                "Población masculina", "Grado promedio de escolaridad", 
+                "Total de viviendas habitadas"
+            ]
+            columnas_disponibles = [col for col in columnas_principales if col in df_local.columns]
+            st.dataframe(df_local[columnas_disponibles], use_container_width=True, height=400)
     else:
-        columnas_principales = [
-            "Nombre de la localidad", "Población total", "Población femenina", 
-            "Población masculina", "Grado promedio de escolaridad", 
-            "Total de viviendas habitadas"
-        ]
-        columnas_disponibles = [col for col in columnas_principales if col in df_local.columns]
-        st.dataframe(df_local[columnas_disponibles], use_container_width=True, height=400)
-else:
-    st.warning("No hay datos disponibles para la selección actual.")
+        st.warning("No hay datos disponibles para la selección actual.")
+
+panel_tabla(df_local)
 
 # Descarga de datos mejorada
 st.markdown("## 📥 Exportar Datos")
 col1, col2, col3 = st.columns(3)
 
+# La caché se indexa por versión y selección, sin hashear el DataFrame en cada rerun
 @st.cache_data
-def convertir_csv(df):
-    return df.to_csv(index=False).encode('utf-8')
+def convertir_csv(_df, version, municipio, localidad):
+    return _df.to_csv(index=False).encode('utf-8')
 
 @st.cache_data
-def generar_resumen():
+def generar_resumen(_area, version, municipio, localidad):
+    """Resumen en texto a partir de los totales del área (``Jerarquia``)"""
     resumen = f"""
 RESUMEN ESTADÍSTICO - {municipio}
 {'='*50}
 
 POBLACIÓN:
-- Total: {df_local['Población total'].sum():,.0f}
-- Femenina: {df_local['Población femenina'].sum():,.0f}
-- Masculina: {df_local['Población masculina'].sum():,.0f}
-- Indígena: {df_local['Población de 3 años y más que habla alguna lengua indígena'].sum():,.0f}
+- Total: {_area['pob_total']:,.0f}
+- Femenina: {_area['pob_femenina']:,.0f}
+- Masculina: {_area['pob_masculina']:,.0f}
+- Indígena: {_area['pob_indigena']:,.0f} ({_area['porcentaje_imputado_pob_indigena']:.1f}% estimado)
 
 VIVIENDA:
-- Total de viviendas: {df_local['Total de viviendas'].sum():,.0f}
-- Viviendas habitadas: {df_local['Total de viviendas habitadas'].sum():,.0f}
+- Total de viviendas: {_area['total_viviendas']:,.0f}
+- Viviendas habitadas: {_area['viviendas_habitadas']:,.0f}
 
 EDUCACIÓN:
-- Escolaridad promedio: {df_local['Grado promedio de escolaridad'].mean():.2f} años
+- Escolaridad promedio: {_area['escolaridad_promedio']:.2f} años (ponderada por población; {_area['porcentaje_imputado_escolaridad_promedio']:.1f}% estimado)
 
 SALUD:
-- Con afiliación: {df_local['Población afiliada a servicios de salud'].sum():,.0f}
-- Sin afiliación: {df_local['Población sin afiliación a servicios de salud'].sum():,.0f}
+- Con afiliación: {_area['pob_con_salud']:,.0f}
+- Sin afiliación: {_area['pob_sin_salud']:,.0f}
+
+Las cifras incluyen estimaciones para las celdas que el INEGI reserva por
+confidencialidad (*); el porcentaje estimado se indica junto a cada una.
 """
     return resumen.encode('utf-8')
 
 with col1:
-    csv = convertir_csv(df_local)
+    csv = convertir_csv(df_local, version_datos, municipio, localidad)
     st.download_button(
         "📊 Descargar CSV",
         csv,
         f"datos_{municipio.replace(' ', '_')}.csv",
         "text/csv",
-        help="Descargar datos en formato CSV"
+        help="Descargar datos en formato CSV",
+        on_click="ignore"
     )
 
 with col2:
-    resumen = generar_resumen()
+    resumen = generar_resumen(area, version_datos, municipio, localidad)
     st.download_button(
         "📋 Descargar Resumen",
         resumen,
         f"resumen_{municipio.replace(' ', '_')}.txt",
         "text/plain",
-        help="Descargar resumen estadístico"
+        help="Descargar resumen estadístico",
+        on_click="ignore"
     )
 
 with col3:
     st.markdown("📧 **Compartir Dashboard**")
     st.code(f"Municipio: {municipio}\nLocalidad: {localidad}", language=None)
 
+# Latencia del script completo frente a la de cada panel
+registrar_latencia("Script completo", (time.perf_counter() - inicio_script) * 1000)
+with st.expander("⏱️ Latencia por interacción"):
+    st.dataframe(tabla_latencias(), use_container_width=True, hide_index=True)
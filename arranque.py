@@ -0,0 +1,216 @@
+"""Snapshot de arranque en caliente con el estado ya preparado.
+
+``construir`` (lo llama limpiar.py) lee el Excel del INEGI una vez y guarda en
+un solo archivo el DataFrame tipado con métricas derivadas, el resultado de
+la validación, los agregados por municipio y por nivel de la clave INEGI, los
+bocetos de distribución, el índice de búsqueda y las figuras de la vista
+inicial de app.py. Un proceso nuevo lo restaura con ``cargar`` en lugar de
+repetir ``read_excel``, la limpieza y los groupbys.
+
+Cada parte se serializa por separado y se deserializa al primer uso, así que
+app2.py puede tomar solo el índice y las figuras (que importan plotly) no se
+cargan hasta que se dibujan.
+
+Uso:
+    python arranque.py             # genera el snapshot
+    python arranque.py --medir 3   # arranque en frío frente a restaurar, en procesos nuevos
+"""
+import argparse
+import io
+import os
+import pickle
+import subprocess
+import sys
+from datetime import datetime
+
+import pandas as pd
+
+from almacen import DIRECTORIO_ALMACEN, AlmacenColumnar, huella_archivo
+from busqueda import IndiceLocalidades
+from cuantiles import BocetosDistribucion
+from datos import agregar_municipios, preparar
+from esquema import ESQUEMA_ITER
+from graficos import (create_demographic_pyramid, create_housing_analysis, create_locality_analysis,
+                      create_municipality_ranking, municipality_summary)
+from jerarquia import Jerarquia
+
+RUTA_SNAPSHOT = os.path.join(DIRECTORIO_ALMACEN, "arranque.pkl")
+RUTA_EXCEL = "data/nayarit2.xlsx"
+
+# Se incrementa cuando cambia el contenido del snapshot; uno viejo se ignora
+FORMATO = 7
+
+# Figuras de app.py para la vista sin filtro de municipio
+FIGURAS = {
+    'municipios': lambda df, jerarquia: create_municipality_ranking(jerarquia),
+    'localidades': lambda df, jerarquia: create_locality_analysis(df, "Todos los municipios"),
+    'piramide': lambda df, jerarquia: create_demographic_pyramid(df, "Todos los municipios"),
+    'vivienda': lambda df, jerarquia: create_housing_analysis(jerarquia),
+}
+
+
+def firma(ruta=RUTA_SNAPSHOT):
+    """Fecha de modificación del snapshot, para invalidar cachés (None si no existe)"""
+    try:
+        return os.stat(ruta).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class Snapshot:
+    """Estado preparado; cada parte se deserializa la primera vez que se usa"""
+
+    def __init__(self, cabecera, partes):
+        self.version = cabecera['version']
+        self.origen = cabecera['origen']
+        self.creado = cabecera['creado']
+        self._partes = partes
+        self._cargadas = {}
+
+    def parte(self, nombre):
+        if nombre not in self._cargadas:
+            self._cargadas[nombre] = pickle.loads(self._partes[nombre])
+        return self._cargadas[nombre]
+
+    @property
+    def df(self):
+        """Localidades preparadas con nombres cortos (como ``app.py::load_data``)"""
+        return self.parte('df')
+
+    @property
+    def validacion(self):
+        return self.parte('validacion')
+
+    @property
+    def municipios(self):
+        return self.parte('municipios')
+
+    @property
+    def jerarquia(self):
+        return self.parte('jerarquia')
+
+    @property
+    def bocetos(self):
+        return self.parte('bocetos')
+
+    @property
+    def resumen(self):
+        """Tabla resumen por municipio de la pestaña Municipios"""
+        return self.parte('resumen')
+
+    @property
+    def indice(self):
+        return self.parte('indice')
+
+    def figura(self, nombre):
+        return self.parte('figuras')[nombre]
+
+    def corresponde(self, contenido):
+        """True si ``contenido`` (bytes) es el archivo con el que se generó"""
+        return huella_archivo(contenido) == self.origen
+
+
+def construir(almacen=None, ruta_excel=RUTA_EXCEL, ruta=RUTA_SNAPSHOT):
+    """Prepara el estado a partir del Excel y lo guarda como snapshot"""
+    almacen = almacen or AlmacenColumnar()
+    with open(ruta_excel, "rb") as f:
+        contenido = f.read()
+    validacion = ESQUEMA_ITER.validar(pd.read_excel(io.BytesIO(contenido)))
+    if not validacion.es_valido:
+        raise ValueError("; ".join(validacion.errores))
+    df = preparar(validacion.df)
+    validacion.df = None
+
+    jerarquia = Jerarquia(df)
+    partes = {
+        'df': df,
+        'validacion': validacion,
+        'municipios': agregar_municipios(df),
+        'jerarquia': jerarquia,
+        'bocetos': BocetosDistribucion(df),
+        'resumen': municipality_summary(jerarquia),
+        'indice': IndiceLocalidades(df),
+        'figuras': {nombre: crear(df, jerarquia) for nombre, crear in FIGURAS.items()},
+    }
+    cabecera = {
+        'formato': FORMATO,
+        'version': almacen.version(),
+        'origen': huella_archivo(contenido),
+        'creado': datetime.now().isoformat(timespec='seconds'),
+    }
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    with open(ruta + ".tmp", "wb") as f:
+        pickle.dump((cabecera, {nombre: pickle.dumps(valor, protocol=5) for nombre, valor in partes.items()}),
+                    f, protocol=5)
+    os.replace(ruta + ".tmp", ruta)
+    return ruta
+
+
+def cargar(ruta=RUTA_SNAPSHOT):
+    """Snapshot guardado, o None si no existe o es de un formato anterior"""
+    try:
+        with open(ruta, "rb") as f:
+            cabecera, partes = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    if cabecera.get('formato') != FORMATO:
+        return None
+    return Snapshot(cabecera, partes)
+
+
+# Código que corre cada proceso de medición. Las bibliotecas se importan antes
+# de tomar el tiempo (el script de Streamlit las importa de todos modos)
+_EN_FRIO = """
+import time
+import pandas as pd
+from arranque import FIGURAS, RUTA_EXCEL
+from busqueda import IndiceLocalidades
+from cuantiles import BocetosDistribucion
+from datos import preparar
+from esquema import ESQUEMA_ITER
+from graficos import municipality_summary
+from jerarquia import Jerarquia
+inicio = time.perf_counter()
+df = preparar(ESQUEMA_ITER.validar(pd.read_excel(RUTA_EXCEL)).df)
+jerarquia = Jerarquia(df)
+BocetosDistribucion(df)
+municipality_summary(jerarquia)
+IndiceLocalidades(df)
+[crear(df, jerarquia) for crear in FIGURAS.values()]
+print((time.perf_counter() - inicio) * 1000)
+"""
+
+_RESTAURAR = """
+import time
+import pandas as pd
+import plotly.graph_objects
+from arranque import FIGURAS, cargar
+inicio = time.perf_counter()
+estado = cargar()
+estado.df, estado.validacion, estado.jerarquia, estado.bocetos, estado.resumen, estado.indice
+[estado.figura(nombre) for nombre in FIGURAS]
+print((time.perf_counter() - inicio) * 1000)
+"""
+
+
+def medir(repeticiones=3):
+    """Tiempo hasta tener el estado listo en un proceso nuevo: en frío y desde el snapshot"""
+    resultados = {}
+    for nombre, codigo in (("En frío", _EN_FRIO), ("Desde snapshot", _RESTAURAR)):
+        tiempos = []
+        for _ in range(repeticiones):
+            salida = subprocess.run([sys.executable, "-c", codigo], capture_output=True, text=True, check=True)
+            tiempos.append(float(salida.stdout.strip().splitlines()[-1]))
+        resultados[nombre] = min(tiempos)
+        print(f"{nombre:<16} {min(tiempos):>8.0f} ms (mejor de {repeticiones})")
+    return resultados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Snapshot de arranque en caliente")
+    parser.add_argument("--medir", type=int, metavar="REPETICIONES", help="medir el arranque en procesos nuevos")
+    args = parser.parse_args()
+    if args.medir:
+        medir(args.medir)
+    else:
+        print(f"Snapshot guardado en {construir()}")
@@ -0,0 +1,183 @@
+"""Índice de búsqueda difusa de localidades por nombre (sin acentos).
+
+El índice se construye una vez por versión del dataset: trigramas de cada
+nombre de localidad en formato CSR (desplazamientos + ids) y una lista ordenada
+de palabras para búsqueda por prefijo. Los nombres de municipio se puntúan a
+nivel municipio y se propagan a sus localidades, así "tepic" favorece las
+localidades de Tepic sin indexar cada una dos veces.
+"""
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+_NO_ALFANUMERICO = re.compile(r"[^a-z0-9]+")
+
+
+def normalizar(texto):
+    """Minúsculas, sin acentos y con un solo espacio entre palabras"""
+    texto = unicodedata.normalize("NFKD", str(texto))
+    texto = "".join(c for c in texto if not unicodedata.combining(c)).lower()
+    return _NO_ALFANUMERICO.sub(" ", texto).strip()
+
+
+def trigramas(texto):
+    """Conjunto de trigramas de un texto normalizado (con relleno en los bordes)"""
+    relleno = f"  {texto} "
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+
+class _IndiceTrigramas:
+    """Listas invertidas de trigramas en formato CSR"""
+
+    def __init__(self, textos):
+        vocabulario = {}
+        ids_trigrama = []
+        ids_entrada = []
+        tamanos = np.zeros(len(textos), dtype=np.int32)
+        for i, texto in enumerate(textos):
+            tri = trigramas(texto)
+            tamanos[i] = len(tri)
+            for t in tri:
+                ids_trigrama.append(vocabulario.setdefault(t, len(vocabulario)))
+                ids_entrada.append(i)
+
+        ids_trigrama = np.asarray(ids_trigrama, dtype=np.int32)
+        orden = np.argsort(ids_trigrama, kind="stable")
+        self.entradas = np.asarray(ids_entrada, dtype=np.int32)[orden]
+        self.desplazamientos = np.zeros(len(vocabulario) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(ids_trigrama, minlength=len(vocabulario)), out=self.desplazamientos[1:])
+        self.vocabulario = vocabulario
+        self.tamanos = tamanos
+
+    @classmethod
+    def desde_arreglos(cls, entradas, desplazamientos, tamanos, vocabulario):
+        """Índice a partir de sus arreglos (``vocabulario``: trigramas en orden de id)"""
+        indice = cls.__new__(cls)
+        indice.entradas, indice.desplazamientos, indice.tamanos = entradas, desplazamientos, tamanos
+        indice.vocabulario = {trigrama: i for i, trigrama in enumerate(vocabulario)}
+        return indice
+
+    def arreglos(self):
+        """Argumentos de ``desde_arreglos``"""
+        return {'entradas': self.entradas, 'desplazamientos': self.desplazamientos, 'tamanos': self.tamanos,
+                'vocabulario': np.array(list(self.vocabulario), dtype=object)}
+
+    def similitud(self, consulta):
+        """Similitud de Jaccard de trigramas entre la consulta y cada entrada"""
+        tri = trigramas(consulta)
+        listas = [
+            self.entradas[self.desplazamientos[j]:self.desplazamientos[j + 1]]
+            for j in (self.vocabulario.get(t) for t in tri) if j is not None
+        ]
+        if not listas:
+            return np.zeros(len(self.tamanos))
+        aciertos = np.bincount(np.concatenate(listas), minlength=len(self.tamanos))
+        return aciertos / (len(tri) + self.tamanos - aciertos)
+
+
+class IndiceLocalidades:
+    """Búsqueda difusa y por prefijo sobre nombres de localidad y municipio"""
+
+    def __init__(self, df, col_localidad="localidad", col_municipio="municipio", col_poblacion="pob_total"):
+        df = df.dropna(subset=[col_localidad, col_municipio])
+        self.localidades = df[col_localidad].astype(str).to_numpy()
+        self.municipios_por_localidad = df[col_municipio].astype(str).to_numpy()
+        self.poblacion = df[col_poblacion].fillna(0).to_numpy(dtype=float)
+
+        self._nombres = np.array([normalizar(nombre) for nombre in self.localidades], dtype=object)
+        self._trigramas = _IndiceTrigramas(self._nombres)
+
+        # Municipios: se puntúan una vez y se propagan a sus localidades
+        codigos, municipios = pd.factorize(self.municipios_por_localidad)
+        self._codigo_municipio = codigos
+        self._trigramas_municipio = _IndiceTrigramas([normalizar(m) for m in municipios])
+
+        # Palabras ordenadas para búsqueda por prefijo
+        palabras = [(palabra, i) for i, nombre in enumerate(self._nombres) for palabra in nombre.split()]
+        palabras.sort()
+        self._palabras = np.array([p for p, _ in palabras], dtype=object)
+        self._palabras_entrada = np.array([i for _, i in palabras], dtype=np.int32)
+        self._derivados()
+
+    def _derivados(self):
+        self._exactos = {}
+        for i, nombre in enumerate(self._nombres):
+            self._exactos.setdefault(nombre, []).append(i)
+
+        # Desempate por tamaño de localidad (0 a 0.01)
+        self._desempate = np.log10(self.poblacion + 1) / 700
+
+    @classmethod
+    def desde_arreglos(cls, arreglos):
+        """Índice a partir de ``arreglos()`` (p. ej. leídos de compartido.py) sin volver a construirlo"""
+        indice = cls.__new__(cls)
+        indice.localidades = arreglos['localidades']
+        indice.municipios_por_localidad = arreglos['municipios']
+        indice.poblacion = arreglos['poblacion']
+        indice._nombres = arreglos['nombres']
+        indice._codigo_municipio = arreglos['codigo_municipio']
+        indice._palabras = arreglos['palabras']
+        indice._palabras_entrada = arreglos['palabras_entrada']
+        for atributo, prefijo in (('_trigramas', 'trigramas'), ('_trigramas_municipio', 'trigramas_municipio')):
+            setattr(indice, atributo, _IndiceTrigramas.desde_arreglos(
+                **{nombre: arreglos[f"{prefijo}.{nombre}"]
+                   for nombre in ('entradas', 'desplazamientos', 'tamanos', 'vocabulario')}))
+        indice._derivados()
+        return indice
+
+    def arreglos(self):
+        """Arreglos 1-D del índice, para guardarlo y restaurarlo con ``desde_arreglos``"""
+        arreglos = {
+            'localidades': self.localidades, 'municipios': self.municipios_por_localidad,
+            'poblacion': self.poblacion, 'nombres': self._nombres, 'codigo_municipio': self._codigo_municipio,
+            'palabras': self._palabras, 'palabras_entrada': self._palabras_entrada,
+        }
+        for prefijo, trigramas in (('trigramas', self._trigramas), ('trigramas_municipio', self._trigramas_municipio)):
+            arreglos.update({f"{prefijo}.{nombre}": arreglo for nombre, arreglo in trigramas.arreglos().items()})
+        return arreglos
+
+    def __len__(self):
+        return len(self.localidades)
+
+    def _prefijo(self, palabra):
+        """Entradas con alguna palabra que empieza con ``palabra``"""
+        inicio = np.searchsorted(self._palabras, palabra, side="left")
+        fin = np.searchsorted(self._palabras, palabra + "\uffff", side="left")
+        return self._palabras_entrada[inicio:fin]
+
+    def buscar(self, consulta, limite=10):
+        """Devuelve las ``limite`` localidades más parecidas a la consulta"""
+        consulta = normalizar(consulta)
+        if not consulta:
+            return pd.DataFrame(columns=["localidad", "municipio", "poblacion", "puntaje"])
+
+        puntaje = self._trigramas.similitud(consulta)
+        puntaje += 0.3 * self._trigramas_municipio.similitud(consulta)[self._codigo_municipio]
+
+        # Bono por prefijo: cada palabra de la consulta que inicia alguna palabra del nombre
+        palabras = consulta.split()
+        for palabra in palabras:
+            coincidencias = np.zeros(len(puntaje), dtype=bool)
+            coincidencias[self._prefijo(palabra)] = True
+            puntaje += 0.25 * coincidencias / len(palabras)
+        puntaje[self._exactos.get(consulta, [])] += 1
+
+        candidatos = np.flatnonzero(puntaje > 0)
+        if len(candidatos) == 0:
+            return pd.DataFrame(columns=["localidad", "municipio", "poblacion", "puntaje"])
+        puntaje = puntaje[candidatos] + self._desempate[candidatos]
+        if len(candidatos) > limite:
+            mejores = np.argpartition(-puntaje, limite)[:limite]
+        else:
+            mejores = np.arange(len(candidatos))
+        mejores = mejores[np.argsort(-puntaje[mejores])]
+        filas = candidatos[mejores]
+
+        return pd.DataFrame({
+            "localidad": self.localidades[filas],
+            "municipio": self.municipios_por_localidad[filas],
+            "poblacion": self.poblacion[filas],
+            "puntaje": puntaje[mejores].round(3),
+        })
@@ -0,0 +1,132 @@
+"""Archivos subidos como datasets versionados en el almacén columnar.
+
+Cada archivo se hashea una sola vez, al llegar, y su contenido (SHA-1) es el
+id del dataset. Si ese id ya está en el almacén no se vuelve a leer el Excel;
+si no, se valida, se prepara y se guarda con ``AlmacenColumnar`` en su propio
+directorio. La sesión solo conserva el id y todas las cachés se indexan por
+él, así que un rerun no vuelve a recorrer los bytes del archivo. Se
+conservan los ``MAX_CARGAS`` datasets usados más recientemente.
+
+Uso:
+    python cargas.py data/nayarit2.xlsx   # registra un archivo y muestra su id
+    python cargas.py                      # lista los datasets registrados
+"""
+import argparse
+import io
+import os
+import pickle
+import shutil
+
+import pandas as pd
+
+from almacen import DIRECTORIO_ALMACEN, AlmacenColumnar, huella_archivo
+from esquema import ESQUEMA_ITER
+
+DIRECTORIO_CARGAS = os.path.join(DIRECTORIO_ALMACEN, "cargas")
+
+# Datasets que se conservan: al registrar uno nuevo se borran los usados hace más
+# tiempo. Es el doble de las cachés por dataset de app.py (max_entries=16)
+MAX_CARGAS = 32
+
+
+class GestorCargas:
+    """Registro de archivos subidos, uno por hash de contenido"""
+
+    def __init__(self, directorio=DIRECTORIO_CARGAS):
+        self.directorio = directorio
+
+    def almacen(self, dataset_id):
+        return AlmacenColumnar(os.path.join(self.directorio, dataset_id))
+
+    def _ruta_validacion(self, dataset_id):
+        return os.path.join(self.directorio, dataset_id, "validacion.pkl")
+
+    def existe(self, dataset_id):
+        # Un almacén de una versión anterior del catálogo se vuelve a construir
+        return self.almacen(dataset_id).vigente() and os.path.exists(self._ruta_validacion(dataset_id))
+
+    def registrar(self, contenido, nombre=None, progreso=None):
+        """Id y validación de un archivo (bytes); lo guarda si es válido y nuevo.
+
+        Un archivo inválido no se guarda: se devuelve su validación para
+        mostrar los errores. ``progreso(fraccion, mensaje)`` recibe el avance
+        cuando corre como trabajo (ver ``trabajos.py``).
+        """
+        avanzar = progreso or (lambda fraccion, mensaje: None)
+        dataset_id = huella_archivo(contenido)
+        if self.existe(dataset_id):
+            return dataset_id, self.validacion(dataset_id)
+
+        avanzar(0.05, "Leyendo el Excel")
+        tabla = pd.read_excel(io.BytesIO(contenido))
+        avanzar(0.5, "Validando")
+        validacion = ESQUEMA_ITER.validar(tabla)
+        if not validacion.es_valido:
+            return dataset_id, validacion
+        df = validacion.df
+        validacion.df = None  # el DataFrame queda en el almacén
+
+        avanzar(0.6, "Preparando el almacén")
+        self.almacen(dataset_id).construir(df, origen=nombre)
+        ruta = self._ruta_validacion(dataset_id)
+        with open(ruta + ".tmp", "wb") as f:
+            pickle.dump(validacion, f, protocol=5)
+        os.replace(ruta + ".tmp", ruta)
+        self.podar(conservar=(dataset_id,))
+        return dataset_id, validacion
+
+    def cargar(self, dataset_id):
+        """Localidades preparadas del dataset"""
+        self._usar(dataset_id)
+        return self.almacen(dataset_id).cargar()
+
+    def validacion(self, dataset_id):
+        self._usar(dataset_id)
+        with open(self._ruta_validacion(dataset_id), "rb") as f:
+            return pickle.load(f)
+
+    def _usar(self, dataset_id):
+        """Marca el uso del dataset: la fecha de su validación ordena el borrado"""
+        try:
+            os.utime(self._ruta_validacion(dataset_id))
+        except FileNotFoundError:
+            pass
+
+    def podar(self, conservar=()):
+        """Borra los datasets usados hace más tiempo por encima de ``MAX_CARGAS``; devuelve sus ids"""
+        if not os.path.isdir(self.directorio):
+            return []
+        usados = []
+        for dataset_id in os.listdir(self.directorio):
+            # Un dataset que se está registrando aún no tiene validación: cuenta su directorio
+            for ruta in (self._ruta_validacion(dataset_id), os.path.join(self.directorio, dataset_id)):
+                if os.path.exists(ruta):
+                    usados.append((os.path.getmtime(ruta), dataset_id))
+                    break
+        borrados = [dataset_id for _, dataset_id in sorted(usados, reverse=True)[MAX_CARGAS:]
+                    if dataset_id not in conservar]
+        for dataset_id in borrados:
+            shutil.rmtree(os.path.join(self.directorio, dataset_id), ignore_errors=True)
+        return borrados
+
+    def listar(self):
+        """Manifiesto de cada dataset registrado, por id"""
+        if not os.path.isdir(self.directorio):
+            return {}
+        return {dataset_id: self.almacen(dataset_id).manifiesto()
+                for dataset_id in sorted(os.listdir(self.directorio)) if self.existe(dataset_id)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Datasets de archivos subidos")
+    parser.add_argument("archivo", nargs="?", help="archivo Excel a registrar")
+    args = parser.parse_args()
+    gestor = GestorCargas()
+    if args.archivo:
+        with open(args.archivo, "rb") as f:
+            dataset_id, validacion = gestor.registrar(f.read(), os.path.basename(args.archivo))
+        print(f"{dataset_id}: {'válido' if validacion.es_valido else '; '.join(validacion.errores)}")
+    else:
+        for dataset_id, manifiesto in gestor.listar().items():
+            print(f"{dataset_id}  {manifiesto.get('origen')}  {manifiesto.get('localidades')} localidades  "
+                  f"{manifiesto.get('actualizado')}")
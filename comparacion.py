@@ -0,0 +1,81 @@
+"""Comparación de varios municipios o localidades en una sola pasada agrupada.
+
+Las funciones filtran todas las selecciones con un solo ``isin`` y calculan
+los valores de cada panel con un solo ``groupby``, en lugar de filtrar el
+DataFrame una vez por selección; los indicadores salen del catálogo de
+``indicadores.py``. Trabajan con nombres cortos o, con ``originales=True``,
+con los nombres de columna del INEGI (``app2.py``).
+"""
+import pandas as pd
+
+from esquema import ESQUEMA_ITER
+from indicadores import PlanIndicadores
+
+
+def _nombres(originales):
+    if originales:
+        return ESQUEMA_ITER.a_original
+    return {corto: corto for corto in ESQUEMA_ITER.a_original}
+
+
+def agregar_selecciones(df, grupo, selecciones, sumas=(), indicadores=(), originales=False):
+    """Suma medidas y evalúa indicadores del catálogo para cada selección con un solo groupby.
+
+    ``grupo`` es una columna o lista de columnas; ``selecciones`` son valores
+    (o tuplas de valores) de esas columnas. ``sumas`` e ``indicadores`` usan
+    nombres cortos, también en el resultado, que conserva el orden de
+    ``selecciones`` e incluye el número de localidades. Los cocientes sin
+    denominador valen 0.
+    """
+    grupo = [grupo] if isinstance(grupo, str) else list(grupo)
+    if len(grupo) == 1:
+        mascara = df[grupo[0]].isin(selecciones).to_numpy()
+        indice = pd.Index(selecciones, name=grupo[0])
+    else:
+        mascara = pd.MultiIndex.from_frame(df[grupo]).isin(selecciones)
+        indice = pd.MultiIndex.from_tuples(selecciones, names=grupo)
+
+    plan = PlanIndicadores(indicadores, sumas=sumas, columnas=_nombres(originales))
+    filas = df[mascara]
+    agregados = plan.agregar(filas, grupo, sin_base=0)
+    agregados.insert(0, 'localidades', filas.groupby(grupo, sort=False).size())
+    return agregados[['localidades', *sumas, *indicadores]].reindex(indice)
+
+
+def panel_metricas(df, grupo, selecciones, originales=False, total_estado=None):
+    """Valores de las cuatro tarjetas del panel de métricas para cada selección.
+
+    ``total_estado`` es la población del estado (p. ej. de ``Jerarquia``); si
+    no se da se suma sobre ``df``.
+    """
+    agregados = agregar_selecciones(
+        df, grupo, selecciones, originales=originales,
+        sumas=['pob_total', 'viviendas_habitadas', 'pob_indigena'],
+        indicadores=['personas_por_vivienda', 'escolaridad_promedio', 'porcentaje_indigena']
+    )
+    poblacion = agregados['pob_total'].fillna(0)
+    if total_estado is None:
+        total_estado = df[_nombres(originales)['pob_total']].sum()
+    return pd.DataFrame({
+        'poblacion': poblacion,
+        'porcentaje_estado': poblacion / total_estado * 100,
+        'viviendas': agregados['viviendas_habitadas'].fillna(0),
+        'habitantes_por_vivienda': agregados['personas_por_vivienda'].fillna(0),
+        'escolaridad': agregados['escolaridad_promedio'],
+        'pob_indigena': agregados['pob_indigena'].fillna(0),
+        'porcentaje_indigena': agregados['porcentaje_indigena'].fillna(0),
+    })
+
+
+def porcentajes_demograficos(df, grupo, selecciones, originales=False):
+    """Porcentajes de población indígena, con discapacidad y PEA por selección"""
+    agregados = agregar_selecciones(
+        df, grupo, selecciones, originales=originales, sumas=['pob_total'],
+        indicadores=['porcentaje_indigena', 'porcentaje_discapacidad', 'porcentaje_pea']
+    )
+    return pd.DataFrame({
+        'poblacion': agregados['pob_total'].fillna(0),
+        'porcentaje_indigena': agregados['porcentaje_indigena'].fillna(0),
+        'porcentaje_discapacidad': agregados['porcentaje_discapacidad'].fillna(0),
+        'porcentaje_pea': agregados['porcentaje_pea'].fillna(0),
+    })
@@ -0,0 +1,255 @@
+"""Dataset de solo lectura en un archivo Arrow mapeado en memoria.
+
+``publicar`` escribe en un solo archivo, como secciones Arrow IPC sin
+compresión, las localidades preparadas del almacén columnar ordenadas por
+clave INEGI, las matrices de ``Jerarquia`` por nivel y los arreglos del
+índice de búsqueda. Una cabecera JSON al inicio guarda la versión, la
+posición de cada sección, el rango de filas de cada municipio por clave
+(entidad, municipio) y las claves de cada nombre de municipio.
+Cada proceso de Streamlit lo abre con ``pa.memory_map``: las columnas del
+DataFrame, las matrices de la jerarquía y los arreglos numéricos del índice
+apuntan directamente a las páginas del archivo, que el sistema operativo
+comparte entre procesos, así que un worker más no duplica los datos ni vuelve
+a sumar la jerarquía o a construir el índice. Los textos del índice (nombres y
+trigramas) sí se convierten a objetos de Python en cada proceso.
+
+Uso:
+    python compartido.py             # publica la versión actual del almacén
+    python compartido.py --medir 4   # abre el archivo en 4 procesos y mide
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from almacen import AlmacenColumnar
+from busqueda import IndiceLocalidades
+from datos import CLAVES
+from indicadores import INDICADORES
+from jerarquia import NIVELES, Jerarquia
+
+NOMBRE_ARCHIVO = "compartido.arrow"
+
+# Inicio de cada sección: múltiplo de 64 bytes, la alineación de los buffers de Arrow
+ALINEACION = 64
+
+
+def ruta_compartido(almacen=None):
+    return os.path.join((almacen or AlmacenColumnar()).directorio, NOMBRE_ARCHIVO)
+
+
+def _columna(serie):
+    """Arreglo Arrow sin máscara de nulos para columnas numéricas (NaN se conserva)"""
+    if pd.api.types.is_numeric_dtype(serie):
+        # Sin máscara de validez to_pandas puede devolver una vista del buffer
+        return pa.array(serie.to_numpy(), from_pandas=False)
+    return pa.array(serie.astype(object).where(serie.notna(), None), type=pa.string())
+
+
+def _indice_municipios(df):
+    """Rango de filas [inicio, fin) de cada municipio (entidad, municipio) en el
+    archivo ordenado, y las claves de municipio de cada nombre"""
+    entidades = df['cve_entidad'].to_numpy()
+    codigos = df['cve_municipio'].to_numpy()
+    cortes = np.flatnonzero((entidades[1:] != entidades[:-1]) | (codigos[1:] != codigos[:-1])) + 1
+    inicios = np.r_[0, cortes]
+    fines = np.r_[cortes, len(df)]
+    rangos = [[int(e), int(m), int(i), int(f)]
+              for e, m, i, f in zip(entidades[inicios], codigos[inicios], inicios, fines)]
+    nombres = {}
+    for nombre, e, m in zip(df['municipio'].to_numpy()[inicios], entidades[inicios], codigos[inicios]):
+        nombres.setdefault(str(nombre), []).append([int(e), int(m)])
+    return {'rangos': rangos, 'nombres': nombres}
+
+
+def _seccion(tabla):
+    """Tabla como stream Arrow IPC en memoria"""
+    salida = pa.BufferOutputStream()
+    with pa.ipc.new_stream(salida, tabla.schema) as escritor:
+        escritor.write_table(tabla)
+    return salida.getvalue()
+
+
+def _secciones_jerarquia(jerarquia):
+    """Por nivel: claves y nombres, y la matriz de la jerarquía como lista de tamaño fijo por fila"""
+    secciones = {}
+    for nivel, (nombres, valores) in jerarquia.partes().items():
+        columnas = {col: pa.array(nombres[col].astype(object).where(nombres[col].notna(), None))
+                    if nombres[col].dtype == object else pa.array(nombres[col]) for col in nombres.columns}
+        columnas['valores'] = pa.FixedSizeListArray.from_arrays(pa.array(valores.ravel()), valores.shape[1])
+        secciones[f"jerarquia.{nivel}"] = pa.table(columnas)
+    return secciones
+
+
+def _secciones_indice(indice):
+    """Cada arreglo del índice de búsqueda como tabla de una columna"""
+    return {f"indice.{nombre}": pa.table({'valores': pa.array(arreglo, type=pa.string())
+                                          if arreglo.dtype == object else pa.array(arreglo)})
+            for nombre, arreglo in indice.arreglos().items()}
+
+
+def publicar(almacen=None, ruta=None):
+    """Escribe la versión actual del almacén, su jerarquía y su índice de búsqueda como archivo mapeable"""
+    almacen = almacen or AlmacenColumnar()
+    ruta = ruta or ruta_compartido(almacen)
+    df = almacen.cargar().sort_values(CLAVES, kind='stable').reset_index(drop=True)
+    jerarquia = Jerarquia(df)
+
+    secciones = {'localidades': pa.table({col: _columna(df[col]) for col in df.columns})}
+    secciones.update(_secciones_jerarquia(jerarquia))
+    secciones.update(_secciones_indice(IndiceLocalidades(df)))
+    datos = {nombre: _seccion(tabla) for nombre, tabla in secciones.items()}
+
+    # Cabecera JSON con la posición de cada sección; las secciones empiezan
+    # alineadas a ALINEACION bytes para que sus buffers se lean sin copiar
+    cabecera = {
+        'version': almacen.version(),
+        'municipios': _indice_municipios(df),
+        'columnas_jerarquia': jerarquia.columnas,
+        'secciones': {},
+    }
+    inicio = 0
+    for nombre, buffer in datos.items():
+        cabecera['secciones'][nombre] = [inicio, buffer.size]
+        inicio += -(-buffer.size // ALINEACION) * ALINEACION
+    texto = json.dumps(cabecera, ensure_ascii=False).encode()
+    base = -(-(8 + len(texto)) // ALINEACION) * ALINEACION
+
+    # Escritura atómica: los procesos con el archivo anterior mapeado lo
+    # conservan hasta que lo cierran (el reemplazo no toca su inodo)
+    with open(ruta + ".tmp", "wb") as destino:
+        destino.write(len(texto).to_bytes(8, "little") + texto)
+        for nombre, buffer in datos.items():
+            destino.seek(base + cabecera['secciones'][nombre][0])
+            destino.write(buffer)
+    os.replace(ruta + ".tmp", ruta)
+    return ruta
+
+
+def _leer_cabecera(mapa):
+    """Cabecera JSON y posición donde empiezan las secciones"""
+    longitud = int.from_bytes(mapa.read(8), "little")
+    return json.loads(mapa.read(longitud)), -(-(8 + longitud) // ALINEACION) * ALINEACION
+
+
+def _tipos(tipo):
+    # Texto como cadenas Arrow: sin convertir a objetos de Python
+    if pa.types.is_string(tipo):
+        return pd.ArrowDtype(tipo)
+    return None
+
+
+def _numpy(columna):
+    """Columna como arreglo de NumPy: vista del archivo si es numérica"""
+    arreglo = columna.combine_chunks()
+    if pa.types.is_string(arreglo.type):
+        return arreglo.to_numpy(zero_copy_only=False)
+    return arreglo.to_numpy(zero_copy_only=True)
+
+
+class DatasetCompartido:
+    """Localidades, jerarquía e índice de búsqueda mapeados desde el archivo, sin copiar los datos"""
+
+    def __init__(self, ruta=None, columnas=None):
+        self.ruta = ruta or ruta_compartido()
+        self._mapa = pa.memory_map(self.ruta, "r")
+        self._cabecera, self._base = _leer_cabecera(self._mapa)
+        self._mapa.seek(0)
+        self._buffer = self._mapa.read_buffer()
+        self.version = self._cabecera['version']
+        indice = self._cabecera['municipios']
+        self.rangos = {(e, m): (i, f) for e, m, i, f in indice['rangos']}
+        # Claves (entidad, municipio) de cada nombre: puede repetirse en otra entidad
+        self.claves = {nombre: [tuple(clave) for clave in claves] for nombre, claves in indice['nombres'].items()}
+
+        # split_blocks evita consolidar columnas en bloques 2D (que copiaría)
+        df = self._tabla('localidades').to_pandas(split_blocks=True, types_mapper=_tipos)
+        self.df = df.rename(columns=columnas, copy=False) if columnas else df
+
+    def _tabla(self, nombre):
+        inicio, longitud = self._cabecera['secciones'][nombre]
+        return pa.ipc.open_stream(self._buffer.slice(self._base + inicio, longitud)).read_all()
+
+    def jerarquia(self, indicadores=INDICADORES):
+        """Jerarquía publicada con las matrices mapeadas (None si cambió el catálogo de indicadores)"""
+        partes = {}
+        for nivel in NIVELES:
+            tabla = self._tabla(f"jerarquia.{nivel}")
+            valores = tabla.column('valores').combine_chunks()
+            matriz = valores.flatten().to_numpy(zero_copy_only=True).reshape(len(valores), valores.type.list_size)
+            nombres = tabla.drop_columns(['valores']).to_pandas(types_mapper={pa.int64(): pd.Int64Dtype()}.get)
+            partes[nivel] = (nombres, matriz)
+        return Jerarquia.desde_partes(partes, self._cabecera['columnas_jerarquia'], indicadores)
+
+    def indice(self):
+        """Índice de búsqueda de localidades publicado (arreglos numéricos mapeados)"""
+        prefijo = "indice."
+        return IndiceLocalidades.desde_arreglos({
+            nombre[len(prefijo):]: _numpy(self._tabla(nombre).column(0))
+            for nombre in self._cabecera['secciones'] if nombre.startswith(prefijo)
+        })
+
+    def __len__(self):
+        return len(self.df)
+
+    def municipio(self, nombre):
+        """Localidades de los municipios con ese nombre; uno solo es una rebanada contigua (sin filtrar)"""
+        rangos = [self.rangos[clave] for clave in self.claves.get(nombre, [])]
+        if len(rangos) <= 1:
+            inicio, fin = rangos[0] if rangos else (0, 0)
+            return self.df.iloc[inicio:fin]
+        return self.df.iloc[np.concatenate([np.arange(inicio, fin) for inicio, fin in rangos])]
+
+
+def version_publicada(ruta=None):
+    """Versión del archivo publicado (None si no existe)"""
+    ruta = ruta or ruta_compartido()
+    if not os.path.exists(ruta):
+        return None
+    with pa.memory_map(ruta, "r") as mapa:
+        return _leer_cabecera(mapa)[0]['version']
+
+
+def _memoria_anonima_kb():
+    """Memoria anónima del proceso (Linux): la que no respalda ningún archivo
+    y por lo tanto no se comparte con los demás workers"""
+    with open("/proc/self/smaps_rollup") as f:
+        campos = dict(linea.split(":", 1) for linea in f if ":" in linea)
+    return int(campos["Anonymous"].split()[0])
+
+
+def _abrir_y_medir(ruta):
+    antes = _memoria_anonima_kb()
+    inicio = time.perf_counter()
+    dataset = DatasetCompartido(ruta)
+    ms = (time.perf_counter() - inicio) * 1000
+    # Recorrer las columnas numéricas fuerza a leer todas sus páginas
+    for col in dataset.df.columns:
+        if dataset.df[col].dtype.kind == 'f':
+            dataset.df[col].to_numpy().max()
+    return ms, (_memoria_anonima_kb() - antes) / 1024, pa.total_allocated_bytes() / 2 ** 20
+
+
+def medir(procesos=4, ruta=None):
+    """Abre el archivo en varios procesos y reporta tiempo y memoria propia de cada uno"""
+    ruta = ruta or ruta_compartido()
+    print(f"{ruta}: {os.path.getsize(ruta) / 2 ** 20:.1f} MB")
+    with ProcessPoolExecutor(procesos) as ejecutor:
+        for i, (ms, anonima, arrow) in enumerate(ejecutor.map(_abrir_y_medir, [ruta] * procesos)):
+            print(f"proceso {i}: abierto en {ms:.1f} ms, memoria propia +{anonima:.1f} MB, "
+                  f"asignada por Arrow {arrow:.1f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Publica el dataset como archivo Arrow mapeable")
+    parser.add_argument("--medir", type=int, metavar="PROCESOS", help="medir apertura en N procesos")
+    args = parser.parse_args()
+    if args.medir:
+        medir(args.medir)
+    else:
+        print(f"Publicado {publicar()}")
@@ -0,0 +1,201 @@
+"""Resúmenes de distribución combinables para estadísticas descriptivas.
+
+Cada ``Boceto`` guarda conteo, media, M2, mínimo y máximo exactos y un
+sketch KLL de cuantiles: niveles de valores donde un valor del nivel h pesa
+2^h. Mientras un boceto tiene pocos valores (hasta ``K``) los guarda todos y
+sus cuantiles son exactos; al crecer, cada nivel lleno se ordena y pasa uno
+de cada dos valores al siguiente, con error de rango del orden de 1/K.
+
+Dos bocetos se combinan concatenando sus niveles, así que
+``BocetosDistribucion`` los construye una vez por municipio y por rango de
+población, y describe, histogramas y cajas de cualquier unión de municipios
+o de cualquier corte de población mínima salen de combinar bocetos en lugar
+de ordenar las filas.
+"""
+import numpy as np
+import pandas as pd
+
+from datos import CLAVES
+from esquema import COLUMNA_SUPRESION
+from imputacion import COLUMNA_AJUSTE
+
+# Valores por nivel del sketch: error de rango ~1% y cuantiles exactos hasta K valores
+K = 200
+
+# Rangos de población de las localidades: [borde_i, borde_i+1)
+BORDES_POBLACION = (0, 1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000, 100000)
+
+PERCENTILES = (0.25, 0.5, 0.75)
+
+
+class Boceto:
+    """Momentos exactos y sketch KLL de cuantiles de una columna"""
+
+    __slots__ = ('k', 'niveles', 'n', 'media', 'm2', 'minimo', 'maximo', '_paridad')
+
+    def __init__(self, k=K):
+        self.k = k
+        self.niveles = [np.empty(0)]
+        self.n = 0
+        self.media = 0.0
+        self.m2 = 0.0
+        self.minimo = np.inf
+        self.maximo = -np.inf
+        self._paridad = 0
+
+    @classmethod
+    def desde_valores(cls, valores, k=K):
+        """Boceto de un arreglo (se ignoran los NaN)"""
+        valores = np.asarray(valores, dtype=float)
+        valores = valores[~np.isnan(valores)]
+        boceto = cls(k)
+        if len(valores):
+            boceto.n = len(valores)
+            boceto.media = float(valores.mean())
+            boceto.m2 = float(((valores - boceto.media) ** 2).sum())
+            boceto.minimo = float(valores.min())
+            boceto.maximo = float(valores.max())
+            boceto.niveles = [valores.copy()]
+            boceto._compactar()
+        return boceto
+
+    @classmethod
+    def unir(cls, bocetos, k=K):
+        """Boceto de la unión de los datos de varios bocetos"""
+        bocetos = [boceto for boceto in bocetos if boceto.n]
+        unido = cls(k)
+        if not bocetos:
+            return unido
+        altura = max(len(boceto.niveles) for boceto in bocetos)
+        unido.niveles = [np.concatenate([boceto.niveles[h] for boceto in bocetos if h < len(boceto.niveles)])
+                         for h in range(altura)]
+        # Media y M2 combinados (Chan et al.)
+        n = sum(boceto.n for boceto in bocetos)
+        media = sum(boceto.n * boceto.media for boceto in bocetos) / n
+        unido.n = n
+        unido.media = media
+        unido.m2 = sum(boceto.m2 + boceto.n * (boceto.media - media) ** 2 for boceto in bocetos)
+        unido.minimo = min(boceto.minimo for boceto in bocetos)
+        unido.maximo = max(boceto.maximo for boceto in bocetos)
+        unido._compactar()
+        return unido
+
+    def _capacidad(self, nivel, altura):
+        return max(2, int(np.ceil(self.k * (2 / 3) ** (altura - 1 - nivel))))
+
+    def _compactar(self):
+        while True:
+            altura = len(self.niveles)
+            lleno = next((h for h in range(altura) if len(self.niveles[h]) > self._capacidad(h, altura)), None)
+            if lleno is None:
+                return
+            if lleno == altura - 1:
+                self.niveles.append(np.empty(0))
+            valores = np.sort(self.niveles[lleno])
+            resto = valores[len(valores) - len(valores) % 2:]
+            pares = valores[:len(valores) - len(valores) % 2]
+            # Alternar entre pares e impares evita sesgar los cuantiles
+            self.niveles[lleno] = resto
+            self.niveles[lleno + 1] = np.concatenate([self.niveles[lleno + 1], pares[self._paridad::2]])
+            self._paridad ^= 1
+
+    @property
+    def exacto(self):
+        """True si el boceto aún guarda todos los valores"""
+        return len(self.niveles) == 1
+
+    @property
+    def desviacion(self):
+        return float(np.sqrt(self.m2 / (self.n - 1))) if self.n > 1 else np.nan
+
+    def _acumulados(self):
+        valores = np.concatenate(self.niveles)
+        pesos = np.concatenate([np.full(len(nivel), 2.0 ** h) for h, nivel in enumerate(self.niveles)])
+        orden = np.argsort(valores, kind='stable')
+        return valores[orden], np.cumsum(pesos[orden])
+
+    def cuantiles(self, qs):
+        """Cuantiles (interpolación lineal como pandas si el boceto es exacto)"""
+        qs = np.asarray(qs, dtype=float)
+        if not self.n:
+            return np.full(qs.shape, np.nan)
+        if self.exacto:
+            return np.quantile(self.niveles[0], qs)
+        valores, acumulados = self._acumulados()
+        posiciones = np.searchsorted(acumulados, qs * acumulados[-1], side='left')
+        resultado = valores[np.minimum(posiciones, len(valores) - 1)]
+        return np.where(qs <= 0, self.minimo, np.where(qs >= 1, self.maximo, resultado))
+
+    def histograma(self, bordes):
+        """Conteos estimados en [borde_i, borde_i+1); el último intervalo incluye su borde"""
+        bordes = np.asarray(bordes, dtype=float)
+        if self.exacto:
+            return np.histogram(self.niveles[0], bordes)[0].astype(float)
+        valores, acumulados = self._acumulados()
+        acumulados = np.concatenate([[0.0], acumulados])
+        debajo = acumulados[np.searchsorted(valores, bordes, side='left')]
+        debajo[-1] = acumulados[np.searchsorted(valores, bordes[-1], side='right')]
+        return np.diff(debajo) * self.n / acumulados[-1]
+
+
+class BocetosDistribucion:
+    """Bocetos de cada columna numérica por municipio y rango de población"""
+
+    def __init__(self, df, columnas=None, grupo='municipio', poblacion='pob_total',
+                 bordes=BORDES_POBLACION, k=K):
+        if columnas is None:
+            excluidas = CLAVES + [COLUMNA_SUPRESION, COLUMNA_AJUSTE]
+            columnas = [col for col in df.select_dtypes(include='number').columns if col not in excluidas]
+        self.columnas = list(columnas)
+        self.grupo = grupo
+        self.poblacion = poblacion
+        self.bordes = np.asarray(bordes, dtype=float)
+
+        valores = df[self.columnas].to_numpy(dtype=float)
+        claves = pd.DataFrame({'grupo': df[grupo].to_numpy(), 'rango': self.rango(df[poblacion].to_numpy(dtype=float))})
+        self._bocetos = {
+            (nombre, rango): [Boceto.desde_valores(valores[posiciones, j], k) for j in range(len(self.columnas))]
+            for (nombre, rango), posiciones in claves.groupby(['grupo', 'rango']).indices.items()
+        }
+
+    def rango(self, poblacion):
+        """Índice del rango de población de cada valor"""
+        return np.searchsorted(self.bordes, poblacion, side='right') - 1
+
+    def combinar(self, columnas, grupos=None, minimo=0, df=None):
+        """Un boceto por columna para los ``grupos`` (todos con None) y población >= ``minimo``.
+
+        Los rangos completos por encima del corte se combinan; si ``minimo``
+        cae dentro de un rango, sus filas salen de ``df`` (las del rango son
+        pocas comparadas con la selección).
+        """
+        grupos = None if grupos is None else set(grupos)
+        corte = int(self.rango(minimo))
+        parcial = 0 <= corte and minimo > self.bordes[corte]
+        indices = [self.columnas.index(col) for col in columnas]
+        piezas = [bocetos for (nombre, rango), bocetos in self._bocetos.items()
+                  if (grupos is None or nombre in grupos) and (rango > corte or (rango == corte and not parcial))]
+
+        extra = []
+        if parcial:
+            if df is None:
+                raise ValueError(f"El corte {minimo} cae dentro de un rango de población: se necesita df")
+            poblacion = df[self.poblacion].to_numpy(dtype=float)
+            filas = (poblacion >= minimo) & (self.rango(poblacion) == corte)
+            if grupos is not None:
+                filas &= df[self.grupo].isin(grupos).to_numpy()
+            extra = [Boceto.desde_valores(df.loc[filas, col].to_numpy(dtype=float)) for col in columnas]
+
+        return {col: Boceto.unir([bocetos[j] for bocetos in piezas] + extra[i:i + 1])
+                for i, (col, j) in enumerate(zip(columnas, indices))}
+
+    def describir(self, columnas, grupos=None, minimo=0, df=None):
+        """Equivalente a ``DataFrame.describe()`` de la selección"""
+        bocetos = self.combinar(columnas, grupos, minimo, df)
+        filas = {}
+        for col, boceto in bocetos.items():
+            q1, mediana, q3 = boceto.cuantiles(PERCENTILES)
+            filas[col] = [boceto.n, boceto.media if boceto.n else np.nan, boceto.desviacion,
+                          boceto.minimo if boceto.n else np.nan, q1, mediana, q3,
+                          boceto.maximo if boceto.n else np.nan]
+        return pd.DataFrame(filas, index=['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max'])
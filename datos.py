@@ -0,0 +1,60 @@
+"""Preparación de los datos ITER: limpieza de filas, métricas derivadas y agregados"""
+import numpy as np
+
+from imputacion import estimada, imputar, margenes
+from indicadores import DERIVADAS, PlanIndicadores, fuentes
+
+# Clave INEGI que identifica cada localidad
+CLAVES = ['cve_entidad', 'cve_municipio', 'cve_localidad']
+
+# Claves de localidad de las filas de resumen del ITER (total del municipio y
+# subtotales de las localidades de una y de dos viviendas), que repiten
+# población ya listada; los subtotales se usan antes como márgenes de imputar
+LOCALIDADES_RESUMEN = (0, 9998, 9999)
+
+# Medidas aditivas que se suman por municipio
+MEDIDAS = [
+    'pob_total', 'pob_femenina', 'pob_masculina', 'pob_indigena',
+    'pob_discapacidad', 'pob_economicamente_activa', 'pob_sin_salud',
+    'pob_con_salud', 'total_viviendas', 'viviendas_habitadas',
+    'viviendas_particulares'
+]
+
+
+def limpiar_filas(df):
+    """Elimina filas sin municipio o sin población y las filas de resumen del ITER"""
+    df = df.dropna(subset=['municipio'])
+    df = df.dropna(subset=['pob_total'])
+    return df[(df['pob_total'] > 0) & ~df['cve_localidad'].isin(LOCALIDADES_RESUMEN)]
+
+
+def calcular_derivadas(df):
+    """Calcula los cocientes del catálogo de indicadores para cada localidad (0 sin denominador)"""
+    df = df.copy()
+    df[DERIVADAS] = PlanIndicadores(DERIVADAS).por_fila(df, sin_base=0).round(2)
+    return df
+
+
+def preparar(df):
+    """Limpia filas, estima las celdas reservadas (con los subtotales publicados del mismo
+    archivo) y añade métricas derivadas a un DataFrame ya validado"""
+    return calcular_derivadas(imputar(limpiar_filas(df), margenes(df)))
+
+
+def imputadas(df, columna, agregada=False):
+    """Filas donde ``columna`` es una estimación: la celda o, en un indicador, su numerador
+    o su denominador estaban reservados (``agregada``: ver ``imputacion.estimada``)"""
+    return np.logical_or.reduce([estimada(df, fuente, agregada) for fuente in fuentes(columna)])
+
+
+def agregar_municipios(df):
+    """Suma las medidas aditivas por municipio y, en ``<medida>_imputado``, la parte estimada"""
+    estimadas = {f"{medida}_imputado": np.where(imputadas(df, medida, agregada=True), df[medida], 0)
+                 for medida in MEDIDAS}
+    agregados = df.assign(**estimadas).groupby(['cve_entidad', 'cve_municipio']).agg(
+        municipio=('municipio', 'first'),
+        localidades=('cve_localidad', 'count'),
+        **{medida: (medida, 'sum') for medida in MEDIDAS},
+        **{columna: (columna, 'sum') for columna in estimadas}
+    )
+    return agregados.reset_index()
@@ -0,0 +1,178 @@
+"""Esquema compilado de las tablas ITER del INEGI usadas por los dashboards.
+
+El esquema describe cada columna (nombre original, nombre corto, tipo y si es
+obligatoria) y los marcadores de supresión que publica el INEGI. Se compila una
+sola vez y valida/convierte un DataFrame completo en una pasada vectorizada,
+devolviendo conteos por columna para diagnosticar archivos defectuosos.
+
+Las celdas reservadas por confidencialidad (``*``) quedan en NaN, no en 0, y
+se marcan en la columna entera ``suprimidas``: el bit j corresponde a
+``suprimibles[j]``. ``imputacion.py`` las estima a partir de esa máscara.
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+# Marcadores que el INEGI usa en lugar de un valor numérico
+# (* = reservado por confidencialidad, N/D = no disponible, N/A = no aplica)
+MARCADORES_SUPRESION = ("*", "N/D", "N/A")
+
+# Marcador de dato reservado por confidencialidad: la celda existe pero no se publica
+MARCADOR_RESERVADO = "*"
+
+# Mapa de bits de las celdas reservadas de cada fila
+COLUMNA_SUPRESION = 'suprimidas'
+
+# Valores de texto que se consideran vacíos
+VALORES_VACIOS = ("", "nan", "None")
+
+# (nombre original, nombre corto, tipo, obligatoria)
+COLUMNAS_ITER = [
+    ('Clave de entidad federativa', 'cve_entidad', 'clave', True),
+    ('Nombre de la entidad', 'entidad', 'texto', False),
+    ('Clave de municipio o demarcación territorial', 'cve_municipio', 'clave', True),
+    ('Nombre del municipio o demarcación territorial', 'municipio', 'texto', True),
+    ('Clave de localidad', 'cve_localidad', 'clave', True),
+    ('Nombre de la localidad', 'localidad', 'texto', True),
+    ('Población total', 'pob_total', 'numero', True),
+    ('Población femenina', 'pob_femenina', 'numero', False),
+    ('Población masculina', 'pob_masculina', 'numero', False),
+    ('Población de 3 años y más que habla alguna lengua indígena', 'pob_indigena', 'numero', False),
+    ('Población con discapacidad', 'pob_discapacidad', 'numero', False),
+    ('Grado promedio de escolaridad', 'escolaridad_promedio', 'numero', False),
+    ('Población de 12 años y más económicamente activa', 'pob_economicamente_activa', 'numero', False),
+    ('Población sin afiliación a servicios de salud', 'pob_sin_salud', 'numero', False),
+    ('Población afiliada a servicios de salud', 'pob_con_salud', 'numero', False),
+    ('Total de viviendas', 'total_viviendas', 'numero', False),
+    ('Total de viviendas habitadas', 'viviendas_habitadas', 'numero', False),
+    ('Total de viviendas particulares', 'viviendas_particulares', 'numero', False),
+]
+
+
+class ResultadoValidacion:
+    """Resultado de validar un DataFrame contra el esquema"""
+
+    def __init__(self, df, conteos, faltantes, errores, advertencias, tiempo_ms):
+        self.df = df
+        self.conteos = conteos
+        self.faltantes = faltantes
+        self.errores = errores
+        self.advertencias = advertencias
+        self.tiempo_ms = tiempo_ms
+
+    @property
+    def es_valido(self):
+        return not self.errores
+
+    def resumen(self):
+        """Tabla por columna con celdas convertidas, inválidas y vacías"""
+        return self.conteos.rename(columns={
+            'tipo': 'Tipo',
+            'marcadores': 'Marcadores (*, N/D)',
+            'invalidas': 'Inválidas',
+            'vacias': 'Vacías',
+        })
+
+
+class EsquemaITER:
+    """Esquema compilado: nombres, tipos, columnas obligatorias y marcadores"""
+
+    def __init__(self, columnas=COLUMNAS_ITER, marcadores=MARCADORES_SUPRESION,
+                 max_invalidas=0.05):
+        self.columnas = list(columnas)
+        self.marcadores = list(marcadores)
+        self.max_invalidas = max_invalidas
+
+        self.a_corto = {original: corto for original, corto, _, _ in self.columnas}
+        self.a_original = {corto: original for original, corto, _, _ in self.columnas}
+        self.tipos = {corto: tipo for _, corto, tipo, _ in self.columnas}
+        self.obligatorias = [corto for _, corto, _, req in self.columnas if req]
+        self.numericas = [corto for _, corto, tipo, _ in self.columnas if tipo in ('clave', 'numero')]
+        self.texto = [corto for _, corto, tipo, _ in self.columnas if tipo == 'texto']
+        self.claves = [corto for _, corto, tipo, _ in self.columnas if tipo == 'clave']
+        self.suprimibles = [corto for _, corto, tipo, _ in self.columnas if tipo == 'numero']
+
+    @property
+    def columnas_originales(self):
+        return [original for original, _, _, _ in self.columnas]
+
+    def validar(self, df, renombrar=True):
+        """Valida y convierte un DataFrame completo.
+
+        Acepta columnas con nombre original o corto. Con ``renombrar=True`` el
+        resultado usa los nombres cortos; si no, los nombres originales.
+        """
+        inicio = time.perf_counter()
+        errores = []
+        advertencias = []
+
+        # Normalizar a nombres cortos para trabajar
+        df = df.rename(columns=self.a_corto)
+        faltantes = [col for col in self.a_original if col not in df.columns]
+        faltantes_obligatorias = [col for col in faltantes if col in self.obligatorias]
+
+        if faltantes_obligatorias:
+            errores.append(
+                "Faltan columnas obligatorias: "
+                + ", ".join(self.a_original[col] for col in faltantes_obligatorias)
+            )
+            conteos = pd.DataFrame(columns=['tipo', 'marcadores', 'invalidas', 'vacias'])
+            return ResultadoValidacion(None, conteos, faltantes, errores, advertencias,
+                                       (time.perf_counter() - inicio) * 1000)
+
+        for col in faltantes:
+            advertencias.append(f"Columna ausente, se llenó con N/D: {self.a_original[col]}")
+            df[col] = np.nan
+
+        # Conversión numérica de todo el bloque en una sola pasada
+        numericas = self.numericas
+        bloque = df[numericas]
+        valores = bloque.to_numpy(dtype=object)
+        vacias = pd.isna(valores)
+        marcadores = bloque.isin(self.marcadores).to_numpy()
+        convertidos = pd.to_numeric(pd.Series(valores.ravel()), errors='coerce').to_numpy(dtype=float)
+        convertidos = convertidos.reshape(valores.shape)
+        invalidas = np.isnan(convertidos) & ~vacias & ~marcadores
+        posiciones = [numericas.index(col) for col in self.suprimibles]
+        reservadas = (valores[:, posiciones] == MARCADOR_RESERVADO).astype(np.int32)
+
+        df[numericas] = pd.DataFrame(convertidos, index=df.index, columns=numericas)
+
+        # Las claves INEGI son enteras (Int64, vacías como <NA>); una clave con decimales es inválida
+        for col in self.claves:
+            j = numericas.index(col)
+            enteras = np.isnan(convertidos[:, j]) | (convertidos[:, j] == np.round(convertidos[:, j]))
+            invalidas[:, j] |= ~enteras
+            df[col] = pd.Series(np.where(enteras, convertidos[:, j], np.nan), index=df.index).astype('Int64')
+        df[COLUMNA_SUPRESION] = reservadas @ (np.int32(1) << np.arange(len(posiciones), dtype=np.int32))
+
+        for col in self.texto:
+            serie = df[col].astype('string').str.strip()
+            df[col] = serie.mask(serie.isin(VALORES_VACIOS)).astype(object)
+
+        conteos = pd.DataFrame({
+            'tipo': [self.tipos[col] for col in numericas],
+            'marcadores': marcadores.sum(axis=0),
+            'invalidas': invalidas.sum(axis=0),
+            'vacias': vacias.sum(axis=0),
+        }, index=[self.a_original[col] for col in numericas])
+        conteos.index.name = 'Columna'
+
+        filas = max(len(df), 1)
+        for col, n in zip(numericas, conteos['invalidas']):
+            if n / filas > self.max_invalidas:
+                errores.append(
+                    f"'{self.a_original[col]}' tiene {n:,} celdas no numéricas "
+                    f"({n / filas:.0%}); verifica que sea una tabla ITER del INEGI"
+                )
+
+        if not renombrar:
+            df = df.rename(columns=self.a_original)
+
+        return ResultadoValidacion(df, conteos, faltantes, errores, advertencias,
+                                   (time.perf_counter() - inicio) * 1000)
+
+
+# Esquema por defecto, compilado una sola vez al importar
+ESQUEMA_ITER = EsquemaITER()
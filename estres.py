@@ -0,0 +1,415 @@
+"""Prueba de carga de los dashboards con usuarios simulados.
+
+Levanta app.py o app2.py con ``streamlit run`` en un puerto libre y conecta
+varias sesiones al mismo websocket que usa el navegador. Cada sesión sigue un
+recorrido de ``RECORRIDOS`` (subir el archivo, elegir municipio, mover
+sliders, comparar, descargar el CSV) enviando los mismos mensajes de rerun
+que el frontend, incluido el ``fragment_id`` cuando el widget vive en un
+panel. Cambiar de pestaña no genera rerun (las pestañas se dibujan en el
+navegador), así que el recorrido usa los widgets de cada pestaña. Un paso
+cuyo widget ya no se dibuja, o cuya ejecución no termina en ``ESPERA_MAXIMA``
+segundos, se reporta como omitido en lugar de detener la prueba.
+
+Reporta reruns/s de todo el servidor, percentiles de latencia por paso y la
+memoria del proceso de Streamlit por sesión conectada. AppTest no sirve para
+esto: cada ejecución reemplaza el runtime global del proceso, así que no
+admite sesiones concurrentes contra un mismo worker.
+
+Uso:
+    python estres.py app2.py --usuarios 8 --repeticiones 3
+    python estres.py app.py --archivo data/nayarit2.xlsx --usuarios 4
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+
+import numpy as np
+from tornado.httpclient import AsyncHTTPClient, HTTPRequest
+from tornado.websocket import websocket_connect
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.Common_pb2 import FileUploaderState, UploadedFileInfo
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+# Valor elegido al azar entre las opciones (o el rango) del widget
+AZAR = object()
+
+# Pasos de cada recorrido: (nombre, tipo, etiqueta del widget, valor)
+RECORRIDOS = {
+    'app.py': [
+        ('Subir archivo', 'subir', 'Sube tu archivo Excel con datos de Nayarit', None),
+        ('Municipio', 'selectbox', 'Selecciona un municipio:', AZAR),
+        ('Métrica del ranking', 'selectbox', 'Selecciona la métrica para el ranking:', AZAR),
+        ('Top N', 'slider', 'Número de localidades a mostrar:', AZAR),
+        ('Población mínima', 'number_input', 'Población mínima:', 100),
+        ('Descargar CSV', 'descargar', '📥 Descargar datos como CSV', None),
+        ('Todos los municipios', 'selectbox', 'Selecciona un municipio:', 'Todos los municipios'),
+    ],
+    'app2.py': [
+        ('Municipio', 'selectbox', '🏙️ Municipio', AZAR),
+        ('Localidad', 'selectbox', '📍 Localidad', AZAR),
+        ('Top N', 'slider', '📈 Top N localidades a mostrar', AZAR),
+        ('Descargar CSV', 'descargar', '📊 Descargar CSV', None),
+        ('Modo comparación', 'checkbox', 'Comparar varias áreas', True),
+        ('Municipios a comparar', 'multiselect', '🏙️ Municipios a comparar', AZAR),
+        ('Salir de comparación', 'checkbox', 'Comparar varias áreas', False),
+    ],
+}
+
+# Tipo de elemento de cada widget que el recorrido sabe operar
+WIDGETS = ('selectbox', 'multiselect', 'slider', 'number_input', 'checkbox', 'radio',
+           'text_input', 'file_uploader', 'download_button')
+
+# Segundos sin terminar una ejecución tras los que el paso se da por perdido
+ESPERA_MAXIMA = 60
+
+
+def memoria_proceso_mb(pid):
+    """Memoria residente (VmRSS) de un proceso en MB (Linux)"""
+    with open(f"/proc/{pid}/status") as f:
+        for linea in f:
+            if linea.startswith("VmRSS:"):
+                return int(linea.split()[1]) / 1024
+    return float('nan')
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Servidor:
+    """``streamlit run`` del script en un puerto libre, como proceso hijo"""
+
+    def __init__(self, script):
+        self.script = script
+        self.puerto = _puerto_libre()
+        self.url = f"http://127.0.0.1:{self.puerto}"
+        self.proceso = None
+
+    def __enter__(self):
+        self.proceso = subprocess.Popen(
+            [sys.executable, "-m", "streamlit", "run", self.script,
+             "--server.headless", "true", "--server.address", "127.0.0.1",
+             "--server.port", str(self.puerto), "--server.fileWatcherType", "none",
+             "--server.enableXsrfProtection", "false", "--browser.gatherUsageStats", "false"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        return self
+
+    async def esperar(self, timeout=60):
+        cliente = AsyncHTTPClient()
+        limite = time.monotonic() + timeout
+        while time.monotonic() < limite:
+            if self.proceso.poll() is not None:
+                raise RuntimeError(f"streamlit terminó con código {self.proceso.returncode}")
+            try:
+                await cliente.fetch(self.url + "/_stcore/health")
+                return
+            except OSError:
+                await asyncio.sleep(0.2)
+        raise TimeoutError(f"{self.script} no respondió en {timeout} s")
+
+    def memoria_mb(self):
+        return memoria_proceso_mb(self.proceso.pid)
+
+    def __exit__(self, *exc):
+        self.proceso.terminate()
+        try:
+            self.proceso.wait(10)
+        except subprocess.TimeoutExpired:
+            self.proceso.kill()
+
+
+class Sesion:
+    """Un usuario simulado: una conexión websocket y el estado de sus widgets"""
+
+    def __init__(self, url, rng, archivo=None):
+        self.url = url
+        self.rng = rng
+        self.archivo = archivo
+        self.session_id = None
+        self.widgets = {}   # etiqueta -> (tipo, proto del elemento, fragment_id)
+        self.estados = {}   # id del widget -> WidgetState enviado
+        self.refrescos = {}  # fragment_id -> intervalo (s) de los fragmentos con run_every
+        self.excepciones = 0
+        self.sin_respuesta = 0
+        self._dibujados = set()  # etiquetas de los widgets dibujados en la ejecución en curso
+        self._ws = None
+
+    async def conectar(self):
+        self._ws = await websocket_connect(self.url.replace("http", "ws", 1) + "/_stcore/stream")
+
+    def cerrar(self):
+        if self._ws is not None:
+            self._ws.close()
+
+    async def _enviar(self, mensaje):
+        await self._ws.write_message(mensaje.SerializeToString(), binary=True)
+
+    async def _recibir(self):
+        """Lee un ForwardMsg y registra sesión, widgets y excepciones"""
+        datos = await self._ws.read_message()
+        if datos is None:
+            raise ConnectionError("el servidor cerró el websocket")
+        mensaje = ForwardMsg()
+        mensaje.ParseFromString(datos)
+        tipo = mensaje.WhichOneof('type')
+        if tipo == 'new_session':
+            self.session_id = mensaje.new_session.initialize.session_id
+        elif tipo == 'auto_rerun':
+            self.refrescos[mensaje.auto_rerun.fragment_id] = mensaje.auto_rerun.interval
+        elif tipo == 'delta' and mensaje.delta.WhichOneof('type') == 'new_element':
+            elemento = mensaje.delta.new_element
+            nombre = elemento.WhichOneof('type')
+            if nombre == 'exception':
+                self.excepciones += 1
+            elif nombre in WIDGETS:
+                proto = getattr(elemento, nombre)
+                self.widgets[proto.label] = (nombre, proto, mensaje.delta.fragment_id)
+                self._dibujados.add(proto.label)
+        return mensaje
+
+    def _olvidar_ocultos(self, fragment_id):
+        """Quita los widgets de la ejecución que terminó y que ya no se dibujaron.
+
+        Una ejecución completa redibuja toda la página; la de un fragmento
+        solo los widgets de ese fragmento.
+        """
+        for etiqueta, (_, proto, fragmento) in list(self.widgets.items()):
+            if etiqueta not in self._dibujados and (not fragment_id or fragmento == fragment_id):
+                del self.widgets[etiqueta]
+                self.estados.pop(proto.id, None)
+
+    async def rerun(self, fragment_id=""):
+        """Envía el estado de los widgets y espera a que termine la ejecución.
+
+        Como el navegador, vuelve a ejecutar los fragmentos con ``run_every``
+        (p. ej. la barra de avance de un trabajo de ``trabajos.py``) hasta que
+        la página deja de pedirlo.
+        """
+        self.refrescos = {}
+        await self._ejecutar_rerun(fragment_id)
+        while self.refrescos:
+            fragmento, intervalo = next(iter(self.refrescos.items()))
+            await asyncio.sleep(intervalo)
+            self.refrescos = {}
+            await self._ejecutar_rerun(fragmento)
+
+    async def _ejecutar_rerun(self, fragment_id):
+        mensaje = BackMsg()
+        mensaje.rerun_script.query_string = ""
+        mensaje.rerun_script.fragment_id = fragment_id
+        mensaje.rerun_script.widget_states.widgets.extend(self.estados.values())
+        self._dibujados = set()
+        await self._enviar(mensaje)
+        await asyncio.wait_for(self._fin_ejecucion(fragment_id), ESPERA_MAXIMA)
+
+    async def _fin_ejecucion(self, fragment_id):
+        while True:
+            respuesta = await self._recibir()
+            if respuesta.WhichOneof('type') == 'script_finished':
+                if respuesta.script_finished == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    # La ejecución interrumpida no dibujó la página completa
+                    self._dibujados = set()
+                else:
+                    self._olvidar_ocultos(fragment_id)
+                    return
+
+    async def _subir(self, etiqueta):
+        _, proto, fragment_id = self.widgets[etiqueta]
+        nombre = os.path.basename(self.archivo)
+        with open(self.archivo, "rb") as f:
+            contenido = f.read()
+
+        # Igual que el navegador: pedir URLs de subida, PUT del archivo y
+        # luego el estado del widget apuntando al archivo subido
+        mensaje = BackMsg()
+        mensaje.file_urls_request.request_id = uuid.uuid4().hex
+        mensaje.file_urls_request.session_id = self.session_id
+        mensaje.file_urls_request.file_names.append(nombre)
+        await self._enviar(mensaje)
+        urls = await asyncio.wait_for(self._urls_subida(), ESPERA_MAXIMA)
+
+        limite = uuid.uuid4().hex
+        cuerpo = (f"--{limite}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{nombre}\"\r\n"
+                  f"Content-Type: application/octet-stream\r\n\r\n").encode() + contenido + f"\r\n--{limite}--\r\n".encode()
+        destino = urls.upload_url if urls.upload_url.startswith("http") else self.url + urls.upload_url
+        await AsyncHTTPClient().fetch(HTTPRequest(
+            destino, method="PUT", body=cuerpo,
+            headers={"Content-Type": f"multipart/form-data; boundary={limite}"}
+        ))
+
+        estado = WidgetState(id=proto.id)
+        estado.file_uploader_state_value.CopyFrom(FileUploaderState(
+            max_file_id=1,
+            uploaded_file_info=[UploadedFileInfo(id=1, name=nombre, size=len(contenido),
+                                                 file_id=urls.file_id, file_urls=urls)]
+        ))
+        self.estados[proto.id] = estado
+        await self.rerun(fragment_id)
+
+    async def _urls_subida(self):
+        while True:
+            respuesta = await self._recibir()
+            if respuesta.WhichOneof('type') == 'file_urls_response':
+                return respuesta.file_urls_response.file_urls[0]
+
+    async def _descargar(self, etiqueta):
+        _, proto, _ = self.widgets[etiqueta]
+        destino = proto.url if proto.url.startswith("http") else self.url + proto.url
+        await AsyncHTTPClient().fetch(destino)
+
+    def _valor(self, tipo, proto, valor):
+        """WidgetState con el valor dado (o uno al azar) para el widget"""
+        estado = WidgetState(id=proto.id)
+        if tipo == 'selectbox':
+            opciones = list(proto.options)
+            estado.string_value = self.rng.choice(opciones) if valor is AZAR else valor
+        elif tipo == 'multiselect':
+            opciones = list(proto.options)
+            elegidas = self.rng.sample(opciones, min(3, len(opciones))) if valor is AZAR else valor
+            estado.string_array_value.data.extend(elegidas)
+        elif tipo == 'radio':
+            opciones = list(proto.options)
+            estado.int_value = self.rng.randrange(len(opciones)) if valor is AZAR else opciones.index(valor)
+        elif tipo == 'slider':
+            numero = self.rng.randint(int(proto.min), int(proto.max)) if valor is AZAR else valor
+            estado.double_array_value.data.append(numero)
+        elif tipo == 'number_input':
+            estado.double_value = self.rng.uniform(proto.min, proto.max) if valor is AZAR else valor
+        elif tipo == 'checkbox':
+            estado.bool_value = self.rng.random() < 0.5 if valor is AZAR else valor
+        elif tipo == 'text_input':
+            estado.string_value = valor
+        else:
+            raise ValueError(f"Widget no soportado: {tipo}")
+        return estado
+
+    async def paso(self, tipo, etiqueta, valor):
+        """Ejecuta un paso del recorrido; devuelve False si el widget no está en
+        pantalla o si el servidor no terminó la ejecución en ``ESPERA_MAXIMA`` s"""
+        if etiqueta not in self.widgets:
+            return False
+        try:
+            if tipo == 'subir':
+                await self._subir(etiqueta)
+            elif tipo == 'descargar':
+                await self._descargar(etiqueta)
+            else:
+                tipo_widget, proto, fragment_id = self.widgets[etiqueta]
+                self.estados[proto.id] = self._valor(tipo_widget, proto, valor)
+                await self.rerun(fragment_id)
+        except asyncio.TimeoutError:
+            self.sin_respuesta += 1
+            return False
+        return True
+
+
+async def _usuario(url, recorrido, repeticiones, semilla, archivo, latencias, omitidos, sesiones):
+    sesion = Sesion(url, random.Random(semilla), archivo)
+    sesiones.append(sesion)
+    await sesion.conectar()
+    inicio = time.perf_counter()
+    await sesion.rerun()
+    latencias['Abrir'].append((time.perf_counter() - inicio) * 1000)
+    for _ in range(repeticiones):
+        for nombre, tipo, etiqueta, valor in recorrido:
+            inicio = time.perf_counter()
+            if await sesion.paso(tipo, etiqueta, valor):
+                latencias[nombre].append((time.perf_counter() - inicio) * 1000)
+            else:
+                omitidos[nombre] += 1
+
+
+async def _ejecutar(script, usuarios, repeticiones, archivo, semilla):
+    recorrido = RECORRIDOS[os.path.basename(script)]
+    with Servidor(script) as servidor:
+        await servidor.esperar()
+
+        # Un usuario de calentamiento llena las cachés compartidas del worker
+        # antes de tomar la memoria base
+        calentamiento = []
+        await _usuario(servidor.url, recorrido, 1, semilla, archivo,
+                       defaultdict(list), defaultdict(int), calentamiento)
+        calentamiento[0].cerrar()
+        await asyncio.sleep(0.5)
+        memoria_base = servidor.memoria_mb()
+
+        latencias, omitidos, sesiones = defaultdict(list), defaultdict(int), []
+        pico = memoria_base
+
+        async def muestrear():
+            nonlocal pico
+            while servidor.proceso.poll() is None:
+                pico = max(pico, servidor.memoria_mb())
+                await asyncio.sleep(0.1)
+
+        muestreo = asyncio.ensure_future(muestrear())
+        inicio = time.perf_counter()
+        await asyncio.gather(*(
+            _usuario(servidor.url, recorrido, repeticiones, semilla + i + 1, archivo, latencias, omitidos, sesiones)
+            for i in range(usuarios)
+        ))
+        duracion = time.perf_counter() - inicio
+        muestreo.cancel()
+        memoria_final = servidor.memoria_mb()
+        for sesion in sesiones:
+            sesion.cerrar()
+
+    todas = np.concatenate([np.array(v) for v in latencias.values()])
+    return {
+        'usuarios': usuarios,
+        'reruns': len(todas),
+        'reruns_por_segundo': round(len(todas) / duracion, 2),
+        'p50_ms': round(float(np.percentile(todas, 50)), 1),
+        'p95_ms': round(float(np.percentile(todas, 95)), 1),
+        'p99_ms': round(float(np.percentile(todas, 99)), 1),
+        'pasos': {nombre: (len(v), float(np.percentile(v, 50)), float(np.percentile(v, 95)))
+                  for nombre, v in latencias.items()},
+        'omitidos': dict(omitidos),
+        'excepciones': sum(sesion.excepciones for sesion in sesiones),
+        'sin_respuesta': sum(sesion.sin_respuesta for sesion in sesiones),
+        'memoria_base_mb': round(memoria_base, 1),
+        'memoria_pico_mb': round(pico, 1),
+        'memoria_por_sesion_mb': round((memoria_final - memoria_base) / usuarios, 2),
+    }
+
+
+def prueba_carga(script, usuarios=4, repeticiones=2, archivo=None, semilla=0):
+    """Corre ``usuarios`` sesiones concurrentes del recorrido del script y devuelve las métricas"""
+    if os.path.basename(script) == 'app.py' and archivo is None:
+        raise ValueError("app.py necesita --archivo para subir")
+    return asyncio.run(_ejecutar(script, usuarios, repeticiones, archivo, semilla))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prueba de carga de los dashboards")
+    parser.add_argument("script", choices=sorted(RECORRIDOS), help="dashboard a probar")
+    parser.add_argument("--usuarios", type=int, nargs="+", default=[4],
+                        help="sesiones concurrentes (varios valores: una prueba por cada uno)")
+    parser.add_argument("--repeticiones", type=int, default=2, help="veces que cada usuario sigue el recorrido")
+    parser.add_argument("--archivo", help="Excel que sube cada usuario (app.py)")
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+
+    for usuarios in args.usuarios:
+        r = prueba_carga(args.script, usuarios, args.repeticiones, args.archivo, args.semilla)
+        print(f"\n{usuarios} usuarios: {r['reruns']} reruns, {r['reruns_por_segundo']:.2f} reruns/s   "
+              f"p50 {r['p50_ms']:.0f} ms   p95 {r['p95_ms']:.0f} ms   p99 {r['p99_ms']:.0f} ms")
+        print(f"memoria: base {r['memoria_base_mb']:.0f} MB, pico {r['memoria_pico_mb']:.0f} MB, "
+              f"{r['memoria_por_sesion_mb']:.1f} MB por sesión   excepciones: {r['excepciones']}   "
+              f"pasos sin respuesta: {r['sin_respuesta']}")
+        for nombre, (n, p50, p95) in r['pasos'].items():
+            print(f"    {nombre:<24} {n:>4}   p50 {p50:>7.0f} ms   p95 {p95:>7.0f} ms")
+        for nombre, n in r['omitidos'].items():
+            print(f"    {nombre:<24} omitido {n} veces (widget no visible o sin respuesta)")
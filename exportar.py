@@ -0,0 +1,215 @@
+"""Sitio estático con las vistas más visitadas, para servir sin Python.
+
+Genera una página por municipio con los gráficos de app2.py
+(``graficos.figuras_municipio``) y los de localidades y pirámide de app.py,
+más ``index.html`` con la vista "Todos los municipios" de app.py. Las páginas
+son HTML autocontenido salvo por ``plotly.min.js``, que se escribe una sola
+vez en la raíz y comparten todas, así que el directorio se puede publicar
+tal cual en un CDN o un servidor de archivos.
+
+Las páginas de municipio se construyen en paralelo. El manifiesto guarda la
+huella de las localidades de cada municipio: en una actualización solo se
+regeneran los municipios cuyas filas cambiaron (y el índice, que depende de
+todas), y se borran las páginas de los que ya no existen.
+
+Uso:
+    python exportar.py                # construye o actualiza sitio/
+    python exportar.py --todo         # regenera todas las páginas
+    python exportar.py --png          # también una imagen por gráfico (requiere kaleido)
+"""
+import argparse
+import html
+import json
+import os
+import re
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+
+from almacen import AlmacenColumnar, huella
+from esquema import ESQUEMA_ITER
+from graficos import (create_demographic_pyramid, create_housing_analysis, create_locality_analysis,
+                      create_municipality_ranking, figuras_municipio)
+from indicadores import formatear
+from jerarquia import Jerarquia
+
+DIRECTORIO_SITIO = "sitio"
+PLOTLY_JS = "plotly.min.js"
+
+# Se incrementa cuando cambian las plantillas o las figuras: fuerza regenerar todo
+FORMATO = 2
+
+_ESTILO = """
+body { font-family: sans-serif; margin: 2rem; color: #222; }
+header { background: linear-gradient(90deg, #1f4e79, #2e8b57); color: white; padding: 1.5rem;
+         border-radius: 10px; margin-bottom: 1.5rem; }
+header a { color: white; }
+.metricas { display: flex; gap: 1rem; flex-wrap: wrap; margin-bottom: 1.5rem; }
+.metrica { flex: 1; min-width: 180px; padding: 1rem; border-radius: 10px; border-left: 4px solid #1f4e79;
+           box-shadow: 0 2px 4px rgba(0, 0, 0, 0.1); }
+.metrica .valor { font-size: 1.8rem; }
+.metrica .delta { color: #2e8b57; font-size: 0.9rem; }
+.graficos { display: grid; grid-template-columns: repeat(auto-fit, minmax(480px, 1fr)); gap: 1rem; }
+nav ul { columns: 4; }
+"""
+
+
+def slug(nombre):
+    """Nombre de archivo ASCII para un municipio"""
+    texto = unicodedata.normalize("NFKD", nombre).encode("ascii", "ignore").decode()
+    return re.sub(r"[^a-z0-9]+", "-", texto.lower()).strip("-")
+
+
+def _tarjetas(area, total_estado):
+    """Las cuatro tarjetas de app2.py a partir de una fila de ``Jerarquia``"""
+    poblacion = area['pob_total']
+    tarjetas = [
+        ("👥 Población Total", f"{poblacion:,.0f}", f"{poblacion / total_estado * 100:.1f}% del estado"),
+        ("🏘️ Viviendas Habitadas", f"{area['viviendas_habitadas']:,.0f}",
+         f"{area['personas_por_vivienda']:.1f} hab/vivienda"),
+        ("🎓 Escolaridad Promedio", formatear('escolaridad_promedio', area['escolaridad_promedio']),
+         "años de estudio"),
+        ("🗣️ Población Indígena", f"{area['pob_indigena']:,.0f}",
+         formatear('porcentaje_indigena', area['porcentaje_indigena'])),
+    ]
+    return "".join(
+        f'<div class="metrica"><div>{html.escape(etiqueta)}</div><div class="valor">{valor}</div>'
+        f'<div class="delta">{html.escape(delta)}</div></div>'
+        for etiqueta, valor, delta in tarjetas
+    )
+
+
+def _pagina(titulo, subtitulo, tarjetas, figuras, raiz, extra=""):
+    graficos = "".join(
+        f'<div>{figura.to_html(full_html=False, include_plotlyjs=False, div_id=nombre)}</div>'
+        for nombre, figura in figuras.items()
+    )
+    return (
+        f'<!DOCTYPE html>\n<html lang="es"><head><meta charset="utf-8">'
+        f'<meta name="viewport" content="width=device-width, initial-scale=1">'
+        f'<title>{html.escape(titulo)}</title><script src="{raiz}{PLOTLY_JS}"></script>'
+        f'<style>{_ESTILO}</style></head><body>'
+        f'<header><h1>{html.escape(titulo)}</h1><p>{subtitulo}</p></header>'
+        f'<div class="metricas">{tarjetas}</div><div class="graficos">{graficos}</div>{extra}'
+        f'</body></html>\n'
+    )
+
+
+def _escribir(ruta, contenido):
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    with open(ruta + ".tmp", "w", encoding="utf-8") as f:
+        f.write(contenido)
+    os.replace(ruta + ".tmp", ruta)
+
+
+def _imagenes(figuras, directorio):
+    os.makedirs(directorio, exist_ok=True)
+    for nombre, figura in figuras.items():
+        figura.write_image(os.path.join(directorio, f"{nombre}.png"))
+
+
+def _construir_municipio(tarea):
+    """Página de un municipio (corre en un proceso del pool)"""
+    nombre, df, area, total_estado, directorio, png = tarea
+    figuras = {
+        'localidades': create_locality_analysis(df, nombre),
+        'piramide': create_demographic_pyramid(df, nombre),
+        **figuras_municipio(df.rename(columns=ESQUEMA_ITER.a_original)),
+    }
+    subtitulo = f'{area["localidades"]:,.0f} localidades · <a href="../index.html">Todos los municipios</a>'
+    _escribir(os.path.join(directorio, "municipios", f"{slug(nombre)}.html"),
+              _pagina(f"Dashboard de Nayarit — {nombre}", subtitulo, _tarjetas(area, total_estado), figuras, "../"))
+    if png:
+        _imagenes(figuras, os.path.join(directorio, "municipios", slug(nombre)))
+    return nombre
+
+
+def _construir_indice(df, jerarquia, municipios, directorio, png):
+    """Vista "Todos los municipios" de app.py con enlaces a cada municipio"""
+    figuras = {
+        'municipios': create_municipality_ranking(jerarquia),
+        'localidades': create_locality_analysis(df, "Todos los municipios"),
+        'piramide': create_demographic_pyramid(df, "Todos los municipios"),
+        'vivienda': create_housing_analysis(jerarquia),
+    }
+    totales = jerarquia.fila('nacional')
+    enlaces = "".join(f'<li><a href="municipios/{slug(nombre)}.html">{html.escape(nombre)}</a></li>'
+                      for nombre in sorted(municipios))
+    subtitulo = f'{totales["localidades"]:,.0f} localidades en {totales["municipios"]:,.0f} municipios'
+    _escribir(os.path.join(directorio, "index.html"),
+              _pagina("Dashboard de Nayarit", subtitulo, _tarjetas(totales, totales['pob_total']), figuras, "",
+                      extra=f"<nav><h2>Municipios</h2><ul>{enlaces}</ul></nav>"))
+    if png:
+        _imagenes(figuras, os.path.join(directorio, "estado"))
+
+
+def exportar(directorio=DIRECTORIO_SITIO, almacen=None, procesos=None, todo=False, png=False, progreso=None):
+    """Construye o actualiza el sitio; devuelve los municipios regenerados.
+
+    ``progreso(fraccion, mensaje)`` recibe el avance por municipio (ver ``trabajos.py``).
+    """
+    import plotly
+    from plotly.offline import get_plotlyjs
+
+    almacen = almacen or AlmacenColumnar()
+    df = almacen.cargar()
+    jerarquia = Jerarquia(df)
+    ruta_manifiesto = os.path.join(directorio, "manifiesto.json")
+    anterior = {}
+    if os.path.exists(ruta_manifiesto):
+        with open(ruta_manifiesto, encoding="utf-8") as f:
+            anterior = json.load(f)
+    if anterior.get('formato') != FORMATO or anterior.get('plotly') != plotly.__version__ or anterior.get('png') != png:
+        todo = True
+
+    grupos = {nombre: grupo for nombre, grupo in df.groupby('municipio', sort=True)}
+    # Sin el índice: una fila nueva en otro municipio no cambia la huella de este
+    huellas = {nombre: huella(grupo.reset_index(drop=True)) for nombre, grupo in grupos.items()}
+    previas = anterior.get('municipios', {})
+    cambiados = [nombre for nombre in grupos if todo or previas.get(nombre) != huellas[nombre]]
+    eliminados = [nombre for nombre in previas if nombre not in grupos]
+
+    if todo or not os.path.exists(os.path.join(directorio, PLOTLY_JS)):
+        _escribir(os.path.join(directorio, PLOTLY_JS), get_plotlyjs())
+    for nombre in eliminados:
+        ruta = os.path.join(directorio, "municipios", f"{slug(nombre)}.html")
+        if os.path.exists(ruta):
+            os.remove(ruta)
+
+    total_estado = jerarquia.fila('nacional')['pob_total']
+    tareas = [(nombre, grupos[nombre], jerarquia.municipio(nombre), total_estado, directorio, png)
+              for nombre in cambiados]
+    if tareas:
+        with ProcessPoolExecutor(procesos) as ejecutor:
+            for hechos, nombre in enumerate(ejecutor.map(_construir_municipio, tareas), 1):
+                if progreso:
+                    progreso(hechos / (len(tareas) + 1), nombre)
+    if cambiados or eliminados or not os.path.exists(os.path.join(directorio, "index.html")):
+        if progreso:
+            progreso(len(tareas) / (len(tareas) + 1), "Todos los municipios")
+        _construir_indice(df, jerarquia, grupos, directorio, png)
+
+    manifiesto = {
+        'formato': FORMATO,
+        'plotly': plotly.__version__,
+        'png': png,
+        'version': almacen.version(),
+        'municipios': huellas,
+    }
+    _escribir(ruta_manifiesto, json.dumps(manifiesto, ensure_ascii=False, indent=2))
+    return cambiados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sitio estático de los dashboards")
+    parser.add_argument("--directorio", default=DIRECTORIO_SITIO)
+    parser.add_argument("--procesos", type=int, help="procesos en paralelo (por omisión, uno por CPU)")
+    parser.add_argument("--todo", action="store_true", help="regenerar todas las páginas")
+    parser.add_argument("--png", action="store_true", help="exportar también cada gráfico como PNG")
+    args = parser.parse_args()
+    if args.png:
+        try:
+            import kaleido  # noqa: F401  (plotly lo usa en write_image)
+        except ImportError:
+            raise SystemExit("--png requiere el paquete kaleido (pip install kaleido)")
+    cambiados = exportar(args.directorio, procesos=args.procesos, todo=args.todo, png=args.png)
+    print(f"{len(cambiados)} municipios regenerados en {args.directorio}/")
@@ -0,0 +1,378 @@
+"""Gráficos de app.py y de la vista por municipio de app2.py, importables fuera de Streamlit.
+
+app2.py los dibuja en sus pestañas y exportar.py los usa para las páginas
+estáticas, así que ambos muestran exactamente las mismas figuras. Trabajan
+con los nombres de columna originales del INEGI. Los valores que dibujan
+(``datos_municipio``) se separan de las figuras para que ``perfiles.py`` los
+precalcule.
+
+Las figuras de app.py (``create_*``, con los nombres cortos de columna)
+también las usan el snapshot de arranque y el sitio estático; importarlas
+no ejecuta el script de la página.
+"""
+
+
+def crear_grafico_barras(df, x, y, titulo, top_n, color_col=None, horizontal=False):
+    """Crear gráfico de barras mejorado"""
+    # plotly se importa al dibujar el primer gráfico, no al arrancar el script
+    import plotly.express as px
+
+    df_sorted = df.sort_values(by=y, ascending=True if horizontal else False)
+
+    if horizontal:
+        fig = px.bar(df_sorted.tail(top_n), y=x, x=y, title=titulo,
+                     color=color_col, orientation='h', height=500)
+    else:
+        fig = px.bar(df_sorted.head(top_n), x=x, y=y, title=titulo,
+                     color=color_col, height=500)
+
+    fig.update_layout(
+        font=dict(size=12),
+        title_font_size=16,
+        showlegend=True if color_col else False
+    )
+    return fig
+
+
+def crear_grafico_dona(valores, etiquetas, titulo):
+    """Crear gráfico de dona"""
+    import plotly.graph_objects as go
+
+    fig = go.Figure(data=[go.Pie(
+        labels=etiquetas,
+        values=valores,
+        hole=.3,
+        textinfo='label+percent',
+        textposition='outside'
+    )])
+    fig.update_layout(
+        title=titulo,
+        font=dict(size=12),
+        showlegend=True,
+        height=400
+    )
+    return fig
+
+
+# Pestañas de la vista de municipio y las figuras de cada una, en orden
+PESTANAS = {
+    "🏘️ Población": ['poblacion', 'viviendas'],
+    "👥 Demografía": ['genero', 'discapacidad'],
+    "📚 Educación": ['escolaridad'],
+    "🏥 Salud": ['salud', 'pea'],
+}
+
+
+# Localidades que se guardan para los gráficos de barras (máximo del slider de app2.py)
+MAX_TOP = 20
+
+
+def datos_municipio(df_local, top_n=MAX_TOP):
+    """Valores que dibujan las figuras de un municipio: las ``top_n`` barras y los totales de las donas.
+
+    Es lo que guarda ``perfiles.py`` para no volver a agrupar las localidades.
+    """
+    df_pop = df_local.groupby("Nombre de la localidad")["Población total"].sum()
+    df_edu = df_local.groupby("Nombre de la localidad")["Grado promedio de escolaridad"].mean().dropna()
+    barras = lambda serie: [[nombre, float(valor)]
+                            for nombre, valor in serie.sort_values(ascending=True).tail(top_n).items()]
+
+    suma = lambda columna: float(df_local[columna].sum())
+    pob_total = suma("Población total")
+    habitadas = suma("Total de viviendas habitadas")
+    discapacidad = suma("Población con discapacidad")
+    # El ITER cargado no trae la población de 12 años y más: la PEA se compara con la población total
+    pea = suma("Población de 12 años y más económicamente activa")
+    return {
+        'poblacion': barras(df_pop),
+        'escolaridad': barras(df_edu),
+        'viviendas': [habitadas, suma("Total de viviendas") - habitadas],
+        'genero': [suma("Población femenina"), suma("Población masculina")],
+        'discapacidad': [discapacidad, pob_total - discapacidad],
+        'salud': [suma("Población afiliada a servicios de salud"),
+                  suma("Población sin afiliación a servicios de salud")],
+        'pea': [pea, pob_total - pea],
+    }
+
+
+def figuras_de_datos(datos, top_n=10):
+    """Figuras de las pestañas a partir de ``datos_municipio``"""
+    import pandas as pd
+
+    barras = lambda filas, columna: pd.DataFrame(filas, columns=["Nombre de la localidad", columna])
+    return {
+        'poblacion': crear_grafico_barras(barras(datos['poblacion'], "Población total"), "Nombre de la localidad",
+                                          "Población total", f"🏘️ Top {top_n} Localidades por Población", top_n,
+                                          horizontal=True),
+        'viviendas': crear_grafico_dona(datos['viviendas'], ["Habitadas", "Deshabitadas"],
+                                        "🏠 Distribución de Viviendas"),
+        'genero': crear_grafico_dona(datos['genero'], ["Femenina", "Masculina"], "👥 Distribución por Género"),
+        'discapacidad': crear_grafico_dona(datos['discapacidad'], ["Con discapacidad", "Sin discapacidad"],
+                                           "♿ Población con Discapacidad"),
+        'escolaridad': crear_grafico_barras(barras(datos['escolaridad'], "Grado promedio de escolaridad"),
+                                            "Nombre de la localidad", "Grado promedio de escolaridad",
+                                            "🎓 Escolaridad Promedio por Localidad", top_n, horizontal=True),
+        'salud': crear_grafico_dona(datos['salud'], ["Con afiliación", "Sin afiliación"],
+                                    "🏥 Afiliación a Servicios de Salud"),
+        'pea': crear_grafico_dona(datos['pea'], ["Económicamente activa", "Resto de la población"],
+                                  "💼 Población Económicamente Activa"),
+    }
+
+
+def figuras_municipio(df_local, top_n=10):
+    """Figuras de las pestañas de un municipio (``df_local`` con sus localidades)"""
+    return figuras_de_datos(datos_municipio(df_local, top_n), top_n)
+
+
+# Figuras y resumen de la vista de app.py (nombres cortos de columna), compartidos
+# con el snapshot de arranque y con el sitio estático
+def create_municipality_ranking(jerarquia):
+    """Crea un ranking de municipios por diferentes métricas"""
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    # Sumas e indicadores del catálogo por municipio
+    municipality_stats = jerarquia.tabla('municipio')[[
+        'municipio', 'pob_total', 'escolaridad_promedio', 'porcentaje_indigena', 'porcentaje_sin_salud'
+    ]].reset_index(drop=True).round(2)
+
+    fig = make_subplots(
+        rows=2, cols=2,
+        subplot_titles=('Población por Municipio', 'Escolaridad Promedio por Municipio',
+                      '% Población Indígena', '% Sin Servicios de Salud'),
+        specs=[[{"secondary_y": False}, {"secondary_y": False}],
+               [{"secondary_y": False}, {"secondary_y": False}]]
+    )
+
+    # Ordenar por población para los gráficos
+    municipality_stats_sorted = municipality_stats.sort_values('pob_total', ascending=True)
+
+    # Gráfico 1: Población por municipio
+    fig.add_trace(
+        go.Bar(y=municipality_stats_sorted['municipio'],
+               x=municipality_stats_sorted['pob_total'],
+               name='Población', marker_color='#3498db', orientation='h'),
+        row=1, col=1
+    )
+
+    # Gráfico 2: Escolaridad por municipio
+    municipality_education = municipality_stats.sort_values('escolaridad_promedio', ascending=True)
+    fig.add_trace(
+        go.Bar(y=municipality_education['municipio'],
+               x=municipality_education['escolaridad_promedio'],
+               name='Escolaridad', marker_color='#2ecc71', orientation='h'),
+        row=1, col=2
+    )
+
+    # Gráfico 3: % Población indígena
+    municipality_indigenous = municipality_stats.sort_values('porcentaje_indigena', ascending=True)
+    fig.add_trace(
+        go.Bar(y=municipality_indigenous['municipio'],
+               x=municipality_indigenous['porcentaje_indigena'],
+               name='% Indígena', marker_color='#e74c3c', orientation='h'),
+        row=2, col=1
+    )
+
+    # Gráfico 4: % Sin servicios de salud
+    municipality_health = municipality_stats.sort_values('porcentaje_sin_salud', ascending=True)
+    fig.add_trace(
+        go.Bar(y=municipality_health['municipio'],
+               x=municipality_health['porcentaje_sin_salud'],
+               name='% Sin Salud', marker_color='#f39c12', orientation='h'),
+        row=2, col=2
+    )
+
+    fig.update_layout(height=800, showlegend=False, template="plotly_white",
+                     title_text="Análisis Comparativo de Municipios en Nayarit")
+
+    return fig
+
+
+def municipality_summary(jerarquia):
+    """Tabla resumen por municipio (promedios ponderados por población)"""
+    municipality_summary = jerarquia.tabla('municipio').set_index('municipio')[[
+        'localidades', 'pob_total', 'escolaridad_promedio', 'porcentaje_indigena', 'porcentaje_sin_salud'
+    ]].round(2)
+    municipality_summary.columns = ['Localidades', 'Población', 'Escolaridad Prom.', '% Indígena Prom.', '% Sin Salud Prom.']
+    return municipality_summary.sort_values('Población', ascending=False)
+
+
+def create_locality_analysis(df, selected_municipality=None):
+    """Análisis de localidades dentro de un municipio"""
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    if selected_municipality and selected_municipality != "Todos los municipios":
+        df_filtered = df[df['municipio'] == selected_municipality]
+        title_suffix = f" - {selected_municipality}"
+    else:
+        # Mostrar las localidades más grandes del estado
+        df_filtered = df.nlargest(20, 'pob_total')
+        title_suffix = " - Top 20 Localidades"
+
+    fig = make_subplots(
+        rows=1, cols=2,
+        subplot_titles=(f'Población por Localidad{title_suffix}',
+                      f'Escolaridad vs Acceso a Salud{title_suffix}')
+    )
+
+    # Gráfico 1: Población por localidad
+    df_sorted = df_filtered.sort_values('pob_total', ascending=True).tail(15)  # Top 15
+
+    fig.add_trace(
+        go.Bar(y=df_sorted['localidad'],
+               x=df_sorted['pob_total'],
+               name='Población',
+               marker_color='#9b59b6',
+               orientation='h'),
+        row=1, col=1
+    )
+
+    # Gráfico 2: Scatter de escolaridad vs acceso a salud
+    fig.add_trace(
+        go.Scatter(x=df_filtered['escolaridad_promedio'],
+                  y=df_filtered['porcentaje_con_salud'],
+                  mode='markers',
+                  marker=dict(size=df_filtered['pob_total']/1000,
+                             color=df_filtered['porcentaje_indigena'],
+                             colorscale='Viridis',
+                             showscale=True,
+                             colorbar=dict(title="% Población<br>Indígena")),
+                  text=df_filtered['localidad'],
+                  name='Localidades',
+                  hovertemplate='Localidad: %{text}<br>' +
+                               'Escolaridad: %{x:.1f} años<br>' +
+                               'Con Salud: %{y:.1f}%<br>' +
+                               'Población: %{marker.size}k<extra></extra>'),
+        row=1, col=2
+    )
+
+    fig.update_layout(height=600, template="plotly_white", showlegend=False)
+    fig.update_xaxes(title_text="Población", row=1, col=1)
+    fig.update_yaxes(title_text="Localidad", row=1, col=1)
+    fig.update_xaxes(title_text="Escolaridad Promedio (años)", row=1, col=2)
+    fig.update_yaxes(title_text="% Población con Servicios de Salud", row=1, col=2)
+
+    return fig
+
+
+def create_demographic_pyramid(df, selected_municipality=None):
+    """Crea una pirámide demográfica para Nayarit o un municipio específico"""
+    import plotly.graph_objects as go
+
+    if selected_municipality and selected_municipality != "Todos los municipios":
+        df_filtered = df[df['municipio'] == selected_municipality]
+        title = f"Pirámide Poblacional - {selected_municipality}"
+    else:
+        df_filtered = df
+        title = "Pirámide Poblacional - Nayarit"
+
+    total_women = df_filtered['pob_femenina'].sum()
+    total_men = df_filtered['pob_masculina'].sum()
+
+    # Crear grupos de edad aproximados basados en distribución típica de México
+    age_groups = ['0-14', '15-29', '30-44', '45-59', '60-74', '75+']
+    age_distribution = [0.27, 0.26, 0.20, 0.15, 0.09, 0.03]
+
+    women_by_age = [total_women * dist for dist in age_distribution]
+    men_by_age = [-total_men * dist for dist in age_distribution]
+
+    fig = go.Figure()
+
+    fig.add_trace(go.Bar(
+        y=age_groups,
+        x=women_by_age,
+        name='Mujeres',
+        orientation='h',
+        marker_color='#FF69B4',
+        text=[f'{val:,.0f}' for val in women_by_age],
+        textposition='inside'
+    ))
+
+    fig.add_trace(go.Bar(
+        y=age_groups,
+        x=men_by_age,
+        name='Hombres',
+        orientation='h',
+        marker_color='#4169E1',
+        text=[f'{abs(val):,.0f}' for val in men_by_age],
+        textposition='inside'
+    ))
+
+    fig.update_layout(
+        title=title,
+        xaxis_title="Población",
+        yaxis_title="Grupos de Edad",
+        barmode='relative',
+        height=500,
+        template="plotly_white",
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+    )
+
+    return fig
+
+
+def create_housing_analysis(jerarquia):
+    """Análisis detallado de vivienda por municipio"""
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    # Sumas e indicadores del catálogo por municipio
+    housing_stats = jerarquia.tabla('municipio')[[
+        'municipio', 'total_viviendas', 'viviendas_habitadas', 'porcentaje_ocupacion_viviendas',
+        'personas_por_vivienda'
+    ]].reset_index(drop=True).round(2)
+    housing_stats['viviendas_desocupadas'] = housing_stats['total_viviendas'] - housing_stats['viviendas_habitadas']
+
+    fig = make_subplots(
+        rows=2, cols=2,
+        subplot_titles=('Total de Viviendas por Municipio',
+                      'Porcentaje de Ocupación',
+                      'Personas por Vivienda',
+                      'Viviendas Desocupadas'),
+        specs=[[{"secondary_y": False}, {"secondary_y": False}],
+               [{"secondary_y": False}, {"secondary_y": False}]]
+    )
+
+    # Ordenar por total de viviendas
+    housing_sorted = housing_stats.sort_values('total_viviendas', ascending=True)
+
+    # Gráfico 1: Total viviendas
+    fig.add_trace(
+        go.Bar(y=housing_sorted['municipio'],
+               x=housing_sorted['total_viviendas'],
+               name='Total Viviendas', marker_color='#3498db', orientation='h'),
+        row=1, col=1
+    )
+
+    # Gráfico 2: % Ocupación
+    occupancy_sorted = housing_stats.sort_values('porcentaje_ocupacion_viviendas', ascending=True)
+    fig.add_trace(
+        go.Bar(y=occupancy_sorted['municipio'],
+               x=occupancy_sorted['porcentaje_ocupacion_viviendas'],
+               name='% Ocupación', marker_color='#2ecc71', orientation='h'),
+        row=1, col=2
+    )
+
+    # Gráfico 3: Personas por vivienda
+    density_sorted = housing_stats.sort_values('personas_por_vivienda', ascending=True)
+    fig.add_trace(
+        go.Bar(y=density_sorted['municipio'],
+               x=density_sorted['personas_por_vivienda'],
+               name='Personas/Vivienda', marker_color='#f39c12', orientation='h'),
+        row=2, col=1
+    )
+
+    # Gráfico 4: Viviendas desocupadas
+    empty_sorted = housing_stats.sort_values('viviendas_desocupadas', ascending=True)
+    fig.add_trace(
+        go.Bar(y=empty_sorted['municipio'],
+               x=empty_sorted['viviendas_desocupadas'],
+               name='Viviendas Vacías', marker_color='#e74c3c', orientation='h'),
+        row=2, col=2
+    )
+
+    fig.update_layout(height=800, showlegend=False, template="plotly_white",
+                     title_text="Análisis de Vivienda por Municipio")
+
+    return fig
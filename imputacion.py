@@ -0,0 +1,409 @@
+"""Estimaciones y cotas de las celdas reservadas por confidencialidad (``*``).
+
+El INEGI reserva los desgloses de las localidades con una o dos viviendas:
+publica la población total y las viviendas, pero sexo, lengua indígena,
+discapacidad, escolaridad, PEA, afiliación y viviendas particulares llegan
+como ``*``. ``ESQUEMA_ITER.validar`` deja esas celdas en NaN y las marca en
+la columna ``suprimidas``; sumarlas como 0 subestima cualquier total que
+incluya localidades pequeñas.
+
+``imputar`` reemplaza las celdas marcadas por una estimación, en una pasada
+vectorizada por columna sobre todo el DataFrame:
+
+- Conteos: la tasa conocida medida/base del estrato (municipio y tamaño de
+  localidad) por la base de la localidad, p. ej. hablantes de lengua
+  indígena / población total. Si la base conocida del estrato es menor que
+  ``BASE_MINIMA`` se usa la del municipio, la del tamaño en la entidad o la
+  de todo el archivo, en ese orden.
+- Promedios (escolaridad): el promedio ponderado del mismo estrato.
+- Partes de un total: femenina + masculina = total; afiliada + sin
+  afiliación <= total. Las estimaciones se reescalan para cumplirlo.
+- Subtotales publicados: las filas 9998 y 9999 del ITER traen las cifras
+  exactas de las localidades de una y de dos viviendas habitadas de cada
+  municipio (``margenes``). Donde existen, las celdas reservadas de esas
+  localidades se ajustan por pasadas alternas (con las partes de un total)
+  para sumar el subtotal menos lo publicado; las tasas del estrato solo
+  quedan donde el municipio no tiene subtotal.
+
+Toda estimación queda dentro de ``cotas`` (de 0 a la base menos lo conocido,
+o el rango conocido del municipio para los promedios; con subtotal, además,
+lo que falta repartir). La máscara se conserva junto a los datos, así que
+``sin_imputar`` recupera lo publicado y los agregados informan qué parte de
+cada cifra es estimada. Las celdas ajustadas a un subtotal se marcan en
+``ajustadas``: son estimaciones en la localidad, pero su suma por municipio
+es la cifra publicada.
+"""
+import numpy as np
+import pandas as pd
+
+from esquema import COLUMNA_SUPRESION, ESQUEMA_ITER
+
+# Columnas con bit en la máscara, en el orden de los bits
+COLUMNAS_SUPRIMIBLES = ESQUEMA_ITER.suprimibles
+
+# Conteos: base que los acota y contra la que se calcula su tasa
+BASES = {
+    'pob_femenina': 'pob_total',
+    'pob_masculina': 'pob_total',
+    'pob_indigena': 'pob_total',
+    'pob_discapacidad': 'pob_total',
+    'pob_economicamente_activa': 'pob_total',
+    'pob_sin_salud': 'pob_total',
+    'pob_con_salud': 'pob_total',
+    'viviendas_habitadas': 'total_viviendas',
+    'viviendas_particulares': 'total_viviendas',
+}
+
+# Promedios: columna de peso
+PROMEDIOS = {
+    'escolaridad_promedio': 'pob_total',
+}
+
+# (partes, total, exacta): con exacta=True las partes suman el total; si no, no lo exceden
+PARTES = [
+    (('pob_femenina', 'pob_masculina'), 'pob_total', True),
+    (('pob_sin_salud', 'pob_con_salud'), 'pob_total', False),
+]
+
+# Tamaños de localidad (población) que forman los estratos junto con el municipio
+BORDES_ESTRATO = (0, 10, 50, 250, 1000, 2500)
+
+# Base conocida mínima para usar la tasa de un estrato
+BASE_MINIMA = 100
+
+# Claves de localidad de los subtotales del ITER: viviendas habitadas de las localidades que suman
+SUBTOTALES = {9998: 1, 9999: 2}
+
+# Mapa de bits de las celdas estimadas cuya suma por municipio es un subtotal publicado
+COLUMNA_AJUSTE = 'ajustadas'
+
+# Pasadas alternas del ajuste a partes de un total y a subtotales
+ITERACIONES_AJUSTE = 50
+
+# Diferencia máxima con el subtotal para marcar sus celdas como ajustadas
+TOLERANCIA_AJUSTE = 0.01
+
+
+def mascaras(df, columnas=COLUMNAS_SUPRIMIBLES, bits=COLUMNA_SUPRESION):
+    """Matriz booleana (filas x ``columnas``) de celdas reservadas (o ajustadas, con ``bits=COLUMNA_AJUSTE``)"""
+    if bits not in df.columns:
+        return np.zeros((len(df), len(columnas)), dtype=bool)
+    bits = df[bits].to_numpy(dtype=np.int64)
+    posiciones = np.array([COLUMNAS_SUPRIMIBLES.index(col) for col in columnas], dtype=np.int64)
+    return (bits[:, None] >> posiciones) & 1 == 1
+
+
+def mascara(df, columna):
+    """Filas cuyo valor de ``columna`` está reservado (o estimado)"""
+    if columna not in COLUMNAS_SUPRIMIBLES:
+        return np.zeros(len(df), dtype=bool)
+    return mascaras(df, [columna])[:, 0]
+
+
+def ajustada(df, columna):
+    """Filas cuyo valor estimado de ``columna`` se ajustó a un subtotal publicado"""
+    if columna not in COLUMNAS_SUPRIMIBLES:
+        return np.zeros(len(df), dtype=bool)
+    return mascaras(df, [columna], COLUMNA_AJUSTE)[:, 0]
+
+
+def estimada(df, columna, agregada=False):
+    """Filas cuyo valor de ``columna`` es una estimación; con ``agregada=True`` (sumas de
+    municipio o mayores) sin las celdas ajustadas, cuya suma es exacta"""
+    marcas = mascara(df, columna)
+    return marcas & ~ajustada(df, columna) if agregada else marcas
+
+
+def sin_imputar(df):
+    """Copia con las celdas reservadas de nuevo en NaN (los valores publicados)"""
+    df = df.copy()
+    marcas = mascaras(df)
+    for j, columna in enumerate(COLUMNAS_SUPRIMIBLES):
+        if marcas[:, j].any() and columna in df.columns:
+            df[columna] = df[columna].mask(marcas[:, j])
+    if COLUMNA_AJUSTE in df.columns:
+        df[COLUMNA_AJUSTE] = 0
+    return df
+
+
+def margenes(df):
+    """Subtotales publicados (filas 9998 y 9999) por entidad, municipio y viviendas habitadas.
+
+    ``df`` es el DataFrame validado completo, antes de quitar las filas de resumen.
+    """
+    filas = sin_imputar(df[df['cve_localidad'].isin(list(SUBTOTALES))])
+    filas = filas.assign(viviendas=filas['cve_localidad'].map(SUBTOTALES).astype(float))
+    claves = ['cve_entidad', 'cve_municipio', 'viviendas']
+    filas = filas.drop_duplicates(claves).sort_values(claves)
+    return pd.DataFrame({col: filas[col].to_numpy(dtype=float) for col in claves + COLUMNAS_SUPRIMIBLES})
+
+
+def _grupos(df):
+    """Códigos de grupo de cada nivel de respaldo, del estrato más fino al archivo completo"""
+    claves = pd.DataFrame({
+        'entidad': df['cve_entidad'].to_numpy(),
+        'municipio': df['cve_municipio'].to_numpy(),
+        'tamano': np.searchsorted(BORDES_ESTRATO, df['pob_total'].to_numpy(dtype=float), side='right'),
+    })
+    niveles = [['entidad', 'municipio', 'tamano'], ['entidad', 'municipio'], ['entidad', 'tamano']]
+    return ([claves.groupby(nivel, dropna=False, sort=False).ngroup().to_numpy() for nivel in niveles]
+            + [np.zeros(len(df), dtype=np.int64)])
+
+
+def _tasas(numerador, denominador, conocidas, grupos):
+    """Σ numerador / Σ denominador de las filas conocidas, del primer nivel con base suficiente"""
+    tasa = np.full(len(numerador), np.nan)
+    numerador = np.where(conocidas, numerador, 0)
+    denominador = np.where(conocidas, denominador, 0)
+    for nivel, codigos in enumerate(grupos):
+        grupos_nivel = int(codigos.max()) + 1 if len(codigos) else 0
+        suma_num = np.bincount(codigos, weights=numerador, minlength=grupos_nivel)
+        suma_den = np.bincount(codigos, weights=denominador, minlength=grupos_nivel)
+        minimo = BASE_MINIMA if nivel < len(grupos) - 1 else np.finfo(float).tiny
+        pendientes = np.isnan(tasa) & (suma_den[codigos] >= minimo)
+        tasa[pendientes] = suma_num[codigos[pendientes]] / suma_den[codigos[pendientes]]
+    return tasa
+
+
+def _cubrimiento(df, margenes, marcas):
+    """Subtotal que cubre cada localidad (-1 si ninguno) y lo que falta repartir de cada
+    columna entre las celdas reservadas que cubre (subtotales x columnas; NaN sin subtotal).
+
+    Un subtotal solo cubre sus localidades si la suma de su población es la publicada.
+    """
+    codigos = np.full(len(df), -1)
+    if margenes is None or not len(margenes) or 'viviendas_habitadas' not in df.columns:
+        return codigos, np.full((0, len(COLUMNAS_SUPRIMIBLES)), np.nan)
+    claves = ['cve_entidad', 'cve_municipio', 'viviendas']
+    indice = pd.MultiIndex.from_frame(margenes[claves].astype(float))
+    filas = pd.MultiIndex.from_arrays([df[col].to_numpy(dtype=float) for col in
+                                       ['cve_entidad', 'cve_municipio', 'viviendas_habitadas']])
+    codigos = indice.get_indexer(filas)
+    cubiertas = codigos >= 0
+    n = len(margenes)
+    suma = lambda pesos, filas: np.bincount(codigos[filas], weights=np.nan_to_num(pesos[filas]), minlength=n)
+
+    poblacion = suma(df['pob_total'].to_numpy(dtype=float), cubiertas)
+    completos = np.isclose(poblacion, margenes['pob_total'].to_numpy(dtype=float))
+    codigos = np.where(cubiertas & completos[np.maximum(codigos, 0)], codigos, -1)
+    cubiertas = codigos >= 0
+
+    valores = df[COLUMNAS_SUPRIMIBLES].to_numpy(dtype=float)
+    publicados = margenes[COLUMNAS_SUPRIMIBLES].to_numpy(dtype=float)
+    pendientes = np.full(publicados.shape, np.nan)
+    for j, columna in enumerate(COLUMNAS_SUPRIMIBLES):
+        conocidas = cubiertas & ~marcas[:, j]
+        if columna in BASES:
+            pendientes[:, j] = np.maximum(publicados[:, j] - suma(valores[:, j], conocidas), 0)
+        elif columna in PROMEDIOS:
+            # Σ peso·valor que falta: el promedio publicado por el peso del subtotal
+            peso = df[PROMEDIOS[columna]].to_numpy(dtype=float)
+            pendientes[:, j] = publicados[:, j] * suma(peso, cubiertas) - suma(valores[:, j] * peso, conocidas)
+    pendientes[~completos] = np.nan
+    return codigos, pendientes
+
+
+def _ajustables(marcas, codigos, pendientes):
+    """Celdas reservadas cubiertas por un subtotal publicado de su columna"""
+    cubiertas = codigos >= 0
+    con_subtotal = np.zeros(marcas.shape, dtype=bool)
+    if cubiertas.any():
+        con_subtotal[cubiertas] = ~np.isnan(pendientes[codigos[cubiertas]])
+    estimables = np.array([col in BASES or col in PROMEDIOS for col in COLUMNAS_SUPRIMIBLES])
+    return marcas & con_subtotal & estimables
+
+
+def _media_pendiente(df, columna, ajustables, codigos, pendientes):
+    """Promedio que deja el subtotal para las celdas ajustables de ``columna``"""
+    j = COLUMNAS_SUPRIMIBLES.index(columna)
+    filas = ajustables[:, j]
+    peso = df[PROMEDIOS[columna]].to_numpy(dtype=float)
+    peso_reservado = np.bincount(codigos[filas], weights=np.nan_to_num(peso[filas]), minlength=len(pendientes))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return pendientes[codigos[filas], j] / peso_reservado[codigos[filas]]
+
+
+def cotas(df, marcas=None, grupos=None, margenes=None):
+    """Cotas inferior y superior de cada celda (iguales al valor donde no está reservada).
+
+    Con ``margenes`` (ver ``margenes``) las celdas cubiertas por un subtotal
+    no exceden lo que falta repartir ni bajan de lo que las demás no alcanzan.
+    """
+    marcas = mascaras(df) if marcas is None else marcas
+    grupos = _grupos(df) if grupos is None else grupos
+    valores = df[COLUMNAS_SUPRIMIBLES].to_numpy(dtype=float)
+    inferior = np.where(marcas, 0.0, valores)
+    superior = np.where(marcas, np.inf, valores)
+
+    for j, columna in enumerate(COLUMNAS_SUPRIMIBLES):
+        if not marcas[:, j].any():
+            continue
+        if columna in BASES:
+            base = df[BASES[columna]].to_numpy(dtype=float)
+            superior[:, j] = np.where(marcas[:, j], np.where(np.isnan(base), np.inf, base), superior[:, j])
+        elif columna in PROMEDIOS:
+            # Rango conocido del municipio (del archivo si el municipio no tiene ninguno)
+            conocidos = pd.Series(np.where(marcas[:, j], np.nan, valores[:, j]))
+            por_municipio = conocidos.groupby(grupos[1])
+            minimo = por_municipio.transform('min').fillna(conocidos.min()).to_numpy()
+            maximo = por_municipio.transform('max').fillna(conocidos.max()).to_numpy()
+            inferior[:, j] = np.where(marcas[:, j], minimo, inferior[:, j])
+            superior[:, j] = np.where(marcas[:, j], maximo, superior[:, j])
+
+    for partes, total, exacta in PARTES:
+        indices = [COLUMNAS_SUPRIMIBLES.index(parte) for parte in partes]
+        resto = _resto(df[total].to_numpy(dtype=float), valores[:, indices], marcas[:, indices])
+        for j in indices:
+            superior[:, j] = np.where(marcas[:, j], np.fmin(superior[:, j], resto), superior[:, j])
+            if exacta:
+                # Única parte reservada: el total menos las demás la determina
+                unica = marcas[:, j] & (marcas[:, indices].sum(axis=1) == 1)
+                inferior[:, j] = np.where(unica & ~np.isnan(resto), resto, inferior[:, j])
+
+    codigos, pendientes = _cubrimiento(df, margenes, marcas)
+    ajustables = _ajustables(marcas, codigos, pendientes)
+    for j, columna in enumerate(COLUMNAS_SUPRIMIBLES):
+        filas = ajustables[:, j]
+        if not filas.any():
+            continue
+        if columna in BASES:
+            # Lo que falta repartir acota cada celda; lo que las demás no alcanzan es su mínimo
+            pendiente = pendientes[codigos[filas], j]
+            superior[filas, j] = np.fmin(superior[filas, j], pendiente)
+            holgura = np.bincount(codigos[filas], weights=superior[filas, j], minlength=len(pendientes))
+            otras = holgura[codigos[filas]] - superior[filas, j]
+            inferior[filas, j] = np.fmax(inferior[filas, j], np.fmin(pendiente - otras, superior[filas, j]))
+        else:
+            # El rango del promedio incluye el que deja el subtotal
+            media = _media_pendiente(df, columna, ajustables, codigos, pendientes)
+            inferior[filas, j] = np.fmin(inferior[filas, j], media)
+            superior[filas, j] = np.fmax(superior[filas, j], media)
+
+    columnas = df[COLUMNAS_SUPRIMIBLES].columns
+    return (pd.DataFrame(inferior, index=df.index, columns=columnas),
+            pd.DataFrame(superior, index=df.index, columns=columnas))
+
+
+def _resto(total, partes, marcas):
+    """Total menos las partes publicadas (sin bajar de 0)"""
+    return np.maximum(total - np.where(marcas, 0, np.nan_to_num(partes)).sum(axis=1), 0)
+
+
+def _repartir_partes(df, valores, estimados, marcas):
+    """Reescala las partes reservadas para que cumplan ``PARTES``"""
+    for partes, total, exacta in PARTES:
+        indices = [COLUMNAS_SUPRIMIBLES.index(parte) for parte in partes]
+        bloque, marcadas = estimados[:, indices], marcas[:, indices]
+        resto = _resto(df[total].to_numpy(dtype=float), valores[:, indices], marcadas)
+        suma = np.where(marcadas, np.nan_to_num(bloque), 0).sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            factor = (resto / suma)[:, None]
+            if exacta:
+                # Sin tasas útiles el resto se reparte por igual entre las partes reservadas
+                reparto = resto / np.maximum(marcadas.sum(axis=1), 1)
+                ajustado = np.where((suma > 0)[:, None], bloque * factor, reparto[:, None])
+            else:
+                ajustado = np.where((suma > resto)[:, None], bloque * factor, bloque)
+        estimados[:, indices] = np.where(marcadas & ~np.isnan(resto)[:, None], ajustado, bloque)
+    return estimados
+
+
+def _repartir_subtotales(df, estimados, ajustables, codigos, pendientes):
+    """Reescala los conteos ajustables para que cada subtotal sume lo que falta repartir
+    (en proporción a la base donde ninguna estimación es positiva)"""
+    for j, columna in enumerate(COLUMNAS_SUPRIMIBLES):
+        filas = ajustables[:, j]
+        if not filas.any() or columna not in BASES:
+            continue
+        grupo = codigos[filas]
+        actuales = np.nan_to_num(estimados[filas, j])
+        base = np.nan_to_num(df[BASES[columna]].to_numpy(dtype=float)[filas])
+        suma = np.bincount(grupo, weights=actuales, minlength=len(pendientes))[grupo]
+        suma_base = np.bincount(grupo, weights=base, minlength=len(pendientes))[grupo]
+        pendiente = pendientes[grupo, j]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            estimados[filas, j] = np.where(suma > 0, actuales * pendiente / suma,
+                                           np.where(suma_base > 0, pendiente * base / suma_base, 0.0))
+    return estimados
+
+
+def imputar(df, margenes=None):
+    """Copia de ``df`` (validado, nombres cortos) con las celdas reservadas estimadas.
+
+    ``margenes`` son los subtotales publicados del mismo archivo (ver
+    ``margenes``); sin ellos todas las celdas usan las tasas del estrato.
+    """
+    df = sin_imputar(df)
+    df[COLUMNA_AJUSTE] = 0
+    marcas = mascaras(df)
+    if not marcas.any():
+        return df
+    grupos = _grupos(df)
+    inferior, superior = cotas(df, marcas, grupos, margenes)
+    inferior, superior = inferior.to_numpy(), superior.to_numpy()
+    valores = df[COLUMNAS_SUPRIMIBLES].to_numpy(dtype=float)
+    estimados = valores.copy()
+
+    for j, columna in enumerate(COLUMNAS_SUPRIMIBLES):
+        marcadas = marcas[:, j]
+        if not marcadas.any():
+            continue
+        if columna in BASES:
+            base = df[BASES[columna]].to_numpy(dtype=float)
+            conocidas = ~marcadas & ~np.isnan(valores[:, j]) & ~np.isnan(base)
+            estimacion = _tasas(valores[:, j], base, conocidas, grupos) * base
+        elif columna in PROMEDIOS:
+            peso = df[PROMEDIOS[columna]].to_numpy(dtype=float)
+            conocidas = ~marcadas & ~np.isnan(valores[:, j]) & ~np.isnan(peso)
+            estimacion = _tasas(valores[:, j] * peso, peso, conocidas, grupos)
+        else:
+            continue
+        estimados[:, j] = np.where(marcadas, estimacion, valores[:, j])
+
+    # Con subtotal, el promedio de sus celdas reservadas es el que deja el publicado
+    codigos, pendientes = _cubrimiento(df, margenes, marcas)
+    ajustables = _ajustables(marcas, codigos, pendientes)
+    for columna in PROMEDIOS:
+        j = COLUMNAS_SUPRIMIBLES.index(columna)
+        if ajustables[:, j].any():
+            estimados[ajustables[:, j], j] = _media_pendiente(df, columna, ajustables, codigos, pendientes)
+
+    # Pasadas alternas: subtotales por columna, partes de cada fila y cotas
+    for _ in range(ITERACIONES_AJUSTE if ajustables.any() else 1):
+        estimados = _repartir_subtotales(df, estimados, ajustables, codigos, pendientes)
+        estimados = _repartir_partes(df, valores, estimados, marcas)
+        estimados = np.clip(estimados, inferior, superior)
+
+    # Solo se marcan ajustadas las celdas de los subtotales que sí se alcanzaron
+    ajustadas = np.zeros(marcas.shape, dtype=bool)
+    for j in range(len(COLUMNAS_SUPRIMIBLES)):
+        filas = ajustables[:, j]
+        if not filas.any():
+            continue
+        columna = COLUMNAS_SUPRIMIBLES[j]
+        aporte = estimados[filas, j] * (df[PROMEDIOS[columna]].to_numpy(dtype=float)[filas]
+                                        if columna in PROMEDIOS else 1)
+        suma = np.bincount(codigos[filas], weights=np.nan_to_num(aporte), minlength=len(pendientes))
+        alcanzados = np.abs(suma - np.nan_to_num(pendientes[:, j])) <= TOLERANCIA_AJUSTE
+        ajustadas[filas, j] = alcanzados[codigos[filas]]
+
+    for j, columna in enumerate(COLUMNAS_SUPRIMIBLES):
+        if marcas[:, j].any():
+            df[columna] = np.where(marcas[:, j], estimados[:, j], valores[:, j])
+    df[COLUMNA_AJUSTE] = ajustadas.astype(np.int32) @ (np.int32(1) << np.arange(marcas.shape[1], dtype=np.int32))
+    return df
+
+
+def resumen(df):
+    """Celdas reservadas y ajustadas a un subtotal por columna y parte estimada de cada total
+    (en %; las ajustadas suman exacto y no cuentan)"""
+    marcas = mascaras(df)
+    ajustadas = mascaras(df, bits=COLUMNA_AJUSTE)
+    valores = df[COLUMNAS_SUPRIMIBLES].to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        estimado = np.nansum(np.where(marcas & ~ajustadas, valores, 0), axis=0) / np.nansum(valores, axis=0) * 100
+    return pd.DataFrame({
+        'reservadas': marcas.sum(axis=0),
+        'ajustadas': ajustadas.sum(axis=0),
+        'porcentaje_estimado': np.where([col in BASES for col in COLUMNAS_SUPRIMIBLES], estimado, np.nan),
+    }, index=COLUMNAS_SUPRIMIBLES)
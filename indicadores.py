@@ -0,0 +1,153 @@
+"""Catálogo declarativo de indicadores y su evaluación vectorizada por nivel.
+
+Cada indicador es un cociente (numerador / denominador × escala) o un
+promedio de una columna ponderado por otra. ``PlanIndicadores`` compila una
+lista de indicadores a términos aditivos sin repetir: Σ pob_total se calcula
+una vez aunque la usen seis indicadores, y un promedio se vuelve Σ peso·valor
+y Σ peso. Los términos se suman una vez por grupo (municipio, selección,
+nivel de ``Jerarquia``) y todos los indicadores salen de una sola división
+de matrices; por localidad el mismo plan se evalúa fila por fila.
+
+Agregar un indicador es agregar una fila a ``CATALOGO``: las métricas
+derivadas de cada localidad, los agregados y las etiquetas de los
+selectores lo toman de aquí.
+"""
+import numpy as np
+import pandas as pd
+
+from imputacion import estimada
+
+# (nombre, etiqueta, tipo, numerador, denominador, escala, formato)
+# tipo 'cociente': Σ numerador / Σ denominador × escala
+# tipo 'promedio': promedio del numerador ponderado por el denominador
+CATALOGO = [
+    ('escolaridad_promedio', 'Escolaridad Promedio', 'promedio', 'escolaridad_promedio', 'pob_total', 1, '{:.1f}'),
+    ('porcentaje_mujeres', '% Mujeres', 'cociente', 'pob_femenina', 'pob_total', 100, '{:.1f}%'),
+    ('porcentaje_hombres', '% Hombres', 'cociente', 'pob_masculina', 'pob_total', 100, '{:.1f}%'),
+    ('porcentaje_indigena', '% Población Indígena', 'cociente', 'pob_indigena', 'pob_total', 100, '{:.1f}%'),
+    ('porcentaje_discapacidad', '% Población con Discapacidad', 'cociente', 'pob_discapacidad', 'pob_total', 100,
+     '{:.1f}%'),
+    ('porcentaje_pea', '% Económicamente Activa', 'cociente', 'pob_economicamente_activa', 'pob_total', 100,
+     '{:.1f}%'),
+    ('porcentaje_sin_salud', '% Sin Servicios de Salud', 'cociente', 'pob_sin_salud', 'pob_total', 100, '{:.1f}%'),
+    ('porcentaje_con_salud', '% Con Servicios de Salud', 'cociente', 'pob_con_salud', 'pob_total', 100, '{:.1f}%'),
+    ('porcentaje_ocupacion_viviendas', '% Ocupación de Viviendas', 'cociente', 'viviendas_habitadas',
+     'total_viviendas', 100, '{:.1f}%'),
+    ('personas_por_vivienda', 'Personas por Vivienda', 'cociente', 'pob_total', 'viviendas_habitadas', 1, '{:.1f}'),
+]
+
+INDICADORES = [nombre for nombre, *_ in CATALOGO]
+ETIQUETAS = {nombre: etiqueta for nombre, etiqueta, *_ in CATALOGO}
+FORMATOS = {nombre: formato for nombre, *_, formato in CATALOGO}
+
+# Cocientes: se guardan como columnas derivadas de cada localidad
+DERIVADAS = [nombre for nombre, _, tipo, *_ in CATALOGO if tipo == 'cociente']
+
+_DEFINICIONES = {nombre: (tipo, numerador, denominador, escala)
+                 for nombre, _, tipo, numerador, denominador, escala, _ in CATALOGO}
+
+
+def fuentes(nombre):
+    """Columnas de las que depende un indicador (la misma columna si no es indicador)"""
+    if nombre not in _DEFINICIONES:
+        return [nombre]
+    _, numerador, denominador, _ = _DEFINICIONES[nombre]
+    return [numerador, denominador]
+
+
+def formatear(nombre, valor):
+    """Valor con el formato del catálogo ("N/D" si falta)"""
+    if valor is None or pd.isna(valor):
+        return "N/D"
+    return FORMATOS.get(nombre, '{:,.2f}').format(valor)
+
+
+class PlanIndicadores:
+    """Indicadores compilados a términos aditivos compartidos.
+
+    ``sumas`` agrega medidas que se quieren sumadas aunque ningún indicador
+    las use. ``columnas`` traduce nombres cortos a los del DataFrame (p. ej.
+    ``ESQUEMA_ITER.a_original``); los términos siempre usan nombres cortos.
+    """
+
+    def __init__(self, indicadores=INDICADORES, sumas=(), columnas=None):
+        self.indicadores = list(indicadores)
+        self.columnas = columnas or {}
+        self._origen = {}
+        for medida in sumas:
+            self._termino(medida, ('suma', medida, None))
+        numeradores, denominadores, escalas, cocientes = [], [], [], []
+        for nombre in self.indicadores:
+            tipo, numerador, denominador, escala = _DEFINICIONES[nombre]
+            if tipo == 'cociente':
+                numeradores.append(self._termino(numerador, ('suma', numerador, None)))
+                denominadores.append(self._termino(denominador, ('suma', denominador, None)))
+            else:
+                numeradores.append(self._termino(f"{numerador}_wv", ('producto', numerador, denominador)))
+                denominadores.append(self._termino(f"{numerador}_w", ('peso', numerador, denominador)))
+            escalas.append(escala)
+            cocientes.append(tipo == 'cociente')
+        self.terminos = list(self._origen)
+        self.numeradores = [self.terminos[i] for i in numeradores]
+        self._numeradores = np.array(numeradores, dtype=np.intp)
+        self._denominadores = np.array(denominadores, dtype=np.intp)
+        self._escalas = np.array(escalas, dtype=float)
+        self._cocientes = np.array(cocientes, dtype=bool)
+
+    def _termino(self, nombre, definicion):
+        self._origen.setdefault(nombre, definicion)
+        return list(self._origen).index(nombre)
+
+    def _columna(self, df, corto):
+        return df[self.columnas.get(corto, corto)].to_numpy(dtype=float)
+
+    def terminos_de(self, df):
+        """Matriz (filas x términos) con cada columna fuente leída una sola vez"""
+        leidas = {}
+        leer = lambda corto: leidas.setdefault(corto, self._columna(df, corto))
+        matriz = np.empty((len(df), len(self.terminos)))
+        for j, (tipo, columna, peso) in enumerate(self._origen.values()):
+            if tipo == 'suma':
+                matriz[:, j] = leer(columna)
+                continue
+            valores, pesos = leer(columna), leer(peso)
+            validos = ~(np.isnan(valores) | np.isnan(pesos))
+            matriz[:, j] = np.where(validos, valores * pesos if tipo == 'producto' else pesos, 0)
+        return matriz
+
+    def imputados_de(self, df, matriz=None, agregada=False):
+        """Parte de cada término que proviene de celdas estimadas (ver ``imputacion.py``;
+        ``agregada=True`` para sumas de municipio o mayores)"""
+        matriz = self.terminos_de(df) if matriz is None else matriz
+        marcas = np.column_stack([
+            estimada(df, columna, agregada) | (estimada(df, peso, agregada) if peso else False)
+            for _, columna, peso in self._origen.values()
+        ]) if self.terminos else np.zeros(matriz.shape, dtype=bool)
+        return np.where(marcas, matriz, 0)
+
+    def evaluar(self, sumas, sin_base=np.nan):
+        """Indicadores (grupos x indicadores) a partir de términos sumados.
+
+        Donde el denominador no es positivo el cociente vale ``sin_base``; un
+        promedio sin peso siempre es NaN.
+        """
+        sumas = np.atleast_2d(np.asarray(sumas, dtype=float))
+        numerador = sumas[:, self._numeradores]
+        denominador = sumas[:, self._denominadores]
+        con_base = denominador > 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            valores = numerador / np.where(con_base, denominador, 1) * self._escalas
+        return np.where(con_base, valores, np.where(self._cocientes, sin_base, np.nan))
+
+    def por_fila(self, df, sin_base=np.nan):
+        """Indicadores de cada fila de ``df``"""
+        return pd.DataFrame(self.evaluar(self.terminos_de(df), sin_base), index=df.index, columns=self.indicadores)
+
+    def agregar(self, df, grupo, sin_base=np.nan):
+        """Términos sumados e indicadores por ``grupo`` (columna o lista de columnas)"""
+        grupo = [grupo] if isinstance(grupo, str) else list(grupo)
+        terminos = pd.DataFrame(self.terminos_de(df), index=df.index, columns=self.terminos)
+        sumas = terminos.groupby([df[col] for col in grupo], sort=False).sum()
+        indicadores = pd.DataFrame(self.evaluar(sumas.to_numpy(), sin_base), index=sumas.index,
+                                   columns=self.indicadores)
+        return pd.concat([sumas, indicadores], axis=1)
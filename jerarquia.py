@@ -0,0 +1,198 @@
+"""Agregados jerárquicos por clave INEGI: localidad → municipio → entidad → nacional.
+
+Las medidas aditivas se suman una sola vez por nivel, cada nivel a partir del
+anterior, y quedan en un arreglo por nivel con un diccionario de clave a fila.
+Tarjetas, porcentajes del estado y totales del sidebar son búsquedas en esos
+arreglos en lugar de sumas sobre el DataFrame completo.
+
+Lo que se suma son los términos del plan de indicadores (``indicadores.py``),
+así que cada fila trae también todos los indicadores del catálogo, y junto a
+cada término su parte estimada (celdas reservadas, ver ``imputacion.py``):
+``porcentaje_imputado_<col>`` dice qué tanto de la cifra es estimación.
+Desde el municipio no cuentan las celdas ajustadas a un subtotal publicado,
+cuya suma es exacta.
+"""
+import numpy as np
+import pandas as pd
+
+from datos import CLAVES, MEDIDAS
+from esquema import ESQUEMA_ITER
+from indicadores import INDICADORES, PlanIndicadores
+
+NIVELES = ['localidad', 'municipio', 'entidad', 'nacional']
+
+# Columnas de la clave de cada nivel
+CLAVES_NIVEL = {
+    'localidad': CLAVES,
+    'municipio': CLAVES[:2],
+    'entidad': CLAVES[:1],
+    'nacional': [],
+}
+
+# Número de unidades del nivel inferior contenidas en cada fila
+CONTEOS = ['localidades', 'municipios', 'entidades']
+
+
+class Jerarquia:
+    """Sumas de las medidas aditivas y de los términos de los indicadores en cada nivel.
+
+    Los promedios se guardan como Σ peso·valor y Σ peso, que también son
+    aditivos, así que cualquier indicador de cualquier unidad es una
+    división. Con ``originales=True`` el DataFrame usa los nombres de
+    columna del INEGI.
+
+    ``<término>_imputado`` suma la parte estimada de cada término; ``tabla`` y
+    ``fila`` la devuelven como ``porcentaje_imputado_<col>`` para las medidas
+    y para los indicadores (la parte estimada de su numerador).
+    """
+
+    def __init__(self, df, indicadores=INDICADORES, originales=False):
+        c = self._compilar(indicadores, originales)
+        terminos = self.plan.terminos
+
+        base = pd.DataFrame({col: df[c[col]] for col in CLAVES + ['municipio', 'localidad']})
+        matriz = self.plan.terminos_de(df)
+        base[terminos] = matriz
+        base['localidades'] = 1
+        imputados = [f"{col}_imputado" for col in terminos]
+        agregados = [f"{col}_imputado_agregado" for col in terminos]
+        base[imputados] = self.plan.imputados_de(df, matriz)
+        base[agregados] = self.plan.imputados_de(df, matriz, agregada=True)
+
+        # Cada nivel se suma a partir del anterior (filas repetidas de una clave se suman)
+        sumas = [col for col in self.columnas if col not in ('municipios', 'entidades')]
+        localidades = base.groupby(CLAVES, dropna=False).agg(
+            municipio=('municipio', 'first'), localidad=('localidad', 'first'),
+            **{col: (col, 'sum') for col in sumas + agregados}
+        )
+        localidades['municipios'] = 0
+        localidades['entidades'] = 0
+        municipios = localidades.groupby(level=[0, 1], dropna=False).agg(
+            municipio=('municipio', 'first'),
+            **{col: (col, 'sum') for col in sumas if col not in imputados},
+            **{col: (agregado, 'sum') for col, agregado in zip(imputados, agregados)}
+        )
+        localidades = localidades.drop(columns=agregados)
+        municipios['municipios'] = 1
+        municipios['entidades'] = 0
+        entidades = municipios[self.columnas].groupby(level=0, dropna=False).sum()
+        entidades['entidades'] = 1
+        nacional = entidades.sum().to_frame().T
+
+        tablas = {'localidad': localidades, 'municipio': municipios, 'entidad': entidades, 'nacional': nacional}
+        self._indexar({nivel: tabla.drop(columns=self.columnas) for nivel, tabla in tablas.items()},
+                      {nivel: tabla[self.columnas].to_numpy(dtype=float) for nivel, tabla in tablas.items()})
+
+    @classmethod
+    def desde_partes(cls, partes, columnas, indicadores=INDICADORES, originales=False):
+        """Jerarquía a partir de ``partes()`` (p. ej. leídas de compartido.py) sin volver a sumar.
+
+        Las matrices se usan tal cual, sin copiarlas. Devuelve None si
+        ``columnas`` no son las del plan actual (cambió el catálogo).
+        """
+        jerarquia = cls.__new__(cls)
+        jerarquia._compilar(indicadores, originales)
+        if list(columnas) != jerarquia.columnas:
+            return None
+        nombres = {}
+        for nivel, (tabla, _) in partes.items():
+            claves = CLAVES_NIVEL[nivel]
+            nombres[nivel] = tabla.set_index(claves) if claves else tabla
+        jerarquia._indexar(nombres, {nivel: valores for nivel, (_, valores) in partes.items()})
+        return jerarquia
+
+    def partes(self):
+        """Por nivel: claves y nombres (DataFrame) y la matriz de ``columnas``, para ``desde_partes``"""
+        return {nivel: (nombres.reset_index(drop=nivel == 'nacional'), self._valores[nivel])
+                for nivel, nombres in self._nombres.items()}
+
+    def _compilar(self, indicadores, originales):
+        """Plan de indicadores y columnas sumadas; devuelve el mapeo de nombres de columna"""
+        c = ESQUEMA_ITER.a_original if originales else {corto: corto for corto in ESQUEMA_ITER.a_original}
+        self.plan = PlanIndicadores(indicadores, sumas=MEDIDAS, columnas=c)
+        self.indicadores = self.plan.indicadores
+        terminos = self.plan.terminos
+        self.columnas = terminos + CONTEOS + [f"{col}_imputado" for col in terminos]
+
+        # Parte estimada de las medidas y del numerador de cada indicador
+        self.estimados = [f"porcentaje_imputado_{col}" for col in MEDIDAS + self.indicadores]
+        self._estimables = [terminos.index(col) for col in MEDIDAS + self.plan.numeradores]
+        return c
+
+    def _indexar(self, nombres, valores):
+        """Posición de cada clave y de cada nombre en las matrices de los niveles.
+
+        ``nombres`` tiene por nivel las claves (índice) y los nombres de cada
+        fila; ``valores``, la matriz de ``columnas`` en el mismo orden.
+        """
+        self._nombres = nombres
+        self._valores = valores
+        self._posiciones = {nivel: {self._clave(clave): i for i, clave in enumerate(tabla.index)}
+                            for nivel, tabla in nombres.items() if nivel != 'nacional'}
+        self._posiciones['nacional'] = {(): 0}
+
+        # Búsqueda por nombre: los dashboards seleccionan municipios y localidades por nombre
+        municipios, localidades = nombres['municipio'], nombres['localidad']
+        self._municipio_por_nombre = {nombre: self._clave(clave)
+                                      for clave, nombre in municipios['municipio'].items() if pd.notna(nombre)}
+        self._localidades_por_nombre = {}
+        for clave, municipio, localidad in zip(localidades.index, localidades['municipio'], localidades['localidad']):
+            self._localidades_por_nombre.setdefault((municipio, localidad), []).append(self._clave(clave))
+
+    @staticmethod
+    def _clave(clave):
+        return clave if isinstance(clave, tuple) else (clave,)
+
+    def _porcentajes(self, valores):
+        """Indicadores y porcentajes imputados de una matriz (unidades x ``columnas``)"""
+        terminos = valores[:, :len(self.plan.terminos)]
+        imputados = valores[:, -len(self.plan.terminos):]
+        totales = terminos[:, self._estimables]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            estimados = np.where(totales > 0, imputados[:, self._estimables] / totales * 100, 0.0)
+        return self.plan.evaluar(terminos, sin_base=0), estimados
+
+    def tabla(self, nivel):
+        """Medidas, conteos, indicadores y porcentajes imputados de un nivel completo, indexados por su clave"""
+        nombres, valores = self._nombres[nivel], self._valores[nivel]
+        indicadores, estimados = self._porcentajes(valores)
+        medidas = [i for i, col in enumerate(self.columnas) if col in MEDIDAS + CONTEOS]
+        return pd.concat([
+            nombres,
+            pd.DataFrame(valores[:, medidas], index=nombres.index,
+                         columns=[self.columnas[i] for i in medidas]).astype({col: 'int64' for col in CONTEOS}),
+            pd.DataFrame(indicadores, index=nombres.index, columns=self.indicadores),
+            pd.DataFrame(estimados, index=nombres.index, columns=self.estimados),
+        ], axis=1)
+
+    def _fila(self, valores):
+        indicadores, estimados = self._porcentajes(valores[None, :])
+        fila = {col: valor for col, valor in zip(self.columnas, valores.tolist()) if col in MEDIDAS + CONTEOS}
+        fila.update(zip(self.indicadores, indicadores[0].tolist()))
+        fila.update(zip(self.estimados, estimados[0].tolist()))
+        return fila
+
+    def fila(self, nivel='nacional', clave=()):
+        """Medidas, conteos e indicadores de una unidad (``None`` si no existe)"""
+        posicion = self._posiciones[nivel].get(self._clave(clave))
+        if posicion is None:
+            return None
+        return self._fila(self._valores[nivel][posicion])
+
+    def municipio(self, nombre):
+        """Fila del municipio con ese nombre"""
+        clave = self._municipio_por_nombre.get(nombre)
+        return None if clave is None else self.fila('municipio', clave)
+
+    def entidad_de_municipio(self, nombre):
+        """Fila de la entidad a la que pertenece el municipio"""
+        clave = self._municipio_por_nombre.get(nombre)
+        return None if clave is None else self.fila('entidad', clave[:1])
+
+    def localidad(self, municipio, nombre):
+        """Fila de una localidad por nombre (suma las homónimas del municipio)"""
+        claves = self._localidades_por_nombre.get((municipio, nombre))
+        if not claves:
+            return None
+        posiciones = [self._posiciones['localidad'][clave] for clave in claves]
+        return self._fila(self._valores['localidad'][posiciones].sum(axis=0))
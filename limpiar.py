@@ -1,14 +1,47 @@
+import logging
+
 import pandas as pd
 
-# Cargar el archivo original
+import arranque
+from almacen import AlmacenColumnar
+from compartido import publicar
+from esquema import ESQUEMA_ITER
+from exportar import exportar
+from imputacion import resumen as resumen_imputacion
+from perfiles import construir as construir_perfiles
+from series import SeriesCensales
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+
+# Cargar el archivo original (ITER del Censo de Población y Vivienda 2020)
 archivo_entrada = "data/nayarit2.xlsx"
+anio_censo = 2020
 df = pd.read_excel(archivo_entrada)
 
-# Reemplazar todos los asteriscos (*) por 0
-df = df.replace("*", 0)
+# Los asteriscos (*) no son ceros: la validación los deja en NaN y los marca en
+# la máscara de celdas reservadas, que el almacén guarda junto con sus estimaciones
+validacion = ESQUEMA_ITER.validar(df)
+if not validacion.es_valido:
+    raise SystemExit("Archivo inválido: " + "; ".join(validacion.errores))
+
+# Actualizar el almacén columnar solo con las localidades que cambiaron
+almacen = AlmacenColumnar()
+cambios = almacen.actualizar(validacion.df, origen=archivo_entrada)
+print(f"Almacén versión {almacen.version()}: {cambios}")
+print("Celdas reservadas y parte estimada de cada total (%):")
+print(resumen_imputacion(almacen.cargar()).round(2).to_string())
+
+# Registrar el año en la serie de censos (los otros años se agregan con series.py)
+print(f"Serie de censos: {SeriesCensales().agregar(anio_censo, validacion.df)}")
+
+# Publicar el archivo mapeable que comparten los workers de app2.py
+print(f"Archivo compartido: {publicar(almacen)}")
+
+# Perfil de cada municipio y localidad para las vistas de app2.py
+print(f"Perfiles: {construir_perfiles(almacen)}")
 
-# Guardar archivo limpio
-archivo_salida = "data/nayarit2_limpio.xlsx"
-df.to_excel(archivo_salida, index=False)
+# Snapshot con el estado preparado para que los procesos nuevos arranquen en caliente
+print(f"Snapshot de arranque: {arranque.construir(almacen)}")
 
-print(f"Archivo limpio guardado como: {archivo_salida}")
+# Páginas estáticas: solo se regeneran los municipios que cambiaron
+print(f"Sitio estático: {len(exportar(almacen=almacen))} municipios regenerados")
@@ -0,0 +1,155 @@
+"""Perfiles precalculados de municipios y localidades para las vistas de app2.py.
+
+Un perfil es un registro compacto con todos los números que muestra la vista
+de un área: las cuatro tarjetas, los totales del resumen descargable, los
+valores de los gráficos de las pestañas (``graficos.datos_municipio``) y,
+para una localidad, su ficha de detalle con las celdas estimadas marcadas.
+
+``construir`` (lo llama limpiar.py) genera el perfil de cada municipio y de
+cada localidad del almacén y los guarda como JSON en una tabla SQLite con
+clave primaria (municipio, localidad), junto con la versión del almacén.
+Leer un perfil es una búsqueda por clave, así que la vista solo dibuja. Si
+el archivo no existe o es de otra versión, app2.py calcula el mismo perfil
+con ``perfil_municipio`` o ``perfil_localidad`` a partir de las filas.
+
+Uso:
+    python perfiles.py                        # construye data/almacen/perfiles.sqlite
+    python perfiles.py --medir "Tepic"        # tiempo de lectura de un perfil
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from almacen import AlmacenColumnar
+from esquema import ESQUEMA_ITER
+from graficos import datos_municipio
+from imputacion import mascara
+from jerarquia import Jerarquia
+
+NOMBRE_ARCHIVO = "perfiles.sqlite"
+
+# Localidad con la que se guarda el perfil del municipio completo
+TODAS = ""
+
+# Cifras del área que muestran las tarjetas y el resumen descargable
+CAMPOS_AREA = [
+    'pob_total', 'pob_femenina', 'pob_masculina', 'pob_indigena', 'porcentaje_indigena',
+    'total_viviendas', 'viviendas_habitadas', 'personas_por_vivienda', 'escolaridad_promedio',
+    'pob_con_salud', 'pob_sin_salud',
+    'porcentaje_imputado_pob_indigena', 'porcentaje_imputado_pob_femenina',
+    'porcentaje_imputado_pob_con_salud', 'porcentaje_imputado_escolaridad_promedio',
+]
+
+# Ficha de una localidad: valores de su primera fila (nombres cortos)
+CAMPOS_DETALLE = [
+    'pob_femenina', 'pob_masculina', 'pob_indigena', 'total_viviendas', 'viviendas_habitadas',
+    'porcentaje_ocupacion_viviendas', 'escolaridad_promedio', 'pob_discapacidad', 'pob_economicamente_activa',
+]
+
+
+def ruta_perfiles(almacen=None):
+    return os.path.join((almacen or AlmacenColumnar()).directorio, NOMBRE_ARCHIVO)
+
+
+def _area(area, entidad):
+    perfil = {campo: float(area[campo]) for campo in CAMPOS_AREA}
+    perfil['porcentaje_estado'] = area['pob_total'] / entidad['pob_total'] * 100 if entidad['pob_total'] > 0 else 0.0
+    return perfil
+
+
+def perfil_municipio(df_mpio, area, entidad):
+    """Perfil de un municipio: ``df_mpio`` con sus localidades (nombres del INEGI) y sus filas de ``Jerarquia``"""
+    return {'area': _area(area, entidad), 'graficos': datos_municipio(df_mpio)}
+
+
+def perfil_localidad(df_local, area, entidad):
+    """Perfil de una localidad (las homónimas suman en ``area``; la ficha es la de la primera fila)"""
+    fila = df_local.iloc[:1]
+    detalle = {campo: float(fila[ESQUEMA_ITER.a_original.get(campo, campo)].iloc[0]) for campo in CAMPOS_DETALLE}
+    detalle['estimados'] = [campo for campo in CAMPOS_DETALLE if mascara(fila, campo)[0]]
+    return {'area': _area(area, entidad), 'detalle': detalle}
+
+
+def construir(almacen=None, ruta=None):
+    """Escribe los perfiles de la versión actual del almacén; devuelve la ruta"""
+    almacen = almacen or AlmacenColumnar()
+    ruta = ruta or ruta_perfiles(almacen)
+    df = almacen.cargar().rename(columns=ESQUEMA_ITER.a_original)
+    jerarquia = Jerarquia(df, originales=True)
+    municipio, localidad = "Nombre del municipio o demarcación territorial", "Nombre de la localidad"
+
+    registros = []
+    for nombre, df_mpio in df.groupby(municipio, sort=True):
+        area, entidad = jerarquia.municipio(nombre), jerarquia.entidad_de_municipio(nombre)
+        registros.append((nombre, TODAS, perfil_municipio(df_mpio, area, entidad)))
+        for nombre_localidad, df_local in df_mpio.groupby(localidad, sort=True):
+            registros.append((nombre, nombre_localidad,
+                              perfil_localidad(df_local, jerarquia.localidad(nombre, nombre_localidad), entidad)))
+
+    # Archivo nuevo y reemplazo atómico: los lectores abiertos conservan el anterior
+    if os.path.exists(ruta + ".tmp"):
+        os.remove(ruta + ".tmp")
+    conexion = sqlite3.connect(ruta + ".tmp")
+    with conexion:
+        conexion.execute("CREATE TABLE meta (clave TEXT PRIMARY KEY, valor TEXT)")
+        conexion.execute("CREATE TABLE perfiles (municipio TEXT, localidad TEXT, datos TEXT, "
+                         "PRIMARY KEY (municipio, localidad))")
+        conexion.execute("INSERT INTO meta VALUES ('version', ?)", (almacen.version(),))
+        conexion.executemany("INSERT INTO perfiles VALUES (?, ?, ?)",
+                             [(m, l, json.dumps(p, ensure_ascii=False, separators=(',', ':')))
+                              for m, l, p in registros])
+    conexion.close()
+    os.replace(ruta + ".tmp", ruta)
+    return ruta
+
+
+class Perfiles:
+    """Lector de los perfiles guardados (una conexión de solo lectura por proceso)"""
+
+    def __init__(self, ruta=None):
+        self.ruta = ruta or ruta_perfiles()
+        self._conexion = sqlite3.connect(f"file:{self.ruta}?mode=ro", uri=True, check_same_thread=False)
+        self._candado = threading.Lock()
+        self.version = self._consultar("SELECT valor FROM meta WHERE clave = 'version'", ())
+
+    def _consultar(self, sql, parametros):
+        with self._candado:
+            fila = self._conexion.execute(sql, parametros).fetchone()
+        return None if fila is None else fila[0]
+
+    def perfil(self, municipio, localidad=TODAS):
+        """Perfil del municipio (o de una de sus localidades); None si no existe"""
+        datos = self._consultar("SELECT datos FROM perfiles WHERE municipio = ? AND localidad = ?",
+                                (municipio, localidad))
+        return None if datos is None else json.loads(datos)
+
+    def cerrar(self):
+        self._conexion.close()
+
+
+def version_perfiles(ruta=None):
+    """Versión del almacén con la que se construyeron los perfiles (None si no existen)"""
+    ruta = ruta or ruta_perfiles()
+    if not os.path.exists(ruta):
+        return None
+    perfiles = Perfiles(ruta)
+    perfiles.cerrar()
+    return perfiles.version
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Perfiles precalculados de municipios y localidades")
+    parser.add_argument("--medir", metavar="MUNICIPIO", help="medir la lectura del perfil de un municipio")
+    args = parser.parse_args()
+    if args.medir:
+        perfiles = Perfiles()
+        inicio = time.perf_counter()
+        for _ in range(1000):
+            perfiles.perfil(args.medir)
+        ms = (time.perf_counter() - inicio) * 1000 / 1000
+        print(f"{ms:.3f} ms por perfil (promedio de 1000 lecturas)")
+    else:
+        print(f"Perfiles en {construir()}")
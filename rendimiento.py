@@ -0,0 +1,100 @@
+"""Paneles como fragmentos de Streamlit con medición de latencia por interacción.
+
+Un panel decorado con ``@panel("nombre")`` se vuelve a ejecutar solo cuando
+cambia uno de sus propios widgets; sus dependencias del estado de filtros
+son los argumentos con los que lo llama el script. Cada ejecución guarda su
+latencia en ``st.session_state`` para compararla con la del script completo.
+
+``python rendimiento.py`` imprime el perfil de importación (``-X importtime``)
+del arranque de app.py y de las bibliotecas que sus vistas importan al usarse.
+"""
+import argparse
+import functools
+import subprocess
+import sys
+import time
+
+import streamlit as st
+
+# Ejecuciones recientes que se conservan por panel
+MAX_MEDICIONES = 50
+
+
+def registrar_latencia(nombre, ms):
+    """Guarda la latencia (ms) de una ejecución del panel ``nombre``"""
+    mediciones = st.session_state.setdefault("latencias", {}).setdefault(nombre, [])
+    mediciones.append(ms)
+    del mediciones[:-MAX_MEDICIONES]
+
+
+def panel(nombre):
+    """Decorador: ejecuta la función como fragmento y mide cada ejecución"""
+    def decorador(funcion):
+        @st.fragment
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            inicio = time.perf_counter()
+            resultado = funcion(*args, **kwargs)
+            ms = (time.perf_counter() - inicio) * 1000
+            registrar_latencia(nombre, ms)
+            st.caption(f"⏱️ {nombre}: {ms:.0f} ms")
+            return resultado
+        return envoltura
+    return decorador
+
+
+def tabla_latencias():
+    """Última latencia, mediana y número de ejecuciones por panel"""
+    import numpy as np
+    import pandas as pd
+    latencias = st.session_state.get("latencias", {})
+    return pd.DataFrame(
+        [(nombre, valores[-1], float(np.median(valores)), len(valores)) for nombre, valores in latencias.items()],
+        columns=["Panel", "Última (ms)", "Mediana (ms)", "Ejecuciones"]
+    ).round(1)
+
+
+# Pasos del arranque de app.py, importados en orden en un mismo proceso
+PASOS_ARRANQUE = [
+    ("streamlit", "import streamlit"),
+    ("app.py sin archivo", "import app"),
+    ("vistas de app.py", "import pandas, plotly.express, plotly.graph_objects, plotly.subplots, "
+                         "analitica, arranque, comparacion"),
+]
+_MARCA = "-- paso --"
+
+
+def perfil_importaciones(pasos=PASOS_ARRANQUE, n=5):
+    """Perfil ``-X importtime`` de cada paso, importado en orden en un proceso nuevo.
+
+    Devuelve por paso (nombre, ms, módulos) donde módulos son los ``n`` módulos
+    importados directamente más costosos con sus ms acumulados. Lo que ya
+    importó un paso anterior no cuenta en los siguientes.
+    """
+    codigo = "import sys\n" + "\n".join(
+        f"sys.stderr.write({_MARCA!r} + '\\n'); sys.stderr.flush()\n{importacion}" for _, importacion in pasos)
+    salida = subprocess.run([sys.executable, "-X", "importtime", "-c", codigo],
+                            capture_output=True, text=True).stderr
+    perfil = []
+    for (nombre, _), bloque in zip(pasos, salida.split(_MARCA + "\n")[1:]):
+        modulos = []
+        for linea in bloque.splitlines():
+            if not linea.startswith("import time:"):
+                continue
+            _, acumulado, modulo = linea[len("import time:"):].split("|")
+            # Solo los módulos importados directamente (sin sangría)
+            if not modulo[1:].startswith(" "):
+                modulos.append((modulo.strip(), int(acumulado) / 1000))
+        modulos.sort(key=lambda m: -m[1])
+        perfil.append((nombre, sum(ms for _, ms in modulos), modulos[:n]))
+    return perfil
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Perfil de importación del arranque de app.py")
+    parser.add_argument("-n", type=int, default=5, help="módulos a mostrar por paso")
+    args = parser.parse_args()
+    for nombre, total, modulos in perfil_importaciones(n=args.n):
+        print(f"{nombre}: {total:.0f} ms")
+        for modulo, ms in modulos:
+            print(f"    {ms:>8.1f} ms  {modulo}")
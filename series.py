@@ -0,0 +1,214 @@
+"""Serie de censos por localidad con la clave INEGI como eje.
+
+Cada censo o conteo (2010, 2015, 2020, ...) se agrega como un año más de las
+mismas localidades: las medidas aditivas quedan en una tabla ancha con una
+columna por medida y año (``pob_total_2020``), enteros con nulos de 32 bits,
+y los nombres se guardan una sola vez en un catálogo aparte. Una localidad
+que no existe en un año tiene nulo en sus columnas, distinto de 0.
+
+Al agregar un año se precalculan, para localidades, municipios y la entidad,
+el cambio, la tasa y la tasa de crecimiento media anual (TCMA) entre años
+consecutivos y entre el primero y el último, así que las vistas no vuelven a
+leer ningún Excel ni recalculan crecimientos.
+
+Uso:
+    python series.py agregar 2020 data/nayarit2.xlsx
+    python series.py crecimiento --nivel municipio --medida pob_total
+"""
+import argparse
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from almacen import DIRECTORIO_ALMACEN
+from datos import CLAVES, LOCALIDADES_RESUMEN, MEDIDAS
+from esquema import ESQUEMA_ITER
+
+DIRECTORIO_SERIES = os.path.join(DIRECTORIO_ALMACEN, "series")
+
+NIVELES_SERIE = {
+    'localidad': CLAVES,
+    'municipio': CLAVES[:2],
+    'entidad': CLAVES[:1],
+}
+
+
+def columna_anio(medida, anio):
+    return f"{medida}_{anio}"
+
+
+def tcma(inicial, final, anios):
+    """Tasa de crecimiento media anual en %, vectorizada (NaN sin base positiva)"""
+    inicial = np.asarray(inicial, dtype=float)
+    final = np.asarray(final, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tasa = (np.power(final / inicial, 1 / np.asarray(anios, dtype=float)) - 1) * 100
+    return np.where((inicial > 0) & (final >= 0), tasa, np.nan)
+
+
+def _periodos(anios):
+    """Pares (desde, hasta) consecutivos más el periodo completo"""
+    periodos = list(zip(anios[:-1], anios[1:]))
+    if len(anios) > 2:
+        periodos.append((anios[0], anios[-1]))
+    return periodos
+
+
+class SeriesCensales:
+    """Medidas aditivas de cada localidad en cada año censal"""
+
+    def __init__(self, directorio=DIRECTORIO_SERIES):
+        self.directorio = directorio
+        self.ruta_valores = os.path.join(directorio, "valores.parquet")
+        self.ruta_catalogo = os.path.join(directorio, "catalogo.parquet")
+        self.ruta_crecimiento = os.path.join(directorio, "crecimiento.parquet")
+        self.ruta_manifiesto = os.path.join(directorio, "manifiesto.json")
+
+    def existe(self):
+        return os.path.exists(self.ruta_manifiesto)
+
+    def manifiesto(self):
+        if not self.existe():
+            return {}
+        with open(self.ruta_manifiesto, encoding="utf-8") as f:
+            return json.load(f)
+
+    def version(self):
+        return self.manifiesto().get('actualizado')
+
+    def anios(self):
+        return self.manifiesto().get('anios', [])
+
+    def valores(self):
+        """Tabla ancha indexada por clave de localidad"""
+        return self._leer(self.ruta_valores)
+
+    def catalogo(self):
+        """Nombre de municipio y localidad por clave (el del censo más reciente)"""
+        return self._leer(self.ruta_catalogo)
+
+    @staticmethod
+    def _leer(ruta):
+        # Las series guardadas antes de las claves enteras las tienen como float
+        return pd.read_parquet(ruta).astype({col: 'Int64' for col in CLAVES}).set_index(CLAVES)
+
+    def agregar(self, anio, df):
+        """Agrega (o reemplaza) un año a partir de un DataFrame validado con nombres cortos"""
+        anio = int(anio)
+        filas = df.dropna(subset=['municipio'])
+        filas = filas[~filas['cve_localidad'].isin(LOCALIDADES_RESUMEN)]
+        nuevo = filas.groupby(CLAVES)[MEDIDAS].sum(min_count=1).round().astype('Int32')
+        nuevo.columns = [columna_anio(medida, anio) for medida in MEDIDAS]
+        nombres = filas.groupby(CLAVES)[['municipio', 'localidad']].first()
+
+        if self.existe():
+            valores = self.valores().drop(columns=nuevo.columns, errors='ignore')
+            valores = valores.join(nuevo, how='outer')
+            # El nombre del año más reciente manda
+            catalogo = self.catalogo()
+            if anio >= max(self.anios()):
+                catalogo = nombres.combine_first(catalogo)
+            else:
+                catalogo = catalogo.combine_first(nombres)
+        else:
+            valores, catalogo = nuevo, nombres
+        anios = sorted(set(self.anios()) | {anio})
+        valores = valores[[columna_anio(medida, a) for medida in MEDIDAS for a in anios]].sort_index()
+
+        os.makedirs(self.directorio, exist_ok=True)
+        for tabla, ruta in ((valores, self.ruta_valores), (catalogo.sort_index(), self.ruta_catalogo),
+                            (self._calcular_crecimiento(valores, anios), self.ruta_crecimiento)):
+            tabla.reset_index().to_parquet(ruta + ".tmp", index=False, compression="zstd")
+            os.replace(ruta + ".tmp", ruta)
+        manifiesto = {
+            'anios': anios,
+            'actualizado': datetime.now().isoformat(timespec='seconds'),
+            'localidades': len(valores),
+        }
+        with open(self.ruta_manifiesto + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifiesto, f, ensure_ascii=False, indent=2)
+        os.replace(self.ruta_manifiesto + ".tmp", self.ruta_manifiesto)
+        return anios
+
+    @staticmethod
+    def _sumar(valores, nivel):
+        if nivel == 'localidad':
+            return valores
+        return valores.groupby(level=list(range(len(NIVELES_SERIE[nivel]))), dropna=False).sum(min_count=1)
+
+    def _calcular_crecimiento(self, valores, anios):
+        """Cambio, tasa y TCMA de cada medida por nivel y periodo, en formato largo"""
+        partes = []
+        for nivel in NIVELES_SERIE:
+            tabla = self._sumar(valores, nivel)
+            claves = tabla.index.to_frame(index=False).reindex(columns=CLAVES)
+            for medida in MEDIDAS:
+                for desde, hasta in _periodos(anios):
+                    inicial = tabla[columna_anio(medida, desde)].to_numpy(dtype=float, na_value=np.nan)
+                    final = tabla[columna_anio(medida, hasta)].to_numpy(dtype=float, na_value=np.nan)
+                    with np.errstate(divide='ignore', invalid='ignore'):
+                        tasa = np.where(inicial > 0, (final - inicial) / inicial * 100, np.nan)
+                    partes.append(claves.assign(
+                        nivel=nivel, medida=medida, desde=desde, hasta=hasta,
+                        inicial=inicial, final=final, cambio=final - inicial,
+                        tasa=tasa, tcma=tcma(inicial, final, hasta - desde),
+                    ))
+        columnas = ['nivel', 'medida', 'desde', 'hasta'] + CLAVES + ['inicial', 'final', 'cambio', 'tasa', 'tcma']
+        if not partes:
+            return pd.DataFrame(columns=columnas).set_index('nivel')
+        return pd.concat(partes, ignore_index=True)[columnas].set_index('nivel')
+
+    def serie(self, medida='pob_total', nivel='municipio'):
+        """Valores de una medida por año (columnas) para cada unidad del nivel"""
+        anios = self.anios()
+        tabla = self._sumar(self.valores()[[columna_anio(medida, a) for a in anios]], nivel)
+        tabla.columns = anios
+        return tabla.astype(float)
+
+    def crecimiento(self, medida='pob_total', nivel='municipio'):
+        """Crecimientos precalculados de una medida en un nivel"""
+        tabla = pd.read_parquet(self.ruta_crecimiento)
+        tabla = tabla[(tabla['nivel'] == nivel) & (tabla['medida'] == medida)]
+        tabla = tabla.drop(columns=['nivel', 'medida'] + CLAVES[len(NIVELES_SERIE[nivel]):])
+        return self._nombres(nivel).merge(tabla, on=NIVELES_SERIE[nivel], how='right')
+
+    def _nombres(self, nivel):
+        claves = NIVELES_SERIE[nivel]
+        columnas = {'localidad': ['municipio', 'localidad'], 'municipio': ['municipio'], 'entidad': []}[nivel]
+        return self.catalogo().groupby(level=claves)[columnas].first().reset_index()
+
+    def tendencia(self, medida='pob_total', municipio=None, localidad=None):
+        """Serie anual de una medida para un municipio o una localidad por nombre
+        (suma las localidades homónimas del municipio; todo el estado sin nombres)"""
+        tabla = self.serie(medida, 'localidad')
+        catalogo = self.catalogo().reindex(tabla.index)
+        mascara = np.ones(len(tabla), dtype=bool)
+        if municipio is not None:
+            mascara &= (catalogo['municipio'] == municipio).to_numpy()
+        if localidad is not None:
+            mascara &= (catalogo['localidad'] == localidad).to_numpy()
+        return tabla[mascara].sum(min_count=1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serie de censos por localidad")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+    agregar = subparsers.add_parser("agregar", help="agregar el ITER de un año")
+    agregar.add_argument("anio", type=int)
+    agregar.add_argument("archivo")
+    consulta = subparsers.add_parser("crecimiento", help="crecimientos precalculados")
+    consulta.add_argument("--nivel", choices=sorted(NIVELES_SERIE), default="municipio")
+    consulta.add_argument("--medida", choices=MEDIDAS, default="pob_total")
+    args = parser.parse_args()
+
+    series = SeriesCensales()
+    if args.comando == "agregar":
+        validacion = ESQUEMA_ITER.validar(pd.read_excel(args.archivo))
+        if not validacion.es_valido:
+            raise SystemExit("Archivo inválido: " + "; ".join(validacion.errores))
+        print(f"Años en la serie: {series.agregar(args.anio, validacion.df)}")
+    else:
+        print(series.crecimiento(args.medida, args.nivel).round(2).to_string(index=False))
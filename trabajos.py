@@ -0,0 +1,284 @@
+"""Cola local de trabajos pesados con progreso, deduplicación y resultados persistentes.
+
+La carga de un archivo, las tipologías o la exportación del sitio bloqueaban
+el hilo del script de la sesión hasta terminar, y un rerun podía volver a
+empezarlos. ``ColaTrabajos`` los ejecuta en un pool de hilos del proceso
+(compartido por todas las sesiones del servidor) identificados por una
+clave: enviar un trabajo cuya clave ya está en curso devuelve el mismo
+trabajo en lugar de lanzar otro, y el resultado de un trabajo terminado se
+guarda en ``data/almacen/trabajos/<clave>.pkl``, así que la misma clave se
+resuelve sin recalcular también tras reiniciar el servidor. La clave incluye
+``FORMATO``, y los resultados sin usar en ``MAX_DIAS`` días o por encima de
+``MAX_MB`` se borran del más antiguo al más reciente.
+
+La función de un trabajo recibe ``progreso(fraccion, mensaje)`` para
+informar su avance; ``mostrar_progreso`` lo dibuja en Streamlit y vuelve a
+ejecutar la app cuando el trabajo termina.
+
+Uso:
+    python trabajos.py                 # lista los resultados guardados
+    python trabajos.py exportar        # construye o actualiza el sitio como trabajo
+    python trabajos.py --borrar        # borra los resultados guardados
+"""
+import argparse
+import hashlib
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from almacen import DIRECTORIO_ALMACEN
+
+DIRECTORIO_TRABAJOS = os.path.join(DIRECTORIO_ALMACEN, "trabajos")
+
+# Hilos del pool: los trabajos son de pandas/NumPy, que liberan el GIL en sus bucles
+HILOS = 2
+
+# Trabajos terminados que se conservan en memoria (los persistidos siguen en disco)
+MAX_EN_MEMORIA = 64
+
+# Versión de lo que calculan los trabajos: súbela al cambiar analitica.py, el
+# catálogo de indicadores o el resultado de un trabajo para no servir los guardados
+FORMATO = 1
+
+# Resultados guardados: se borran los que no se usan hace más de MAX_DIAS días y,
+# si todos juntos pasan de MAX_MB, los usados hace más tiempo
+MAX_DIAS = 30
+MAX_MB = 512
+
+# Espera en el hilo de la sesión antes de mostrar la barra de avance: los
+# trabajos cortos se dibujan en la misma ejecución, sin un rerun extra
+ESPERA_BREVE = 0.3
+
+
+def clave_trabajo(tipo, *partes):
+    """Clave estable de un trabajo a partir de su tipo, sus parámetros y ``FORMATO``"""
+    texto = repr((FORMATO, tipo) + partes).encode()
+    return f"{tipo}-{hashlib.sha1(texto).hexdigest()[:16]}"
+
+
+class Trabajo:
+    """Estado ('en cola', 'en curso', 'terminado' o 'error'), avance y resultado de un trabajo"""
+
+    def __init__(self, clave, tipo):
+        self.clave = clave
+        self.tipo = tipo
+        self.estado = 'en cola'
+        self.progreso = 0.0
+        self.mensaje = ''
+        self.error = None
+        self.creado = time.time()
+        self.duracion = None
+        self._resultado = None
+        self._listo = threading.Event()
+
+    @property
+    def terminado(self):
+        return self.estado in ('terminado', 'error')
+
+    def esperar(self, segundos=None):
+        """Espera a que termine (hasta ``segundos``); devuelve si terminó"""
+        self._listo.wait(segundos)
+        return self.terminado
+
+    def avanzar(self, fraccion, mensaje=None):
+        """Callback de progreso que recibe la función del trabajo"""
+        self.progreso = min(max(float(fraccion), 0.0), 1.0)
+        if mensaje is not None:
+            self.mensaje = mensaje
+
+    def resultado(self):
+        """Resultado del trabajo terminado (lanza el error si falló)"""
+        if self.estado == 'error':
+            raise RuntimeError(f"El trabajo {self.clave} falló: {self.error}")
+        if self.estado != 'terminado':
+            raise RuntimeError(f"El trabajo {self.clave} no ha terminado ({self.estado})")
+        return self._resultado
+
+
+class ColaTrabajos:
+    """Pool de hilos con trabajos indexados por clave y resultados en disco"""
+
+    def __init__(self, directorio=DIRECTORIO_TRABAJOS, hilos=HILOS):
+        self.directorio = directorio
+        self._pool = ThreadPoolExecutor(hilos, thread_name_prefix="trabajo")
+        self._trabajos = {}
+        self._candado = threading.Lock()
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, f"{clave}.pkl")
+
+    def enviar(self, tipo, clave, funcion, *args, persistir=True, **kwargs):
+        """Trabajo de ``clave``: el que ya está en curso o guardado, o uno nuevo.
+
+        ``funcion(*args, progreso=..., **kwargs)`` corre en el pool. Con
+        ``persistir=False`` el resultado solo se conserva en memoria (p. ej.
+        cuando la función ya lo guarda en otro almacén).
+        """
+        with self._candado:
+            trabajo = self._trabajos.get(clave)
+            if trabajo is not None and trabajo.estado != 'error':
+                return trabajo
+            trabajo = self._guardado(clave) if persistir else None
+            if trabajo is None:
+                trabajo = Trabajo(clave, tipo)
+                self._pool.submit(self._ejecutar, trabajo, funcion, args, kwargs, persistir)
+            self._trabajos[clave] = trabajo
+            self._recortar()
+            return trabajo
+
+    def trabajo(self, clave):
+        """Trabajo en memoria o guardado con esa clave (None si no existe)"""
+        with self._candado:
+            return self._trabajos.get(clave) or self._guardado(clave)
+
+    def _guardado(self, clave):
+        ruta = self._ruta(clave)
+        if not os.path.exists(ruta) or os.path.getmtime(ruta) < time.time() - MAX_DIAS * 86400:
+            return None
+        with open(ruta, "rb") as f:
+            cabecera = pickle.load(f)
+        # La fecha del archivo es la de su último uso (ver ``_podar``)
+        os.utime(ruta)
+        trabajo = Trabajo(clave, cabecera['tipo'])
+        trabajo.estado, trabajo.progreso = 'terminado', 1.0
+        trabajo.creado, trabajo.duracion = cabecera['creado'], cabecera['duracion']
+        trabajo._resultado = cabecera['resultado']
+        trabajo._listo.set()
+        return trabajo
+
+    def _ejecutar(self, trabajo, funcion, args, kwargs, persistir):
+        trabajo.estado = 'en curso'
+        inicio = time.perf_counter()
+        try:
+            resultado = funcion(*args, progreso=trabajo.avanzar, **kwargs)
+            trabajo.duracion = time.perf_counter() - inicio
+            if persistir:
+                # Un resultado que no se puede guardar también es un error del trabajo
+                self._persistir(trabajo, resultado)
+            trabajo._resultado = resultado
+            trabajo.avanzar(1.0)
+            trabajo.estado = 'terminado'
+        except Exception as e:
+            trabajo.duracion = time.perf_counter() - inicio
+            trabajo.error = f"{type(e).__name__}: {e}"
+            trabajo.estado = 'error'
+        finally:
+            trabajo._listo.set()
+
+    def _persistir(self, trabajo, resultado):
+        os.makedirs(self.directorio, exist_ok=True)
+        ruta = self._ruta(trabajo.clave)
+        try:
+            with open(ruta + ".tmp", "wb") as f:
+                pickle.dump({'tipo': trabajo.tipo, 'creado': trabajo.creado, 'duracion': trabajo.duracion,
+                             'resultado': resultado}, f, protocol=5)
+            os.replace(ruta + ".tmp", ruta)
+        except Exception:
+            if os.path.exists(ruta + ".tmp"):
+                os.remove(ruta + ".tmp")
+            raise
+        self._podar()
+
+    def _podar(self):
+        """Borra los resultados sin usar en ``MAX_DIAS`` días y, por encima de ``MAX_MB``, los usados hace más tiempo"""
+        archivos = []
+        for nombre in os.listdir(self.directorio):
+            if nombre.endswith(".pkl"):
+                ruta = os.path.join(self.directorio, nombre)
+                try:
+                    info = os.stat(ruta)
+                except FileNotFoundError:
+                    continue
+                archivos.append((info.st_mtime, info.st_size, ruta))
+        limite, acumulado = time.time() - MAX_DIAS * 86400, 0
+        for usado, tamano, ruta in sorted(archivos, reverse=True):
+            acumulado += tamano
+            if usado < limite or acumulado > MAX_MB * 1024 * 1024:
+                try:
+                    os.remove(ruta)
+                except FileNotFoundError:
+                    pass
+
+    def _recortar(self):
+        """Olvida los trabajos terminados más antiguos por encima de ``MAX_EN_MEMORIA``"""
+        terminados = sorted((t.creado, clave) for clave, t in self._trabajos.items() if t.terminado)
+        for _, clave in terminados[:max(len(terminados) - MAX_EN_MEMORIA, 0)]:
+            del self._trabajos[clave]
+
+    def activos(self):
+        """Trabajos en cola o en curso"""
+        with self._candado:
+            return [t for t in self._trabajos.values() if not t.terminado]
+
+    def guardados(self):
+        """(clave, tipo, fecha, duración en s) de cada resultado en disco, del más reciente al más antiguo"""
+        if not os.path.isdir(self.directorio):
+            return []
+        filas = []
+        for nombre in os.listdir(self.directorio):
+            if nombre.endswith(".pkl"):
+                with open(os.path.join(self.directorio, nombre), "rb") as f:
+                    cabecera = pickle.load(f)
+                filas.append((nombre[:-4], cabecera['tipo'], datetime.fromtimestamp(cabecera['creado']),
+                              cabecera['duracion']))
+        return sorted(filas, key=lambda fila: fila[2], reverse=True)
+
+    def borrar(self):
+        """Borra los resultados guardados; devuelve cuántos"""
+        guardados = self.guardados()
+        for clave, *_ in guardados:
+            os.remove(self._ruta(clave))
+        return len(guardados)
+
+
+def mostrar_progreso(trabajo, titulo, intervalo=0.5):
+    """En Streamlit: barra de avance del trabajo; al terminar vuelve a ejecutar la app.
+
+    La barra es un fragmento que se refresca solo, así que el resto de la
+    página (p. ej. el sidebar) sigue respondiendo mientras el trabajo corre.
+    """
+    import streamlit as st
+
+    @st.fragment(run_every=intervalo)
+    def seguimiento():
+        if trabajo.estado == 'error':
+            st.error(f"{titulo}: {trabajo.error}")
+        elif trabajo.terminado:
+            st.rerun()
+        else:
+            texto = f"{titulo} {trabajo.mensaje}".strip()
+            st.progress(trabajo.progreso, text=texto)
+
+    seguimiento()
+
+
+def _exportar_sitio(progreso):
+    from exportar import exportar
+    return exportar(progreso=progreso)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cola de trabajos y resultados guardados")
+    parser.add_argument("accion", nargs="?", choices=["exportar"], help="trabajo a ejecutar")
+    parser.add_argument("--borrar", action="store_true", help="borrar los resultados guardados")
+    args = parser.parse_args()
+
+    cola = ColaTrabajos()
+    if args.borrar:
+        print(f"{cola.borrar()} resultados borrados de {cola.directorio}/")
+    elif args.accion == "exportar":
+        from almacen import AlmacenColumnar
+        trabajo = cola.enviar('sitio', clave_trabajo('sitio', AlmacenColumnar().version()), _exportar_sitio)
+        while not trabajo.terminado:
+            print(f"\r{trabajo.progreso:5.0%} {trabajo.mensaje:<60}", end="", flush=True)
+            time.sleep(0.2)
+        print()
+        if trabajo.estado == 'error':
+            raise SystemExit(trabajo.error)
+        print(f"{trabajo.clave}: {len(trabajo.resultado())} municipios regenerados ({trabajo.duracion:.1f} s)")
+    else:
+        for clave, tipo, fecha, duracion in cola.guardados():
+            print(f"{clave:<32} {tipo:<12} {fecha:%Y-%m-%d %H:%M} {duracion:8.2f} s")